@@ -0,0 +1,162 @@
+"""
+Бенчмарк горячих запросов к keys/servers до и после миграции 0002
+(индексы и целочисленные Telegram ID).
+
+Запуск из корня репозитория:
+    PYTHONPATH=src python benchmarks/bench_indexes.py --keys 100000
+    PYTHONPATH=src python benchmarks/bench_indexes.py --keys 1000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from database.migrate import upgrade_schema
+
+USERS_PER_KEY = 0.5
+KEYS_PER_SERVER = 160
+# Доля ключей, которые истекают в ближайшие 4 дня или уже истекли
+EXPIRING_SHARE = 0.02
+
+QUERIES = {
+    "ключи пользователя": (
+        "SELECT key_id FROM keys WHERE user_telegram_id = ?",
+        lambda ids: (random.choice(ids["users"]),),
+    ),
+    "ключи сервера": (
+        "SELECT key_id FROM keys WHERE server_id = ?",
+        lambda ids: (random.randint(1, ids["servers"]),),
+    ),
+    "check_db: истекающие ключи": (
+        "SELECT key_id, user_telegram_id, expiration_date FROM keys"
+        " WHERE expiration_date < ? ORDER BY user_telegram_id + 0",
+        lambda ids: (ids["soon"],),
+    ),
+    "наименее загруженный сервер": (
+        "SELECT id FROM servers WHERE protocol_type = ? AND cnt_users < ?"
+        " ORDER BY cnt_users LIMIT 1",
+        lambda ids: (random.choice(("outline", "vless")), KEYS_PER_SERVER),
+    ),
+}
+
+
+def build_database(path: str, revision: str, keys: int, seed: int) -> dict:
+    """
+    Создает базу со схемой указанной ревизии и заполняет ее синтетическими данными.
+    :return: Параметры для запросов (ID пользователей, число серверов, граница истечения)
+    """
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        upgrade_schema(conn, revision)
+    engine.dispose()
+
+    rng = random.Random(seed)
+    integer_ids = revision != "0001"
+    users = [rng.randint(10**8, 8 * 10**9) for _ in range(int(keys * USERS_PER_KEY))]
+    users = list(dict.fromkeys(users))
+    user_values = users if integer_ids else [str(user) for user in users]
+    servers = max(1, keys // KEYS_PER_SERVER)
+    now = datetime.now()
+
+    def key_rows():
+        for i in range(keys):
+            if rng.random() < EXPIRING_SHARE:
+                expiration = now + timedelta(days=rng.uniform(-5, 4))
+            else:
+                expiration = now + timedelta(days=rng.uniform(4, 365))
+            yield (
+                f"key-{i}",
+                rng.choice(user_values),
+                now - timedelta(days=30),
+                expiration,
+                f"key {i}",
+                0,
+                "outline" if i % 2 else "vless",
+                rng.randint(1, servers),
+            )
+
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.executemany(
+            "INSERT INTO users (user_telegram_id, subscription_status,"
+            " use_trial_period) VALUES (?, 'active', 0)",
+            ((user,) for user in user_values),
+        )
+        connection.executemany(
+            "INSERT INTO servers (id, cnt_users, protocol_type) VALUES (?, ?, ?)",
+            (
+                (i, rng.randint(0, KEYS_PER_SERVER), "outline" if i % 2 else "vless")
+                for i in range(1, servers + 1)
+            ),
+        )
+        connection.executemany(
+            "INSERT INTO keys (key_id, user_telegram_id, start_date, expiration_date,"
+            " name, used_bytes_last_month, protocol_type, server_id)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (*row[:2], row[2].isoformat(" "), row[3].isoformat(" "), *row[4:])
+                for row in key_rows()
+            ),
+        )
+    connection.close()
+    return {
+        "users": user_values,
+        "servers": servers,
+        "soon": (now + timedelta(days=4)).isoformat(" "),
+    }
+
+
+def measure(path: str, ids: dict, repeat: int) -> dict[str, float]:
+    """
+    Выполняет каждый запрос `repeat` раз.
+    :return: Медианное время запроса в миллисекундах
+    """
+    connection = sqlite3.connect(path)
+    results = {}
+    for name, (sql, make_params) in QUERIES.items():
+        timings = []
+        for _ in range(repeat):
+            params = make_params(ids)
+            start = time.perf_counter()
+            connection.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = statistics.median(timings)
+    connection.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, default=100_000, help="Число ключей")
+    parser.add_argument("--repeat", type=int, default=20, help="Повторов запроса")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for label, revision in (("до (0001)", "0001"), ("после (head)", "head")):
+            path = os.path.join(tmp, f"{revision}.db")
+            start = time.perf_counter()
+            ids = build_database(path, revision, args.keys, args.seed)
+            print(
+                f"{label}: база на {args.keys} ключей создана "
+                f"за {time.perf_counter() - start:.1f} с"
+            )
+            results[label] = measure(path, ids, args.repeat)
+
+    before, after = results.values()
+    print(f"\n{'запрос':<30} {'до, мс':>10} {'после, мс':>10} {'ускорение':>10}")
+    for name in QUERIES:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<30} {before[name]:>10.3f} {after[name]:>10.3f} {speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Бенчмарк конкуренции за файл SQLite: профиль соединения по умолчанию
+против профиля database.engine (WAL, synchronous=NORMAL, busy_timeout, ...).
+
+Нагрузка повторяет продакшен: отдельными процессами работают
+- бот — короткие пишущие транзакции (новый ключ + счетчик сервера);
+- задачи по расписанию — длинное чтение всей таблицы ключей (как check_db);
+- серверы перенаправлений — точечное чтение ключа по ID.
+
+Запуск из корня репозитория:
+    PYTHONPATH=src python benchmarks/bench_sqlite_contention.py --seconds 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from database.engine import create_sqlite_engines
+from database.migrate import upgrade_schema
+
+SEED_KEYS = 50_000
+
+
+def make_engine(path: str, profile: str):
+    if profile == "default":
+        # Как было до профиля: rollback journal, synchronous=FULL
+        return create_engine(f"sqlite:///{path}")
+    _, engine = create_sqlite_engines(path)
+    return engine
+
+
+def prepare_database(path: str) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        upgrade_schema(conn)
+    engine.dispose()
+    now = datetime.now()
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.executemany(
+            "INSERT INTO users (user_telegram_id) VALUES (?)",
+            ((i,) for i in range(SEED_KEYS // 2)),
+        )
+        connection.executemany(
+            "INSERT INTO servers (id, cnt_users, protocol_type) VALUES (?, 0, 'vless')",
+            ((i,) for i in range(1, 101)),
+        )
+        connection.executemany(
+            "INSERT INTO keys (key_id, user_telegram_id, expiration_date, name,"
+            " protocol_type, server_id) VALUES (?, ?, ?, ?, 'vless', ?)",
+            (
+                (
+                    f"seed-{i}",
+                    i // 2,
+                    (now + timedelta(days=i % 60)).isoformat(" "),
+                    f"key {i}",
+                    i % 100 + 1,
+                )
+                for i in range(SEED_KEYS)
+            ),
+        )
+    connection.close()
+
+
+def bot_write(engine, worker: int, i: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO keys (key_id, user_telegram_id, expiration_date,"
+                " protocol_type, server_id)"
+                " VALUES (:key_id, :user, :exp, 'vless', :server)"
+            ),
+            {
+                "key_id": f"bot-{worker}-{i}",
+                "user": random.randrange(SEED_KEYS // 2),
+                "exp": datetime.now().isoformat(" "),
+                "server": random.randint(1, 100),
+            },
+        )
+        conn.execute(
+            text("UPDATE servers SET cnt_users = cnt_users + 1 WHERE id = :id"),
+            {"id": random.randint(1, 100)},
+        )
+
+
+def cron_scan(engine, worker: int, i: int) -> None:
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=1000).execute(
+            text(
+                "SELECT key_id, user_telegram_id, expiration_date FROM keys"
+                " ORDER BY user_telegram_id"
+            )
+        )
+        for _ in result:
+            pass
+
+
+def redirect_read(engine, worker: int, i: int) -> None:
+    with engine.connect() as conn:
+        conn.execute(
+            text("SELECT * FROM keys WHERE key_id = :key_id"),
+            {"key_id": f"seed-{random.randrange(SEED_KEYS)}"},
+        ).all()
+
+
+# роль: (операция, пауза между операциями в секундах)
+ROLES = {
+    "bot": (bot_write, 0),
+    "cron": (cron_scan, 0.05),
+    "redirect": (redirect_read, 0),
+}
+
+
+def run_role(args) -> tuple[str, list[float], int]:
+    path, profile, role, worker, stop_at = args
+    operation, pause = ROLES[role]
+    engine = make_engine(path, profile)
+    latencies, errors, i = [], 0, 0
+    while time.monotonic() < stop_at:
+        i += 1
+        start = time.perf_counter()
+        try:
+            operation(engine, worker, i)
+        except OperationalError:
+            # "database is locked" — блокировку не дождались
+            errors += 1
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(pause)
+    engine.dispose()
+    return role, latencies, errors
+
+
+def run_profile(profile: str, seconds: float, readers: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vpn_users.db")
+        prepare_database(path)
+        stop_at = time.monotonic() + seconds
+        tasks = [
+            (path, profile, "bot", 0, stop_at),
+            (path, profile, "cron", 0, stop_at),
+        ]
+        tasks += [(path, profile, "redirect", i, stop_at) for i in range(readers)]
+        with multiprocessing.Pool(len(tasks)) as pool:
+            results = pool.map(run_role, tasks)
+
+    summary = {}
+    for role in ROLES:
+        latencies = [ms for r, values, _ in results if r == role for ms in values]
+        errors = sum(e for r, _, e in results if r == role)
+        ops = len(latencies)
+        latencies = sorted(latencies) or [0.0]
+        summary[role] = {
+            "ops": ops,
+            "errors": errors,
+            "p50": statistics.median(latencies),
+            "p99": latencies[int((len(latencies) - 1) * 0.99)],
+            "max": latencies[-1],
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10, help="Длительность")
+    parser.add_argument(
+        "--readers", type=int, default=2, help="Процессов сервера перенаправлений"
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'профиль':<8} {'роль':<9} {'операций':>9} {'ошибок':>7} "
+        f"{'p50, мс':>9} {'p99, мс':>9} {'max, мс':>9}"
+    )
+    for profile in ("default", "tuned"):
+        for role, row in run_profile(profile, args.seconds, args.readers).items():
+            print(
+                f"{profile:<8} {role:<9} {row['ops']:>9} {row['errors']:>7} "
+                f"{row['p50']:>9.2f} {row['p99']:>9.2f} {row['max']:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -45,6 +45,17 @@ class OutlineKey:
         )
 
 
+@dataclass
+class KeyUsage:
+    """
+    Трафик и лимит ключа на сервере (используется при пакетной синхронизации лимитов)
+    """
+
+    key_id: str
+    used_bytes: int
+    data_limit: Optional[int]
+
+
 @dataclass
 class VlessKey:
     """
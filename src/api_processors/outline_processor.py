@@ -1,16 +1,17 @@
 import asyncio
 import base64
 import json
+import os
 import re
-import typing
 import logging
 
 import aiohttp
 import asyncssh
 from coolname import generate_slug
 
-from api_processors.key_models import OutlineKey
+from api_processors.key_models import KeyUsage, OutlineKey
 from api_processors.base_processor import BaseProcessor
+from api_processors.session_pool import ServerSessionPool
 from bot.routers.admin_router_sending_message import (
     send_error_report,
     send_new_server_report,
@@ -43,101 +44,130 @@ def get_aiohttp_fingerprint(ssl_assert_fingerprint: str) -> aiohttp.Fingerprint:
     return aiohttp.Fingerprint(base64.b16decode(fingerprint, casefold=True))
 
 
-class OutlineProcessor(BaseProcessor):
+# Таймаут одного запроса к Outline API (в секундах)
+OUTLINE_REQUEST_TIMEOUT = float(os.getenv("OUTLINE_REQUEST_TIMEOUT", 15))
+# Максимальное число одновременных соединений с одним сервером
+OUTLINE_MAX_CONNECTIONS = int(os.getenv("OUTLINE_MAX_CONNECTIONS", 10))
+# Сколько секунд держать неактивное keep-alive соединение открытым
+OUTLINE_KEEPALIVE_TIMEOUT = float(os.getenv("OUTLINE_KEEPALIVE_TIMEOUT", 30))
+# Через сколько секунд простоя сессия сервера закрывается
+OUTLINE_SESSION_IDLE_TTL = float(os.getenv("OUTLINE_SESSION_IDLE_TTL", 600))
+
+
+class OutlineConnection:
     """
-    Класс для работы с сервером Outline
+    Подключение к Outline API одного сервера.
+    Сессия использует собственный `TCPConnector`, закрепленный на отпечатке сертификата сервера.
     """
 
-    def __init__(self):
-        self.api_url = None
-        self.cert_sha256 = None
-        self.session: aiohttp.ClientSession | None = None
-        self.server_id = None
+    def __init__(self, server):
+        """
+        :param server: Объект сервера с полями `id`, `api_url` и `cert_sha256`.
+        """
+        self.server_id = server.id
+        self.api_url = server.api_url
+        connector = aiohttp.TCPConnector(
+            ssl=get_aiohttp_fingerprint(ssl_assert_fingerprint=server.cert_sha256),
+            limit=OUTLINE_MAX_CONNECTIONS,
+            keepalive_timeout=OUTLINE_KEEPALIVE_TIMEOUT,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=OUTLINE_REQUEST_TIMEOUT),
+        )
 
-    @staticmethod
-    def create_server_session_by_id(func) -> typing.Callable:
+    async def close(self) -> None:
         """
-        Декоратор для создания сессии для сервера по его id
-        Если сессия уже создана, то она не будет создана заново
-        :return:
+        Закрывает сессию и все соединения коннектора.
         """
+        await self.session.close()
 
-        async def wrapper(self, *args, **kwargs):
-            if self.session is None:
-                if kwargs.get("server_id") is None:
-                    raise ValueError(
-                        "!!!server_id must be passed as a keyword argument!!!"
-                    )
 
-                server_id = kwargs.get("server_id")
+class OutlineProcessor(BaseProcessor):
+    """
+    Класс для работы с серверами Outline
+    """
 
-                server = get_db_processor().get_server_by_id(server_id)
-                self.api_url = server.api_url
-                self.server_id = server_id
-                connector = aiohttp.TCPConnector(
-                    ssl=get_aiohttp_fingerprint(
-                        ssl_assert_fingerprint=server.cert_sha256
-                    )
-                )
-                session = aiohttp.ClientSession(connector=connector)
-                self.session = session
+    def __init__(self):
+        self._pool = ServerSessionPool(
+            factory=self._open_connection, idle_ttl=OUTLINE_SESSION_IDLE_TTL
+        )
 
-            return await func(self, *args, **kwargs)
+    @staticmethod
+    async def _open_connection(server_id: int, server=None) -> OutlineConnection:
+        """
+        Фабрика подключений для пула.
+
+        :param server_id: ID сервера.
+        :param server: Уже загруженный объект сервера. Если не передан, сервер берется из БД.
+        :return: OutlineConnection
+        :raises ValueError: Если сервера нет в БД или он еще не настроен
+            (не заданы `api_url` и `cert_sha256`).
+        """
+        if server is None:
+            server = await get_db_processor().get_server_by_id(server_id)
+            if server is None:
+                raise ValueError(f"Сервер с ID {server_id} не найден в базе данных")
+        if not server.api_url or not server.cert_sha256:
+            raise ValueError(
+                f"Сервер Outline {server_id} не настроен: нет api_url или cert_sha256"
+            )
+        return OutlineConnection(server)
 
-        return wrapper
+    async def _get_connection(self, server_id, server=None) -> OutlineConnection:
+        """
+        Возвращает подключение к серверу из пула.
 
-    async def create_server_session(self) -> None:
+        :param server_id: Идентификатор сервера.
+        :param server: Уже загруженный объект сервера (необязательно).
+        :return: OutlineConnection
+        :raises ValueError: Если `server_id` не передан.
+        """
+        if server_id is None:
+            raise ValueError("!!!server_id must be passed as a keyword argument!!!")
+        return await self._pool.get(server_id, server)
+
+    async def create_server_session(self) -> OutlineConnection:
         """
-        Инициализирует сессию HTTP-клиента для сервера с минимальным числом пользователей.
+        Возвращает подключение к серверу с минимальным числом пользователей.
 
         Метод выполняет следующие шаги:
         1. Получает сервер с минимальным количеством пользователей, использующий протокол "Outline".
-        2. Сохраняет URL API и идентификатор сервера в атрибутах объекта.
-        3. Создает `aiohttp.ClientSession` с SSL-коннектором, настроенным на отпечаток сертификата сервера.
+        2. Берет из пула подключение к этому серверу (или создает новое).
 
-        :return: None
+        :return: OutlineConnection
         """
 
         server = await get_db_processor().get_server_with_min_users("outline")
+        return await self._get_connection(server.id, server)
 
-        self.api_url = server.api_url
-        self.server_id = server.id
-
-        ssl_context = get_aiohttp_fingerprint(ssl_assert_fingerprint=server.cert_sha256)
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-
-        self.session = aiohttp.ClientSession(connector=connector)
-
-    async def create_server_session_for_server(self, server) -> None:
+    async def create_server_session_for_server(self, server) -> OutlineConnection:
         """
-        Создает сессию для конкретного сервера
+        Возвращает подключение к конкретному серверу
         :param server: Объект сервера
-        :return: None
+        :return: OutlineConnection
         """
-        self.api_url = server.api_url
-        self.server_id = server.id
-        connector = aiohttp.TCPConnector(
-            ssl=get_aiohttp_fingerprint(ssl_assert_fingerprint=server.cert_sha256)
-        )
-        self.session = aiohttp.ClientSession(connector=connector)
+        return await self._get_connection(server.id, server)
 
-    async def _get_metrics(self) -> dict:
+    @staticmethod
+    async def _get_metrics(conn: OutlineConnection) -> dict:
         """
         Получает метрики с Outline сервера
         :return:
         """
-        async with self.session.get(url=f"{self.api_url}/metrics/transfer") as resp:
+        async with conn.session.get(url=f"{conn.api_url}/metrics/transfer") as resp:
             resp_json = await resp.json()
             if resp.status >= 400 or "bytesTransferredByUserId" not in resp_json:
                 raise OutlineServerErrorException("Unable to get metrics")
             return resp_json
 
-    async def _get_raw_keys(self) -> list[OutlineKey]:
+    @staticmethod
+    async def _get_raw_keys(conn: OutlineConnection) -> list[OutlineKey]:
         """
         Получает все ключи с сервера
         :return:
         """
-        async with self.session.get(url=f"{self.api_url}/access-keys/") as resp:
+        async with conn.session.get(url=f"{conn.api_url}/access-keys/") as resp:
             response_data = await resp.json()
             if resp.status != 200 or "accessKeys" not in response_data:
                 raise OutlineServerErrorException("Unable to retrieve keys")
@@ -151,9 +181,9 @@ class OutlineProcessor(BaseProcessor):
         Создает ключ для подключения к VPN
         :return: Кортеж из ключа и id сервера
         """
-        await self.create_server_session()
+        conn = await self.create_server_session()
 
-        async with self.session.post(url=f"{self.api_url}/access-keys/") as resp:
+        async with conn.session.post(url=f"{conn.api_url}/access-keys/") as resp:
             if resp.status != 201:
                 raise OutlineServerErrorException("Unable to create key")
             key_data = await resp.json()
@@ -164,27 +194,28 @@ class OutlineProcessor(BaseProcessor):
         key_name = generate_slug(2).replace("-", " ")
         data_limit = 200 * 1024**3
 
-        await self.rename_key(tmp_key.key_id, key_name)
-        await self.update_data_limit(tmp_key.key_id, data_limit, self.server_id)
+        await self.rename_key(tmp_key.key_id, key_name, server_id=conn.server_id)
+        await self.update_data_limit(
+            tmp_key.key_id, data_limit, server_id=conn.server_id
+        )
 
         key_data["name"] = key_name
         key_data["used_bytes"] = 0
         key_data["dataLimit"] = {"bytes": data_limit}
 
         outline_key = OutlineKey.from_key_json(key_data)
-        return outline_key, self.server_id
+        return outline_key, conn.server_id
 
-    @create_server_session_by_id
     async def get_key_info(self, key_id: int, server_id=None) -> OutlineKey:
         """
         Получает информацию по ключу.
-        Обратите внимание, что server_id необходимо передавать как именованный параметр.
 
         :param key_id: Идентификатор ключа.
         :param server_id: Идентификатор сервера.
         :return: Экземпляр OutlineKey с обновленной информацией.
         """
-        async with self.session.get(url=f"{self.api_url}/access-keys/{key_id}") as resp:
+        conn = await self._get_connection(server_id)
+        async with conn.session.get(url=f"{conn.api_url}/access-keys/{key_id}") as resp:
             if resp.status != 200:
                 raise OutlineServerErrorException("Unable to retrieve keys")
             key_json = await resp.json()
@@ -192,7 +223,7 @@ class OutlineProcessor(BaseProcessor):
         client_data = OutlineKey.from_key_json(key_json)
         # print(client_data)
 
-        current_metrics = await self._get_metrics()
+        current_metrics = await self._get_metrics(conn)
         # print(json.dumps(current_metrics.get("bytesTransferredByUserId"), indent=4))
 
         client_data.used_bytes = current_metrics.get(
@@ -200,7 +231,6 @@ class OutlineProcessor(BaseProcessor):
         ).get(str(client_data.key_id), 0)
         return client_data
 
-    @create_server_session_by_id
     async def delete_key(self, key_id: int, server_id=None) -> bool:
         """
         Удаляет ключ с сервера.
@@ -209,12 +239,12 @@ class OutlineProcessor(BaseProcessor):
         :param server_id: Идентификатор сервера.
         :return: True, если удаление прошло успешно.
         """
-        async with self.session.delete(
-            url=f"{self.api_url}/access-keys/{key_id}"
+        conn = await self._get_connection(server_id)
+        async with conn.session.delete(
+            url=f"{conn.api_url}/access-keys/{key_id}"
         ) as resp:
             return resp.status == 204
 
-    @create_server_session_by_id
     async def rename_key(self, key_id, new_key_name, server_id=None) -> bool:
         """
         Переименовывает ключ.
@@ -224,37 +254,55 @@ class OutlineProcessor(BaseProcessor):
         :param server_id: Идентификатор сервера.
         :return: True, если операция прошла успешно.
         """
-        async with self.session.put(
-            url=f"{self.api_url}/access-keys/{key_id}/name", data={"name": new_key_name}
+        conn = await self._get_connection(server_id)
+        async with conn.session.put(
+            url=f"{conn.api_url}/access-keys/{key_id}/name", data={"name": new_key_name}
         ) as resp:
             return resp.status == 204
 
     async def _fulfill_keys_with_metrics(
-        self, keys: list[OutlineKey]
+        self, conn: OutlineConnection, keys: list[OutlineKey]
     ) -> list[OutlineKey]:
         """
         Обогащает список ключей информацией о переданных данных.
 
+        :param conn: Подключение к серверу.
         :param keys: Список OutlineKey.
         :return: Обновленный список OutlineKey.
         """
-        current_metrics = await self._get_metrics()
+        current_metrics = await self._get_metrics(conn)
         for key in keys:
             key.used_bytes = current_metrics.get("bytesTransferredByUserId", {}).get(
-                key.key_id, 0
+                str(key.key_id), 0
             )
         return keys
 
-    @create_server_session_by_id
     async def get_keys(self, server_id) -> list[OutlineKey]:
         """
         Получает список всех ключей с сервера Outline.
         """
-        raw_keys = await self._get_raw_keys()
-        result_keys = await self._fulfill_keys_with_metrics(keys=raw_keys)
+        conn = await self._get_connection(server_id)
+        raw_keys = await self._get_raw_keys(conn)
+        result_keys = await self._fulfill_keys_with_metrics(conn, keys=raw_keys)
         return result_keys
 
-    @create_server_session_by_id
+    async def get_keys_usage(self, server_id: int) -> dict[str, KeyUsage]:
+        """
+        Получает трафик и лимиты всех ключей сервера за два запроса (ключи и метрики).
+
+        :param server_id: Идентификатор сервера.
+        :return: Словарь {key_id: KeyUsage}.
+        """
+        keys = await self.get_keys(server_id)
+        return {
+            str(key.key_id): KeyUsage(
+                key_id=str(key.key_id),
+                used_bytes=key.used_bytes,
+                data_limit=key.data_limit,
+            )
+            for key in keys
+        }
+
     async def update_data_limit(
         self, key_id: int, new_limit_bytes: int, server_id: int = None, key_name=None
     ) -> bool:
@@ -265,13 +313,13 @@ class OutlineProcessor(BaseProcessor):
         :param new_limit_bytes: Лимит в байтах.
         :return: True, если операция прошла успешно.
         """
+        conn = await self._get_connection(server_id)
         data = {"limit": {"bytes": new_limit_bytes}}
-        async with self.session.put(
-            url=f"{self.api_url}/access-keys/{key_id}/data-limit", json=data
+        async with conn.session.put(
+            url=f"{conn.api_url}/access-keys/{key_id}/data-limit", json=data
         ) as resp:
             return resp.status == 204
 
-    @create_server_session_by_id
     async def delete_data_limit(self, key_id: int, server_id: int) -> bool:
         """
         Убирает лимит передачи данных для ключа.
@@ -279,90 +327,89 @@ class OutlineProcessor(BaseProcessor):
         :param key_id: Идентификатор ключа.
         :return: True, если операция прошла успешно.
         """
-        async with self.session.delete(
-            url=f"{self.api_url}/access-keys/{key_id}/data-limit"
+        conn = await self._get_connection(server_id)
+        async with conn.session.delete(
+            url=f"{conn.api_url}/access-keys/{key_id}/data-limit"
         ) as resp:
             return resp.status == 204
 
-    async def get_transferred_data(self) -> dict:
+    async def get_transferred_data(self, server_id: int) -> dict:
         """
         Получает данные о передаче для всех ключей.
 
         :return: Словарь с информацией о переданных байтах по каждому ключу.
         """
-        async with self.session.get(url=f"{self.api_url}/metrics/transfer") as resp:
-            resp_json = await resp.json()
-            if resp.status >= 400 or "bytesTransferredByUserId" not in resp_json:
-                raise OutlineServerErrorException("Unable to get metrics")
-        return resp_json
+        conn = await self._get_connection(server_id)
+        return await self._get_metrics(conn)
 
     async def get_server_info(self, server) -> dict:
         """
         Получает информацию о сервере.
 
-        :param server: Объект сервера с полями api_url и cert_sha256.
+        :param server: Объект сервера с полями id, api_url и cert_sha256.
         :return: Словарь с информацией о сервере.
         """
-
-        ssl_context = get_aiohttp_fingerprint(ssl_assert_fingerprint=server.cert_sha256)
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            async with session.get(url=f"{server.api_url}/server") as resp:
-                resp_json = await resp.json()
-                if resp.status != 200:
-                    raise OutlineServerErrorException(
-                        "Unable to get information about the server"
-                    )
+        conn = await self._get_connection(server.id, server)
+        async with conn.session.get(url=f"{conn.api_url}/server") as resp:
+            resp_json = await resp.json()
+            if resp.status != 200:
+                raise OutlineServerErrorException(
+                    "Unable to get information about the server"
+                )
         return resp_json
 
-    async def set_server_name(self, name: str) -> bool:
+    async def set_server_name(self, name: str, server_id: int) -> bool:
         """
         Переименовывает сервер.
 
         :param name: Новое имя сервера.
         :return: True, если операция прошла успешно.
         """
+        conn = await self._get_connection(server_id)
         data = {"name": name}
-        async with self.session.put(url=f"{self.api_url}/name", json=data) as resp:
+        async with conn.session.put(url=f"{conn.api_url}/name", json=data) as resp:
             return resp.status == 204
 
-    async def set_hostname(self, hostname: str) -> bool:
+    async def set_hostname(self, hostname: str, server_id: int) -> bool:
         """
         Изменяет hostname для доступа к ключам.
 
         :param hostname: Новый hostname.
         :return: True, если операция прошла успешно.
         """
+        conn = await self._get_connection(server_id)
         data = {"hostname": hostname}
-        async with self.session.put(
-            url=f"{self.api_url}/server/hostname-for-access-keys", json=data
+        async with conn.session.put(
+            url=f"{conn.api_url}/server/hostname-for-access-keys", json=data
         ) as resp:
             return resp.status == 204
 
-    async def get_metrics_status(self) -> bool:
+    async def get_metrics_status(self, server_id: int) -> bool:
         """
         Проверяет, включены ли метрики на сервере.
 
         :return:
         """
-        async with self.session.get(url=f"{self.api_url}/metrics/enabled") as resp:
+        conn = await self._get_connection(server_id)
+        async with conn.session.get(url=f"{conn.api_url}/metrics/enabled") as resp:
             resp_json = await resp.json()
             return resp_json.get("metricsEnabled", False)
 
-    async def set_metrics_status(self, status: bool) -> bool:
+    async def set_metrics_status(self, status: bool, server_id: int) -> bool:
         """
         Включает или выключает передачу метрик.
 
         :param status: True для включения, False для выключения.
         :return: True, если операция прошла успешно.
         """
+        conn = await self._get_connection(server_id)
         data = {"metricsEnabled": status}
-        async with self.session.put(
-            url=f"{self.api_url}/metrics/enabled", json=data
+        async with conn.session.put(
+            url=f"{conn.api_url}/metrics/enabled", json=data
         ) as resp:
             return resp.status == 204
 
-    async def set_port_new_for_access_keys(self, port: int) -> bool:
+    async def set_port_new_for_access_keys(self, port: int, server_id: int) -> bool:
         """
         Устанавливает порт для создания новых ключей.
 
@@ -370,9 +417,10 @@ class OutlineProcessor(BaseProcessor):
         :return: True, если операция прошла успешно.
         :raises OutlineServerErrorException: При некорректном порте или конфликте.
         """
+        conn = await self._get_connection(server_id)
         data = {"port": port}
-        async with self.session.put(
-            url=f"{self.api_url}/server/port-for-new-access-keys", json=data
+        async with conn.session.put(
+            url=f"{conn.api_url}/server/port-for-new-access-keys", json=data
         ) as resp:
             if resp.status == 400:
                 raise OutlineServerErrorException(
@@ -384,56 +432,39 @@ class OutlineProcessor(BaseProcessor):
                 )
             return resp.status == 204
 
-    async def set_data_limit_for_all_keys(self, limit_bytes: int) -> bool:
+    async def set_data_limit_for_all_keys(
+        self, limit_bytes: int, server_id: int
+    ) -> bool:
         """
         Устанавливает лимит передачи данных для всех ключей.
 
         :param limit_bytes: Лимит в байтах.
         :return: True, если операция прошла успешно.
         """
+        conn = await self._get_connection(server_id)
         data = {"limit": {"bytes": limit_bytes}}
-        async with self.session.put(
-            url=f"{self.api_url}/server/access-key-data-limit", json=data
+        async with conn.session.put(
+            url=f"{conn.api_url}/server/access-key-data-limit", json=data
         ) as resp:
             return resp.status == 204
 
-    async def delete_data_limit_for_all_keys(self) -> bool:
+    async def delete_data_limit_for_all_keys(self, server_id: int) -> bool:
         """
         Убирает лимит передачи данных для всех ключей.
 
         :return: True, если операция прошла успешно.
         """
-        async with self.session.delete(
-            url=f"{self.api_url}/server/access-key-data-limit"
+        conn = await self._get_connection(server_id)
+        async with conn.session.delete(
+            url=f"{conn.api_url}/server/access-key-data-limit"
         ) as resp:
             return resp.status == 204
 
-    async def _close(self) -> None:
-        """
-        Закрывает активную сессию.
-        """
-        if self.session:
-            await self.session.close()
-
     async def close(self):
         """
-        Публичный метод для закрытия сессии.
-        """
-        if self.session:
-            await self.session.close()
-
-    def __del__(self) -> None:
-        """
-        Деструктор, пытающийся корректно закрыть сессию при уничтожении объекта.
+        Закрывает сессии всех серверов.
         """
-        if self.session is None:
-            return
-        try:
-            loop = asyncio.get_running_loop()
-            loop.create_task(self._close())
-        except RuntimeError:
-            # Нет активного event loop — пропускаем асинхронное закрытие
-            pass
+        await self._pool.close_all()
 
     @staticmethod
     def extract_outline_config(output: str) -> dict | None:
@@ -499,9 +530,11 @@ class OutlineProcessor(BaseProcessor):
                         api_url=config["apiUrl"],
                         cert_sha256=config["certSha256"],
                     )
-                    get_db_processor().update_server_by_id(
+                    await get_db_processor().update_server_by_id(
                         server.id, config["apiUrl"], config["certSha256"]
                     )
+                    # Подключение из пула закреплено за прежними адресом и отпечатком
+                    await self._pool.invalidate(server.id)
                     logger.info(f"Сервер настроен.")
                     return True  # Успешно – возвращаем True
             except Exception as e:
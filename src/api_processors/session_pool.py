@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+class ServerSessionPool:
+    """
+    Пул подключений к VPN-серверам, по одному подключению на `Server.id`.
+
+    Подключение создается фабрикой при первом обращении к серверу и затем
+    переиспользуется всеми операциями над ключами этого сервера.
+    Подключения, которые не использовались дольше `idle_ttl` секунд, закрываются.
+    Объект подключения должен иметь асинхронный метод `close()`.
+    """
+
+    def __init__(
+        self,
+        factory: typing.Callable[..., typing.Awaitable[typing.Any]],
+        idle_ttl: float,
+    ):
+        """
+        :param factory: Корутина, создающая подключение: `factory(server_id, *args)`.
+        :param idle_ttl: Время простоя (в секундах), после которого подключение закрывается.
+        """
+        self._factory = factory
+        self._idle_ttl = idle_ttl
+        self._connections: dict[int, typing.Any] = {}
+        self._last_used: dict[int, float] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+
+    async def get(self, server_id: int, *args) -> typing.Any:
+        """
+        Возвращает подключение к серверу, создавая его при необходимости.
+        Одновременные запросы к одному и тому же серверу создадут только одно подключение.
+
+        :param server_id: ID сервера.
+        :param args: Дополнительные аргументы для фабрики (например, уже загруженный объект сервера).
+        :return: Подключение к серверу.
+        """
+        await self._evict_idle()
+
+        connection = self._connections.get(server_id)
+        if connection is None:
+            lock = self._locks.setdefault(server_id, asyncio.Lock())
+            async with lock:
+                connection = self._connections.get(server_id)
+                if connection is None:
+                    connection = await self._factory(server_id, *args)
+                    self._connections[server_id] = connection
+                    logger.debug(f"Создано подключение к серверу {server_id}")
+
+        self._last_used[server_id] = time.monotonic()
+        return connection
+
+    async def invalidate(self, server_id: int) -> None:
+        """
+        Закрывает подключение к серверу и удаляет его из пула.
+
+        :param server_id: ID сервера.
+        """
+        connection = self._connections.pop(server_id, None)
+        self._last_used.pop(server_id, None)
+        if connection is not None:
+            await connection.close()
+            logger.debug(f"Закрыто подключение к серверу {server_id}")
+
+    async def close_all(self) -> None:
+        """
+        Закрывает все подключения пула.
+        """
+        for server_id in list(self._connections):
+            await self.invalidate(server_id)
+
+    async def _evict_idle(self) -> None:
+        """
+        Закрывает подключения, простаивающие дольше `idle_ttl`.
+        """
+        now = time.monotonic()
+        idle = [
+            server_id
+            for server_id, last_used in self._last_used.items()
+            if now - last_used > self._idle_ttl
+        ]
+        for server_id in idle:
+            await self.invalidate(server_id)
+
+    def __contains__(self, server_id: int) -> bool:
+        return server_id in self._connections
+
+    def __len__(self) -> int:
+        return len(self._connections)
@@ -1,10 +1,13 @@
 import aiohttp
+import asyncio
 import certifi
 import ssl
 import os
 import logging
+from functools import lru_cache
 
 from bot.routers.admin_router_sending_message import send_error_report
+from utils.ttl_cache import TTLCache
 from dotenv import load_dotenv
 
 
@@ -13,6 +16,42 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 token = os.getenv("VDSINA_TOKEN")
+# Максимальное число одновременных соединений с API VDSina
+VDSINA_CONNECTIONS_LIMIT = int(os.getenv("VDSINA_CONNECTIONS_LIMIT", 10))
+# Общий таймаут одного запроса к API VDSina (в секундах)
+VDSINA_REQUEST_TIMEOUT = float(os.getenv("VDSINA_REQUEST_TIMEOUT", 30))
+# Таймаут установки соединения (в секундах)
+VDSINA_CONNECT_TIMEOUT = float(os.getenv("VDSINA_CONNECT_TIMEOUT", 10))
+# Сколько секунд держать неиспользуемое соединение открытым
+VDSINA_KEEPALIVE_TIMEOUT = float(os.getenv("VDSINA_KEEPALIVE_TIMEOUT", 60))
+# Сколько секунд справочники (дата-центры, тарифы, ОС) считаются свежими
+VDSINA_CATALOG_TTL = int(os.getenv("VDSINA_CATALOG_TTL", 60 * 60))
+# Сколько секунд после этого отдавать устаревший справочник, обновляя его в фоне
+VDSINA_CATALOG_STALE_TTL = int(os.getenv("VDSINA_CATALOG_STALE_TTL", 24 * 60 * 60))
+# Файл для сохранения справочников между перезапусками (пустая строка — не сохранять)
+VDSINA_CATALOG_CACHE_PATH = os.getenv(
+    "VDSINA_CATALOG_CACHE_PATH",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "..",
+        "database",
+        "vdsina_catalog_cache.json",
+    ),
+)
+
+SUPPORTED_METHODS = ("GET", "POST", "PUT", "DELETE")
+
+
+class _NotCacheable(Exception):
+    """Ответ API с ошибкой, который не нужно сохранять в кэш"""
+
+
+@lru_cache(maxsize=1)
+def get_ssl_context() -> ssl.SSLContext:
+    """
+    Создает SSL-контекст с сертификатами certifi один раз на процесс.
+    """
+    return ssl.create_default_context(cafile=certifi.where())
 
 
 class VDSinaAPI:
@@ -21,6 +60,45 @@ class VDSinaAPI:
         self.email = None
         self.password = None
         self.base_url = "https://userapi.vdsina.com/v1"
+        self._session: aiohttp.ClientSession | None = None
+        self._session_lock = asyncio.Lock()
+        self._auth_lock = asyncio.Lock()
+        self.catalog_cache = TTLCache(
+            ttl=VDSINA_CATALOG_TTL,
+            stale_ttl=VDSINA_CATALOG_STALE_TTL,
+            path=VDSINA_CATALOG_CACHE_PATH or None,
+        )
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Возвращает общую HTTP-сессию, создавая ее при первом обращении.
+        Соединения переиспользуются между запросами (keep-alive),
+        поэтому TLS-рукопожатие выполняется один раз на соединение.
+        """
+        if self._session is None or self._session.closed:
+            async with self._session_lock:
+                if self._session is None or self._session.closed:
+                    self._session = aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(
+                            ssl=get_ssl_context(),
+                            limit=VDSINA_CONNECTIONS_LIMIT,
+                            keepalive_timeout=VDSINA_KEEPALIVE_TIMEOUT,
+                            ttl_dns_cache=300,
+                        ),
+                        timeout=aiohttp.ClientTimeout(
+                            total=VDSINA_REQUEST_TIMEOUT,
+                            connect=VDSINA_CONNECT_TIMEOUT,
+                        ),
+                    )
+        return self._session
+
+    async def close(self) -> None:
+        """
+        Закрывает общую HTTP-сессию.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
     async def authenticate(
         self, email: str | None = None, password: str | None = None
@@ -53,84 +131,141 @@ class VDSinaAPI:
         url = f"{self.base_url}/auth"
         payload = {"email": self.email, "password": self.password}
         headers = {"Content-Type": "application/json"}
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-
-        async with aiohttp.ClientSession(
-            connector=aiohttp.TCPConnector(ssl=ssl_context)
-        ) as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                response_data = await response.json()
-                if response_data.get("status") == "ok":
-                    self.token = response_data["data"]["token"]
-                    logger.info(
-                        f"Авторизация успешна. Получен токен: {self.token[:10]}..."
-                    )
-                else:
-                    raise Exception(
-                        "Ошибка авторизации: "
-                        + response_data.get("status_msg", "Неизвестная ошибка")
-                    )
 
-    async def request(self, method: str, endpoint: str, data: dict | None = None):
+        session = await self._get_session()
+        async with session.post(url, json=payload, headers=headers) as response:
+            response_data = await response.json()
+            if response_data.get("status") == "ok":
+                self.token = response_data["data"]["token"]
+                logger.info(
+                    f"Авторизация успешна. Получен токен: {self.token[:10]}..."
+                )
+            else:
+                raise Exception(
+                    "Ошибка авторизации: "
+                    + response_data.get("status_msg", "Неизвестная ошибка")
+                )
+
+    async def _refresh_token(self, stale_token: str | None) -> None:
+        """
+        Получает новый токен, если он еще не обновлен другим запросом.
+        :param stale_token: Токен, с которым запрос получил отказ в авторизации.
+        """
+        async with self._auth_lock:
+            if self.token != stale_token:
+                return
+            logger.info("Токен VDSina недействителен, повторная авторизация...")
+            await self.authenticate()
+
+    @staticmethod
+    def _is_auth_error(response: aiohttp.ClientResponse, response_data) -> bool:
+        if response.status in (401, 403):
+            return True
+        return isinstance(response_data, dict) and response_data.get(
+            "status_code"
+        ) in (401, 403)
+
+    async def request(
+        self,
+        method: str,
+        endpoint: str,
+        data: dict | None = None,
+        timeout: float | None = None,
+    ):
         """
         Универсальный метод для отправки запросов к API VDSina.
 
         :param method: HTTP-метод для запроса (GET, POST, PUT, DELETE).
         :param endpoint: Эндпоинт API, к которому будет сделан запрос.
         :param data: Данные, которые отправляются в запросе (для POST, PUT).
+        :param timeout: Таймаут запроса в секундах (по умолчанию VDSINA_REQUEST_TIMEOUT).
 
-        :raises Exception: Если не установлен авторизационный токен.
+        :raises Exception: Если не установлен авторизационный токен и нет данных для входа.
         :raises ValueError: Если метод запроса не поддерживается.
 
         :return: Ответ от сервера в виде JSON.
 
         Алгоритм работы:
-        1. Проверяет наличие авторизационного токена.
-        2. Формирует полный URL для запроса.
-        3. Отправляет запрос соответствующего метода (GET, POST, PUT, DELETE).
+        1. Проверяет метод запроса и наличие авторизационного токена.
+           Если токена нет, но известны email и password, авторизуется.
+        2. Отправляет запрос через общую сессию.
+        3. Если API отвечает ошибкой авторизации (истек токен), освобождает
+           соединение, получает новый токен и повторяет запрос один раз.
+           Одновременные запросы с тем же истекшим токеном авторизуются один раз.
         4. Возвращает результат в виде JSON.
-        5. Если метод не поддерживается, выбрасывает исключение.
         """
+        method = method.upper()
+        if method not in SUPPORTED_METHODS:
+            await send_error_report(f"Неподдерживаемый метод запроса: {method}")
+            raise ValueError(f"Неподдерживаемый метод запроса: {method}")
+
         if not self.token:
-            # Можно либо вызвать authenticate, либо выдать ошибку
-            raise Exception(
-                "Нет авторизационного токена. Сначала вызовите authenticate()."
-            )
+            if not (self.email and self.password):
+                raise Exception(
+                    "Нет авторизационного токена. Сначала вызовите authenticate()."
+                )
+            await self._refresh_token(None)
 
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
         url = f"{self.base_url}{endpoint}"
-        headers = {"Authorization": self.token, "Content-Type": "application/json"}
-
-        async with aiohttp.ClientSession(
-            connector=aiohttp.TCPConnector(ssl=ssl_context)
-        ) as session:
-            if method.upper() == "GET":
-                async with session.get(url, headers=headers) as response:
-                    return await response.json()
-            elif method.upper() == "POST":
-                async with session.post(url, json=data, headers=headers) as response:
-                    return await response.json()
-            elif method.upper() == "PUT":
-                async with session.put(url, json=data, headers=headers) as response:
-                    return await response.json()
-            elif method.upper() == "DELETE":
-                async with session.delete(url, json=data, headers=headers) as response:
-                    return await response.json()
-            else:
-                await send_error_report(f"Неподдерживаемый метод запроса: {method}")
-                raise ValueError(f"Неподдерживаемый метод запроса: {method}")
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+        session = await self._get_session()
+
+        for attempt in range(2):
+            token_used = self.token
+            headers = {"Authorization": token_used, "Content-Type": "application/json"}
+            async with session.request(
+                method,
+                url,
+                json=data if method != "GET" else None,
+                headers=headers,
+                timeout=request_timeout,
+            ) as response:
+                response_data = await response.json(content_type=None)
+                auth_error = self._is_auth_error(response, response_data)
+            # Токен обновляется уже после выхода из контекста ответа,
+            # чтобы не держать соединение на время авторизации
+            if attempt == 0 and self.email and self.password and auth_error:
+                await self._refresh_token(token_used)
+                continue
+            return response_data
+
+    async def _get_catalog(self, endpoint: str) -> dict:
+        """
+        GET-запрос к справочнику через `catalog_cache`.
+        Ответы с ошибкой возвращаются как есть и не кэшируются.
+
+        :param endpoint: Эндпоинт справочника.
+        :return: Ответ от сервера в виде JSON.
+        """
+
+        async def fetch():
+            response = await self.request("GET", endpoint)
+            if response.get("status") != "ok":
+                raise _NotCacheable(response)
+            return response
+
+        try:
+            return await self.catalog_cache.get_or_set(endpoint, fetch)
+        except _NotCacheable as e:
+            return e.args[0]
+
+    def get_cache_stats(self) -> dict:
+        """
+        Возвращает счетчики кэша справочников (попадания, устаревшие попадания, промахи).
+        """
+        return self.catalog_cache.stats
 
     async def get_datacenters(self) -> dict:
         """Получение списка дата-центров"""
-        return await self.request("GET", "/datacenter")
+        return await self._get_catalog("/datacenter")
 
     async def get_server_plans(self, group_id=1) -> dict:
         """Получение списка тарифов"""
-        return await self.request("GET", f"/server-plan/{group_id}")
+        return await self._get_catalog(f"/server-plan/{group_id}")
 
     async def get_templates(self) -> dict:
         """Получение списка доступных ОС"""
-        return await self.request("GET", "/template")
+        return await self._get_catalog("/template")
 
     async def deploy_server(
         self,
@@ -180,6 +315,16 @@ class VDSinaAPI:
         """
         return await self.request("GET", f"/server/{server_id}")
 
+    async def get_server_password(self, server_id):
+        """
+        Получение root-пароля сервера на платформе VDSina.
+
+        :param server_id: Идентификатор сервера.
+
+        :return: Ответ от сервера в виде JSON, содержащий пароль сервера.
+        """
+        return await self.request("GET", f"/server.password/{server_id}")
+
     async def create_new_server(
         self,
         name,
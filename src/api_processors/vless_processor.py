@@ -1,18 +1,17 @@
 from coolname import generate_slug
 from dotenv import load_dotenv
-import requests
 import asyncssh
+import aiohttp
 import asyncio
-import urllib3
 import json
 import uuid
+import time
 import os
 import logging
 
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
 from api_processors.base_processor import BaseProcessor
-from api_processors.key_models import VlessKey
+from api_processors.key_models import KeyUsage, VlessKey
+from api_processors.session_pool import ServerSessionPool
 
 from bot.routers.admin_router_sending_message import (
     send_error_report,
@@ -25,135 +24,236 @@ load_dotenv()
 
 NAME_VPN_CONFIG = "MyNewInbound"
 
+# Учетные данные и порт панели 3x-ui, которые задаются при установке сервера
+PANEL_USERNAME = "lisa_admin"
+PANEL_PORT = 2053
+SUB_PORT = 2096
 
-class VlessProcessor(BaseProcessor):
-    def __init__(self, ip, password):
-        self.ip = None
-        self.sub_port = None
-        self.port_panel = None
-        self.host = None
-        self.data = None
-        self.ses = None
-        self.con = None
-        self.server_id = None
+# Таймаут одного запроса к панели 3x-ui (в секундах)
+PANEL_REQUEST_TIMEOUT = float(os.getenv("VLESS_PANEL_TIMEOUT", 15))
+# Максимальное число одновременных запросов к одной панели
+PANEL_MAX_CONCURRENCY = int(os.getenv("VLESS_PANEL_MAX_CONCURRENCY", 10))
+# Через сколько секунд после входа в панель авторизация обновляется заранее
+PANEL_LOGIN_TTL = float(os.getenv("VLESS_PANEL_LOGIN_TTL", 3600))
+# Через сколько секунд простоя подключение к панели закрывается
+PANEL_SESSION_IDLE_TTL = float(os.getenv("VLESS_PANEL_SESSION_IDLE_TTL", 600))
+
+# Ошибки сети, которые могут возникнуть при обращении к панели
+PANEL_NETWORK_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+# Статусы, которыми панель отвечает на запрос без действующей авторизации
+# (401 для API, редирект на страницу входа для остальных путей)
+PANEL_UNAUTHORIZED_STATUSES = (301, 302, 303, 307, 401)
+
+
+class PanelLoginError(Exception):
+    """
+    Исключение, возникающее при неудачной авторизации в панели 3x-ui
+    """
+
+    pass
+
+
+class PanelConnection:
+    """
+    Авторизованное подключение к панели 3x-ui одного сервера.
+
+    Cookie авторизации хранятся в сессии и переиспользуются всеми запросами.
+    Повторный вход выполняется только при ответе 401 (или редиректе на страницу входа)
+    и по истечении `PANEL_LOGIN_TTL`.
+    """
+
+    def __init__(self, server):
+        """
+        :param server: Объект сервера с атрибутами `id`, `ip` и `password`.
+        """
+        self.server_id = server.id
+        self.ip = server.ip
+        self.host = f"https://{self.ip}:{PANEL_PORT}"
+        self.data = {"username": PANEL_USERNAME, "password": server.password}
+        self.session = self._make_client_session()
+        self.logged_in_at: float | None = None
+        self._semaphore = asyncio.Semaphore(PANEL_MAX_CONCURRENCY)
+        self._login_lock = asyncio.Lock()
 
     @staticmethod
-    def create_server_session_by_id(func):
+    def _make_client_session() -> aiohttp.ClientSession:
         """
-        Декоратор для создания сессии с сервером по переданному ID сервера.
+        Создает HTTP-сессию для работы с панелью 3x-ui.
 
-        :param func: Функция, которую декоратор оборачивает.
+        Панель работает с самоподписанным сертификатом, поэтому проверка SSL отключена.
+        Cookie-jar создается с `unsafe=True`, так как панель адресуется по IP,
+        а по умолчанию aiohttp не сохраняет cookie для IP-адресов.
+        """
+        connector = aiohttp.TCPConnector(
+            ssl=False, limit_per_host=PANEL_MAX_CONCURRENCY
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            timeout=aiohttp.ClientTimeout(total=PANEL_REQUEST_TIMEOUT),
+        )
 
-        :return: Результат выполнения функции, обернутой декоратором.
+    def _login_expired(self) -> bool:
+        return (
+            self.logged_in_at is None
+            or time.monotonic() - self.logged_in_at > PANEL_LOGIN_TTL
+        )
 
-        Алгоритм работы:
-        1. Проверяет, существует ли уже сессия.
-        2. Если сессия не существует, извлекает `server_id` из аргументов функции.
-        3. Если `server_id` не передан, выбрасывает исключение.
-        4. Использует `db_processor` для получения данных о сервере по ID.
-        5. Если сервер не найден, выбрасывает исключение.
-        6. Инициализирует параметры подключения (IP, порт, данные).
-        7. Создает новую сессию с помощью `requests.Session`.
-        8. Выполняет исходную функцию с аргументами.
-        9. В случае ошибки при установке соединения выбрасывает исключение.
-        """
-
-        def wrapper(self, *args, **kwargs):
-            if self.ses is None:
-                server_id = kwargs.get("server_id")
-                if server_id is None:
-                    raise ValueError(
-                        "!!!server_id must be passed as a keyword argument!!!"
-                    )
+    async def login(self, force: bool = False) -> None:
+        """
+        Авторизация в панели.
+        Если несколько запросов одновременно обнаружили устаревшую авторизацию,
+        вход выполнит только первый из них.
 
-                from initialization.db_processor_init import db_processor
+        :param force: Выполнить вход, даже если текущая авторизация еще не истекла.
 
-                server = db_processor.get_server_by_id(server_id)
-                if server is None:
-                    raise ValueError(f"Сервер с ID {server_id} не найден в базе данных")
+        :raises PanelLoginError: Панель отклонила вход или вернула некорректный ответ.
+        :raises aiohttp.ClientError: Ошибка сети при отправке запроса.
+        """
+        logged_in_at = self.logged_in_at
+        async with self._login_lock:
+            if self.logged_in_at != logged_in_at:
+                # Пока ждали блокировку, вход уже выполнил другой запрос
+                return
+            if not force and not self._login_expired():
+                return
+
+            self.session.cookie_jar.clear()
+            status, resp = await self._request("/login", data=self.data)
+            if not isinstance(resp, dict) or resp.get("success") is not True:
+                msg = resp.get("msg") if isinstance(resp, dict) else status
+                logger.warning(
+                    f"🛑Подключение к панели 3x-ui {self.ip} не произошло, ошибка: {msg}"
+                )
+                raise PanelLoginError(f"Не удалось войти в панель {self.ip}: {msg}")
+
+            self.logged_in_at = time.monotonic()
+            logger.debug(f"✅Подключение к панели 3x-ui {self.ip} прошло успешно!")
+
+    async def _request(self, path: str, **kwargs) -> tuple[int, dict | None]:
+        """
+        Отправляет POST-запрос к панели.
+        Число одновременных запросов ограничено `PANEL_MAX_CONCURRENCY`.
+
+        :return: HTTP-статус и JSON-ответ (None, если ответ не является JSON).
+        """
+        async with self._semaphore:
+            async with self.session.post(
+                f"{self.host}{path}", allow_redirects=False, **kwargs
+            ) as resp:
+                if resp.status in PANEL_UNAUTHORIZED_STATUSES:
+                    return resp.status, None
+                return resp.status, await resp.json(content_type=None)
+
+    async def post(self, path: str, **kwargs) -> dict:
+        """
+        Отправляет POST-запрос к панели и возвращает JSON-ответ.
+        При устаревшей авторизации выполняет повторный вход и повторяет запрос один раз.
+
+        :param path: Путь относительно адреса панели, например `/panel/inbound/list/`.
+        :param kwargs: Параметры, передаваемые в `aiohttp.ClientSession.post`.
+
+        :raises aiohttp.ClientError: Ошибка сети при отправке запроса.
+        :raises asyncio.TimeoutError: Превышено время ожидания ответа.
+        :raises PanelLoginError: Не удалось повторно войти в панель.
+        :raises ValueError: Панель вернула некорректный JSON.
+        """
+        await self.login()
+        status, resp = await self._request(path, **kwargs)
+        if status in PANEL_UNAUTHORIZED_STATUSES:
+            logger.info(f"Авторизация в панели {self.ip} устарела, выполняем вход")
+            await self.login(force=True)
+            status, resp = await self._request(path, **kwargs)
+            if status in PANEL_UNAUTHORIZED_STATUSES:
+                raise PanelLoginError(f"Панель {self.ip} отклонила авторизацию")
+        return resp
+
+    async def close(self) -> None:
+        """
+        Закрывает HTTP-сессию.
+        """
+        await self.session.close()
+
+
+class VlessProcessor(BaseProcessor):
+    def __init__(self, ip, password):
+        self._pool = ServerSessionPool(
+            factory=self._open_connection, idle_ttl=PANEL_SESSION_IDLE_TTL
+        )
 
-                self.ip = server.ip
-                self.sub_port = 2096
-                self.port_panel = 2053
-                self.host = f"https://{self.ip}:{self.port_panel}"
-                self.data = {"username": "lisa_admin", "password": server.password}
+    @staticmethod
+    async def _open_connection(server_id: int, server=None) -> PanelConnection:
+        """
+        Фабрика подключений для пула: создает подключение к панели и авторизуется.
 
-                try:
-                    self.ses = requests.Session()
-                    self.ses.verify = False
-                    self.con = self._connect()
-                except Exception as e:
-                    loop = asyncio.get_event_loop()
-                    loop.run_until_complete(send_error_report(e))
-                    self.ses = None
-                    raise RuntimeError(f"Ошибка при установке соединения: {e}")
+        :param server_id: ID сервера.
+        :param server: Уже загруженный объект сервера. Если не передан, сервер берется из БД.
+        """
+        if server is None:
+            from initialization.db_processor_init import db_processor
 
-            return func(self, *args, **kwargs)
+            server = await db_processor.get_server_by_id(server_id)
+            if server is None:
+                raise ValueError(f"Сервер с ID {server_id} не найден в базе данных")
 
-        return wrapper
+        conn = PanelConnection(server)
+        try:
+            await conn.login()
+        except BaseException:
+            await conn.close()
+            raise
+        return conn
 
-    async def create_server_session(self) -> None:
+    async def _get_connection(self, server_id: int | None, server=None):
         """
-        Создает сессию для подключения к серверу с минимальным количеством пользователей для типа "vless".
+        Возвращает авторизованное подключение к панели сервера из пула.
+
+        :param server_id: ID сервера.
+        :param server: Уже загруженный объект сервера (необязательно).
 
-        :return: `None`
+        :return: Объект `PanelConnection`.
+
+        :raises ValueError: Если `server_id` не передан.
+        :raises RuntimeError: Если не удалось подключиться к панели.
+        """
+        if server_id is None:
+            raise ValueError("!!!server_id must be passed as a keyword argument!!!")
+        try:
+            return await self._pool.get(server_id, server)
+        except ValueError:
+            raise
+        except Exception as e:
+            await send_error_report(e)
+            raise RuntimeError(f"Ошибка при установке соединения: {e}")
+
+    async def create_server_session(self) -> PanelConnection:
+        """
+        Возвращает подключение к серверу с минимальным количеством пользователей для типа "vless".
+
+        :return: Объект `PanelConnection`.
 
         Алгоритм работы:
         1. Получает сервер с минимальным количеством пользователей для типа "vless" с использованием `db_processor`.
-        2. Извлекает параметры подключения (IP, порты, данные для аутентификации).
-        3. Инициализирует объект сессии с помощью `requests.Session`.
-        4. Отключает проверку сертификатов с помощью `self.ses.verify = False`.
-        5. Устанавливает соединение с сервером через метод `_connect()`.
-        6. Сохраняет ID сервера в атрибуте `self.server_id`.
+        2. Берет из пула подключение к панели этого сервера (или создает и авторизует новое).
         """
         from initialization.db_processor_init import db_processor
 
         server = await db_processor.get_server_with_min_users("vless")
+        return await self._get_connection(server.id, server)
 
-        self.ip = server.ip
-        self.sub_port = 2096
-        self.port_panel = 2053
-        self.host = f"https://{self.ip}:{self.port_panel}"
-        self.data = {"username": "lisa_admin", "password": server.password}
-        self.ses = requests.Session()
-        self.ses.verify = False
-        self.con = self._connect()
-        self.server_id = server.id
-
-    def _connect(self) -> bool:
+    async def close(self) -> None:
         """
-        Авторизация в панели.
+        Закрывает все подключения к панелям.
         """
-        try:
-            resp = self.ses.post(f"{self.host}/login", data=self.data).json()
-            if resp.get("success") is True:
-                logger.debug(f"✅Подключение к панели 3x-ui {self.ip} прошло успешно!")
-                return True
-            else:
-                logger.warning(
-                    f'🛑Подключение к панели 3x-ui {self.ip} не произошло, ошибка: {resp.get("msg")}'
-                )
-                return False
-        except requests.RequestException as e:
-            logger.error(f"Ошибка сети при подключении к {self.host}: {e}")
-            return False
-        except ValueError as e:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(send_error_report(e))
-            logger.error(f"Ошибка при декодировании JSON-ответа от {self.host}: {e}")
-            return False
+        await self._pool.close_all()
 
-    def _check_connect(self) -> bool:
+    async def _check_connect(self, conn: PanelConnection) -> bool:
         """
         Проверяем, есть ли уже inbound (подключение), или нужно создавать новое.
         """
-        if not self.con:
-            return False
-
         try:
-            resource = self.ses.post(
-                f"{self.host}/panel/inbound/list/", data=self.data
-            ).json()
+            resource = await conn.post("/panel/inbound/list/", data=conn.data)
             if not resource.get("success"):
                 logger.warning(
                     f'🛑Ошибка при проверке подключения: {resource.get("msg")}'
@@ -166,23 +266,19 @@ class VlessProcessor(BaseProcessor):
 
             logger.warning(f"⚠️Подключение (inbound) не найдено")
             return False
-        except requests.RequestException as e:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(send_error_report(e))
+        except PANEL_NETWORK_ERRORS as e:
+            await send_error_report(e)
             logger.error(f"Ошибка сети при _check_connect: {e}")
             return False
 
-    def _add_new_connect(self) -> tuple[bool, str]:
+    async def _add_new_connect(self, conn: PanelConnection) -> tuple[bool, str]:
         """
         Добавляет новый inbound (подключение).
         """
-        if not self.con:
-            return False, "Нет подключения к серверу"
-
-        logger.debug(f"Добавляем новое подключение на сервере {self.ip}...")
+        logger.debug(f"Добавляем новое подключение на сервере {conn.ip}...")
 
         # Шаг 1: Получаем ключи (privateKey/publicKey)
-        cert_ok, cert_obj_or_msg = self._get_new_x25519_cert()
+        cert_ok, cert_obj_or_msg = await self._get_new_x25519_cert(conn)
         if not cert_ok:
             logger.warning(f"Не удалось получить X25519-сертификат: {cert_obj_or_msg}")
             return False, cert_obj_or_msg
@@ -262,73 +358,67 @@ class VlessProcessor(BaseProcessor):
 
         # Шаг 3: Добавляем inbound
         try:
-            response = self.ses.post(
-                f"{self.host}/panel/inbound/add", headers=header, json=data
-            ).json()
+            response = await conn.post("/panel/inbound/add", headers=header, json=data)
             if response.get("success"):
-                logger.debug(f"Добавили новое подключение на сервере {self.ip}")
+                logger.debug(f"Добавили новое подключение на сервере {conn.ip}")
                 return True, response["obj"]
             else:
                 msg = response.get("msg", "Неизвестная ошибка")
                 logger.warning(f"🛑Ошибка при добавлении нового подключения: {msg}")
                 return False, msg
-        except requests.RequestException as e:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(send_error_report(e))
+        except PANEL_NETWORK_ERRORS as e:
+            await send_error_report(e)
             logger.error(f"Ошибка сети при добавлении inbound: {e}")
             return False, str(e)
 
-    def _get_new_x25519_cert(self) -> tuple[bool, dict]:
+    async def _get_new_x25519_cert(self, conn: PanelConnection) -> tuple[bool, dict]:
         """
         Запрашивает у панели новую пару ключей (privateKey / publicKey).
         """
-        if not self.con:
-            return False, "Нет подключения к серверу"
-
         try:
-            response = self.ses.post(
-                f"{self.host}/server/getNewX25519Cert", data=self.data
-            ).json()
+            response = await conn.post("/server/getNewX25519Cert", data=conn.data)
             if response.get("success"):
                 return True, response["obj"]
             else:
                 return False, response.get("msg", "Неизвестная ошибка")
-        except requests.RequestException as e:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(send_error_report(e))
+        except PANEL_NETWORK_ERRORS as e:
+            await send_error_report(e)
             logger.error(f"Ошибка сети при запросе X25519Cert: {e}")
             return False, str(e)
 
-    def _get_link(self, key_id: str, key_name: str) -> str | bool:
+    async def _get_link(
+        self,
+        conn: PanelConnection,
+        key_id: str,
+        key_name: str,
+        inbound_obj: dict | None = None,
+    ) -> str | bool:
         """
         Генерация ссылки для клиента (vless://...) для подключения к серверу.
 
+        :param conn: Подключение к панели сервера.
         :param key_id: Уникальный идентификатор ключа для клиента.
         :param key_name: Имя ключа для клиента, которое будет отображаться в ссылке.
+        :param inbound_obj: Уже полученный inbound. Если передан, повторный запрос
+            списка inbound'ов к панели не выполняется.
 
         :return: Сгенерированная ссылка для клиента, если успешно, иначе `False`.
 
         Алгоритм работы:
-        1. Проверяется наличие активного соединения.
-        2. Выполняется POST-запрос к панели управления для получения списка inbound соединений.
-        3. Проверяется наличие успешного ответа и данных о первом inbound соединении.
-        4. Извлекаются параметры настройки потока (streamSettings), включая публичный ключ.
-        5. Формируется ссылка для клиента с использованием полученных данных.
-        6. В случае ошибок в процессе генерируется лог с подробным описанием.
+        1. Если inbound не передан, выполняется POST-запрос к панели управления для получения списка inbound соединений.
+        2. Проверяется наличие успешного ответа и данных о первом inbound соединении.
+        3. Извлекаются параметры настройки потока (streamSettings), включая публичный ключ.
+        4. Формируется ссылка для клиента с использованием полученных данных.
+        5. В случае ошибок в процессе генерируется лог с подробным описанием.
         """
-
-        if not self.con:
-            return False
-
         try:
-            resource = self.ses.post(
-                f"{self.host}/panel/inbound/list/", data=self.data
-            ).json()
-            if not resource.get("success"):
-                return False
+            if inbound_obj is None:
+                resource = await conn.post("/panel/inbound/list/", data=conn.data)
+                if not resource.get("success"):
+                    return False
 
-            # Первый inbound
-            inbound_obj = resource["obj"][0] if resource["obj"] else None
+                # Первый inbound
+                inbound_obj = resource["obj"][0] if resource["obj"] else None
             if not inbound_obj:
                 return False
 
@@ -352,13 +442,12 @@ class VlessProcessor(BaseProcessor):
             sid = "03b090ff397c50b9"
 
             res = (
-                f"{prev_text}vless://{key_id}@{self.ip}:{port}/?type=tcp&security=reality&pbk={public_key}"
+                f"{prev_text}vless://{key_id}@{conn.ip}:{port}/?type=tcp&security=reality&pbk={public_key}"
                 f"&fp=chrome&sni=www.google.com&sid={sid}&spx=%2F&flow={flow}{bottom_text}"
             )
             return res
-        except (requests.RequestException, ValueError) as e:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(send_error_report(e))
+        except (*PANEL_NETWORK_ERRORS, ValueError) as e:
+            await send_error_report(e)
             logger.error(f"Ошибка при генерации ссылки: {e}")
             return False
 
@@ -374,7 +463,7 @@ class VlessProcessor(BaseProcessor):
 
         :return: Созданный VLESS-ключ и ID сервера, либо ошибка.
 
-        :raises requests.RequestException: Ошибка сети при отправке запроса.
+        :raises aiohttp.ClientError: Ошибка сети при отправке запроса.
 
         Алгоритм работы:
         1. Устанавливает соединение с сервером (`create_server_session`).
@@ -385,9 +474,7 @@ class VlessProcessor(BaseProcessor):
         6. Возвращает объект `VlessKey` и ID сервера при успешном создании, либо ошибку.
         """
 
-        await self.create_server_session()
-        if not self.con:
-            return False, "Нет подключения к серверу"
+        conn = await self.create_server_session()
 
         header = {"Accept": "application/json"}
 
@@ -422,9 +509,7 @@ class VlessProcessor(BaseProcessor):
 
         command = "/panel/inbound/addClient"
 
-        resource = self.ses.post(
-            f"{self.host}/panel/inbound/list/", data=self.data
-        ).json()
+        resource = await conn.post("/panel/inbound/list/", data=conn.data)
 
         inbound_obj = resource["obj"][0] if resource["obj"] else None
 
@@ -442,16 +527,14 @@ class VlessProcessor(BaseProcessor):
         sid = "03b090ff397c50b9"
 
         access_url = (
-            f"{prev_text}vless://{unique_id}@{self.ip}:{port}/?type=tcp&security=reality&pbk={public_key}"
+            f"{prev_text}vless://{unique_id}@{conn.ip}:{port}/?type=tcp&security=reality&pbk={public_key}"
             f"&fp=chrome&sni=www.google.com&sid={sid}&spx=%2F&flow={flow}{bottom_text}"
         )
 
         try:
-            resource = self.ses.post(
-                f"{self.host}{command}", headers=header, json=data
-            ).json()
+            resource = await conn.post(command, headers=header, json=data)
             if resource.get("success"):
-                logger.debug(f"Добавили ключ {unique_id} на сервере {self.ip}")
+                logger.debug(f"Добавили ключ {unique_id} на сервере {conn.ip}")
                 return (
                     VlessKey(
                         key_id=unique_id,
@@ -461,19 +544,17 @@ class VlessProcessor(BaseProcessor):
                         used_bytes=0,
                         data_limit=data_limit,
                     ),
-                    self.server_id,
+                    conn.server_id,
                 )
             else:
                 msg = resource.get("msg", "Неизвестная ошибка")
                 logger.warning(f"🛑Ошибка при добавлении ключа {unique_id}: {msg}")
                 return False, msg
-        except requests.RequestException as e:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(send_error_report(e))
+        except PANEL_NETWORK_ERRORS as e:
+            await send_error_report(e)
             logger.error(f"Ошибка сети при добавлении/обновлении ключа: {e}")
             return False, str(e)
 
-    @create_server_session_by_id
     async def rename_key(self, key_id: str, server_id: int, new_key_name: str) -> bool:
         """
         Переименовывает существующий VPN-ключ VLESS на удаленном сервере.
@@ -484,20 +565,19 @@ class VlessProcessor(BaseProcessor):
 
         :return: True, если ключ успешно переименован, иначе False.
 
-        :raises requests.RequestException: Ошибка сети при отправке запроса.
+        :raises aiohttp.ClientError: Ошибка сети при отправке запроса.
 
         Алгоритм работы:
-        1. Проверяет наличие активного подключения (`self.con`).
+        1. Получает подключение к панели сервера из пула.
         2. Логирует процесс обновления ключа.
         3. Формирует тело запроса с новыми параметрами ключа.
         4. Отправляет POST-запрос на сервер для обновления ключа.
         5. Анализирует ответ сервера и возвращает результат.
         6. В случае ошибки сети логирует и возвращает `False`.
         """
-        if not self.con:
-            return False, "Нет подключения к серверу"
+        conn = await self._get_connection(server_id)
 
-        logger.debug(f"Обновляем ключ {key_id} на сервере {self.ip}...")
+        logger.debug(f"Обновляем ключ {key_id} на сервере {conn.ip}...")
 
         header = {"Accept": "application/json"}
 
@@ -530,24 +610,20 @@ class VlessProcessor(BaseProcessor):
         command = f"/panel/inbound/updateClient/{key_id}"
 
         try:
-            resource = self.ses.post(
-                f"{self.host}{command}", headers=header, json=data
-            ).json()
+            resource = await conn.post(command, headers=header, json=data)
             if resource.get("success"):
-                logger.debug(f"Обновили ключ {key_id} на сервере {self.ip}")
+                logger.debug(f"Обновили ключ {key_id} на сервере {conn.ip}")
                 return True
             else:
                 msg = resource.get("msg", "Неизвестная ошибка")
                 logger.warning(f"🛑Ошибка при обновлении ключа {key_id}: {msg}")
                 return False
 
-        except requests.RequestException as e:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(send_error_report(e))
+        except PANEL_NETWORK_ERRORS as e:
+            await send_error_report(e)
             logger.error(f"Ошибка сети при добавлении/обновлении ключа: {e}")
             return False, str(e)
 
-    @create_server_session_by_id
     async def delete_key(self, key_id: int, server_id: int | None = None) -> bool:
         """
         Удаляет клиентский ключ по указанному ID на сервере с заданным server_id.
@@ -558,22 +634,21 @@ class VlessProcessor(BaseProcessor):
         :return: `True`, если ключ был успешно удален, в противном случае `False` с сообщением об ошибке.
 
         Алгоритм работы:
-        1. Проверяет, если нет подключения к серверу, возвращает ошибку.
+        1. Получает подключение к панели сервера из пула.
         2. Отправляет запрос на удаление ключа по указанному `key_id` на сервере.
         3. Если запрос успешен, возвращает `True`.
         4. В случае ошибки или неудачи выводит предупреждение с сообщением.
         5. В случае ошибки сети возвращает `False` и логирует ошибку.
         """
-        if not self.con:
-            return False, "Нет подключения к серверу"
+        conn = await self._get_connection(server_id)
 
-        logger.debug(f"Удаляем ключ c id{key_id} на сервере {self.ip}...")
+        logger.debug(f"Удаляем ключ c id{key_id} на сервере {conn.ip}...")
 
         try:
             # /panel/inbound/<id>/delClient/<email>
-            response = self.ses.post(
-                f"{self.host}/panel/inbound/1/delClient/{key_id}", data=self.data
-            ).json()
+            response = await conn.post(
+                f"/panel/inbound/1/delClient/{key_id}", data=conn.data
+            )
             if response.get("success"):
                 logger.debug(f"Удалили ключ {key_id}")
                 return True
@@ -581,13 +656,11 @@ class VlessProcessor(BaseProcessor):
                 msg = response.get("msg", "Неизвестная ошибка")
                 logger.warning(f"🛑Ошибка при удалении ключа {key_id}: {msg}")
                 return False, msg
-        except requests.RequestException as e:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(send_error_report(e))
+        except PANEL_NETWORK_ERRORS as e:
+            await send_error_report(e)
             logger.error(f"Ошибка сети при удалении ключа: {e}")
             return False
 
-    @create_server_session_by_id
     async def get_key_info(self, key_id: str, server_id: int = None) -> VlessKey:
         """
         Получает информацию о VPN-ключе VLESS с удаленного сервера.
@@ -597,25 +670,21 @@ class VlessProcessor(BaseProcessor):
 
         :return: Объект `VlessKey`, содержащий информацию о ключе, или `None`, если ключ не найден.
 
-        :raises requests.RequestException: Ошибка сети при отправке запроса.
+        :raises aiohttp.ClientError: Ошибка сети при отправке запроса.
         :raises ValueError: Ошибка при декодировании JSON-ответа.
 
         Алгоритм работы:
-        1. Проверяет наличие активного подключения (`self.con`).
+        1. Получает подключение к панели сервера из пула.
         2. Выполняет POST-запрос для получения списка ключей.
         3. Проверяет успешность запроса, логирует возможные ошибки.
         4. Ищет указанный `key_id` среди полученных inbound'ов.
         5. Если ключ найден, формирует объект `VlessKey` и возвращает его.
         6. В случае ошибки сети или некорректного JSON-ответа логирует и возвращает `None`.
         """
-        if not self.con:
-            logger.warning(f"Нет подключения к серверу")
-            return None
+        conn = await self._get_connection(server_id)
 
         try:
-            response = self.ses.post(
-                f"{self.host}/panel/inbound/list/", data=self.data
-            ).json()
+            response = await conn.post("/panel/inbound/list/", data=conn.data)
 
             # print(json.dumps(response, indent=4))
 
@@ -643,8 +712,11 @@ class VlessProcessor(BaseProcessor):
                         # print(json.dumps(client, indent=4))
                         name = client.get("comment", "")
                         email = client.get("email", "")
-                        access_url = self._get_link(
-                            client.get("id"), client.get("comment", "")
+                        access_url = await self._get_link(
+                            conn,
+                            client.get("id"),
+                            client.get("comment", ""),
+                            inbound_obj=response["obj"][0],
                         )
                         data_limit = (
                             client.get("totalGB") if client.get("totalGB") else None
@@ -662,18 +734,65 @@ class VlessProcessor(BaseProcessor):
             logger.warning(f"Ключ {key_id} не найден на сервере")
             return None
 
-        except requests.RequestException as e:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(send_error_report(e))
+        except PANEL_NETWORK_ERRORS as e:
+            await send_error_report(e)
             logger.error(f"Ошибка сети при получении информации о ключе {key_id}: {e}")
             return None
         except ValueError as e:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(send_error_report(e))
+            await send_error_report(e)
             logger.error(f"Ошибка при декодировании JSON-ответа: {e}")
             return None
 
-    @create_server_session_by_id
+    async def get_keys_usage(self, server_id: int) -> dict[str, KeyUsage] | None:
+        """
+        Получает трафик и лимиты всех ключей сервера одним запросом к панели.
+
+        :param server_id: Идентификатор сервера.
+
+        :return: Словарь {key_id: KeyUsage} или `None`, если список получить не удалось.
+
+        Алгоритм работы:
+        1. Получает подключение к панели сервера из пула.
+        2. Один раз запрашивает список inbound'ов.
+        3. Собирает трафик клиентов из `clientStats` (по email, который совпадает с ID ключа).
+        4. Собирает лимиты клиентов из настроек inbound'ов.
+        """
+        conn = await self._get_connection(server_id)
+
+        try:
+            response = await conn.post("/panel/inbound/list/", data=conn.data)
+        except PANEL_NETWORK_ERRORS as e:
+            await send_error_report(e)
+            logger.error(f"Ошибка сети при получении списка ключей: {e}")
+            return None
+
+        if not response.get("success"):
+            logger.warning(
+                f'🛑Ошибка при получении списка ключей: {response.get("msg")}'
+            )
+            return None
+
+        used_bytes = {}
+        usage = {}
+        for inbound in response.get("obj") or []:
+            for key_stat in inbound.get("clientStats") or []:
+                used_bytes[key_stat.get("email")] = key_stat.get(
+                    "up", 0
+                ) + key_stat.get("down", 0)
+
+            clients = json.loads(inbound.get("settings", "{}")).get("clients", [])
+            for client in clients:
+                key_id = client.get("id")
+                usage[key_id] = KeyUsage(
+                    key_id=key_id,
+                    used_bytes=0,
+                    data_limit=client.get("totalGB") or None,
+                )
+
+        for key_id, key_usage in usage.items():
+            key_usage.used_bytes = used_bytes.get(key_id, 0)
+        return usage
+
     async def update_data_limit(
         self,
         key_id: str,
@@ -690,10 +809,9 @@ class VlessProcessor(BaseProcessor):
 
         :return: True, если обновление прошло успешно, иначе False.
         """
-        if not self.con:
-            return False, "Нет подключения к серверу"
+        conn = await self._get_connection(server_id)
 
-        logger.debug(f"Обновляем лимит для ключа {key_id} на сервере {self.ip}...")
+        logger.debug(f"Обновляем лимит для ключа {key_id} на сервере {conn.ip}...")
 
         header = {"Accept": "application/json"}
 
@@ -726,12 +844,10 @@ class VlessProcessor(BaseProcessor):
         command = f"/panel/inbound/updateClient/{key_id}"
 
         try:
-            resource = self.ses.post(
-                f"{self.host}{command}", headers=header, json=data
-            ).json()
+            resource = await conn.post(command, headers=header, json=data)
             if resource.get("success"):
                 logger.debug(
-                    f"Успешно обновили лимит для ключа {key_id} на сервере {self.ip}"
+                    f"Успешно обновили лимит для ключа {key_id} на сервере {conn.ip}"
                 )
                 return True
             else:
@@ -739,9 +855,8 @@ class VlessProcessor(BaseProcessor):
                 logger.warning(f"🛑Ошибка при обновлении лимита ключа {key_id}: {msg}")
                 return False
 
-        except requests.RequestException as e:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(send_error_report(e))
+        except PANEL_NETWORK_ERRORS as e:
+            await send_error_report(e)
             logger.error(f"Ошибка сети при добавлении/обновлении ключа: {e}")
             return False, str(e)
 
@@ -898,8 +1013,7 @@ class VlessProcessor(BaseProcessor):
                     return True
 
             except Exception as e:
-                loop = asyncio.get_event_loop()
-                loop.run_until_complete(send_error_report(e))
+                await send_error_report(e)
                 logger.info(
                     f"❌ Ошибка при установке 3X-UI: {e}, попытка {attempt + 1}/{max_attempts}"
                 )
@@ -909,7 +1023,7 @@ class VlessProcessor(BaseProcessor):
 
         return False
 
-    def get_server_info(self, server) -> dict:
+    async def get_server_info(self, server) -> dict:
         """
         Получение информации о сервере
         Возвращает данные в виде:
@@ -924,27 +1038,18 @@ class VlessProcessor(BaseProcessor):
             "hostnameForAccessKeys": "example.com"
         }
         """
-        # Инициализация соединения с сервером панели
-        self.ip = server.ip
-        self.port_panel = 2053
-        self.host = f"https://{self.ip}:{self.port_panel}"
-        self.data = {"username": "lisa_admin", "password": server.password}
-        self.ses = requests.Session()
-        self.ses.verify = False
-
-        if not self._connect():
-            raise Exception("Не удалось подключиться к панели сервера")
+        # Подключение к панели сервера из пула
+        conn = await self._get_connection(server.id, server)
 
         try:
             # Предполагается, что сервер предоставляет информацию по данному эндпоинту
-            response = self.ses.post(f"{self.host}/server/info", data=self.data).json()
+            response = await conn.post("/server/info", data=conn.data)
             if response.get("success"):
                 return response.get("obj", {})
             else:
                 raise Exception(
                     response.get("msg", "Ошибка получения информации о сервере")
                 )
-        except requests.RequestException as e:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(send_error_report(e))
+        except PANEL_NETWORK_ERRORS as e:
+            await send_error_report(e)
             raise Exception(f"Ошибка сети: {e}")
@@ -0,0 +1,57 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+
+from aiogram.fsm.storage.base import BaseEventIsolation, DefaultKeyBuilder, StorageKey
+
+
+class _KeyLock:
+    """
+    Блокировка ключа со счетчиком ожидающих, чтобы удалять ее,
+    когда она больше никому не нужна.
+    """
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class UserEventIsolation(BaseEventIsolation):
+    """
+    Изоляция событий aiogram: обновления одного пользователя в чате
+    обрабатываются строго по очереди, в порядке поступления, — повторное нажатие
+    кнопки оплаты ждет окончания первого и видит уже обновленное состояние.
+
+    В отличие от `SimpleEventIsolation`, блокировка удаляется, как только ее
+    никто не держит и не ждет, поэтому словарь блокировок не растет с числом
+    пользователей.
+    """
+
+    def __init__(self):
+        self._key_builder = DefaultKeyBuilder()
+        self._locks: dict[str, _KeyLock] = {}
+
+    @property
+    def size(self) -> int:
+        """Число ключей, обновления которых сейчас обрабатываются или ждут."""
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        name = self._key_builder.build(key)
+        key_lock = self._locks.get(name)
+        if key_lock is None:
+            key_lock = self._locks[name] = _KeyLock()
+        key_lock.users += 1
+        try:
+            async with key_lock.lock:
+                yield
+        finally:
+            key_lock.users -= 1
+            if not key_lock.users:
+                del self._locks[name]
+
+    async def close(self) -> None:
+        self._locks.clear()
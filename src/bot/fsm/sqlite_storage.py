@@ -0,0 +1,210 @@
+import asyncio
+import dataclasses
+import json
+import logging
+import time
+import zlib
+from typing import Any, Mapping
+
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+
+from api_processors.key_models import OutlineKey, VlessKey
+
+logger = logging.getLogger(__name__)
+
+# Данные больше этого размера (в байтах) сжимаются zlib
+COMPRESS_THRESHOLD = 512
+# Первый байт сериализованных данных: JSON без сжатия / со сжатием.
+# 0x00 и 0x01 — прежний формат (pickle), такие данные не читаются
+_JSON, _JSON_ZLIB = b"\x02", b"\x03"
+# Датаклассы, которые можно хранить в данных FSM (`key_info`)
+_DATACLASSES = {cls.__name__: cls for cls in (OutlineKey, VlessKey)}
+# Ключ JSON-объекта с именем датакласса
+_DATACLASS_TAG = "__dataclass__"
+
+
+def _encode_value(value: Any) -> dict:
+    cls = type(value)
+    if _DATACLASSES.get(cls.__name__) is cls:
+        return {_DATACLASS_TAG: cls.__name__, **dataclasses.asdict(value)}
+    raise TypeError(f"Тип {cls.__name__} нельзя сохранить в данных FSM")
+
+
+def _decode_object(obj: dict) -> Any:
+    name = obj.pop(_DATACLASS_TAG, None)
+    if name is None:
+        return obj
+    return _DATACLASSES[name](**obj)
+
+
+def dump_data(data: Mapping[str, Any]) -> bytes | None:
+    """
+    Компактно сериализует данные FSM: JSON, а для больших значений еще и zlib.
+    Датаклассы ключей (`key_info`) сохраняются как объекты с полем
+    `__dataclass__`; другие типы, кроме стандартных типов JSON, не допускаются.
+    """
+    if not data:
+        return None
+    payload = json.dumps(
+        dict(data), default=_encode_value, ensure_ascii=False, separators=(",", ":")
+    ).encode()
+    if len(payload) > COMPRESS_THRESHOLD:
+        return _JSON_ZLIB + zlib.compress(payload)
+    return _JSON + payload
+
+
+def load_data(blob: bytes | None) -> dict[str, Any]:
+    """
+    Обратная операция к `dump_data`.
+    Данные в прежнем формате (pickle) не загружаются и считаются пустыми.
+    """
+    if not blob:
+        return {}
+    prefix, payload = blob[:1], blob[1:]
+    if prefix == _JSON_ZLIB:
+        payload = zlib.decompress(payload)
+    elif prefix != _JSON:
+        logger.warning("Данные FSM в устаревшем формате пропущены")
+        return {}
+    return json.loads(payload, object_hook=_decode_object)
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище состояний FSM в SQLite (режим WAL).
+
+    Состояние и данные диалога переживают перезапуск бота, а в памяти процесса
+    ничего не накапливается. Диалоги, неактивные дольше `ttl` секунд,
+    считаются завершенными и периодически удаляются.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = None,
+        purge_interval: float = 600,
+        key_builder: KeyBuilder = None,
+    ):
+        """
+        :param path: Путь к файлу базы данных.
+        :param ttl: Время жизни неактивного диалога в секундах (None — бессрочно).
+        :param purge_interval: Как часто (в секундах) удалять устаревшие диалоги.
+        :param key_builder: Построитель ключей aiogram.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self._connection: aiosqlite.Connection | None = None
+        self._connect_lock = asyncio.Lock()
+        self._last_purge = time.monotonic()
+
+    async def _get_connection(self) -> aiosqlite.Connection:
+        if self._connection is None:
+            async with self._connect_lock:
+                if self._connection is None:
+                    connection = await aiosqlite.connect(self.path)
+                    await connection.execute("PRAGMA journal_mode=WAL")
+                    await connection.execute("PRAGMA synchronous=NORMAL")
+                    await connection.execute(
+                        "CREATE TABLE IF NOT EXISTS fsm ("
+                        " key TEXT PRIMARY KEY,"
+                        " state TEXT,"
+                        " data BLOB,"
+                        " updated_at REAL NOT NULL)"
+                    )
+                    await connection.execute(
+                        "CREATE INDEX IF NOT EXISTS fsm_updated_at ON fsm (updated_at)"
+                    )
+                    await connection.commit()
+                    self._connection = connection
+        return self._connection
+
+    def _is_expired(self, updated_at: float) -> bool:
+        return self.ttl is not None and updated_at < time.time() - self.ttl
+
+    async def _read(self, key: StorageKey) -> tuple[str | None, bytes | None]:
+        connection = await self._get_connection()
+        async with connection.execute(
+            "SELECT state, data, updated_at FROM fsm WHERE key = ?",
+            (self.key_builder.build(key),),
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None or self._is_expired(row[2]):
+            return None, None
+        return row[0], row[1]
+
+    async def _write(self, key: StorageKey, column: str, value) -> None:
+        """
+        Записывает состояние или данные диалога и продлевает его жизнь.
+        Если диалог уже устарел, второй столбец очищается в том же запросе,
+        иначе вместе с новым состоянием вернулись бы старые данные (и наоборот).
+        """
+        other = "data" if column == "state" else "state"
+        now = time.time()
+        expired_before = now - self.ttl if self.ttl is not None else float("-inf")
+        connection = await self._get_connection()
+        await connection.execute(
+            f"INSERT INTO fsm (key, {column}, updated_at) VALUES (?, ?, ?) "
+            f"ON CONFLICT(key) DO UPDATE SET {column} = excluded.{column}, "
+            f"{other} = CASE WHEN fsm.updated_at < ? THEN NULL ELSE fsm.{other} END, "
+            f"updated_at = excluded.updated_at",
+            (self.key_builder.build(key), value, now, expired_before),
+        )
+        await connection.commit()
+        await self._maybe_purge()
+
+    async def _maybe_purge(self) -> None:
+        if time.monotonic() - self._last_purge >= self.purge_interval:
+            self._last_purge = time.monotonic()
+            await self.purge_expired()
+
+    async def purge_expired(self) -> int:
+        """
+        Удаляет диалоги, неактивные дольше `ttl`, и пустые записи.
+        :return: Число удаленных записей
+        """
+        connection = await self._get_connection()
+        if self.ttl is not None:
+            cursor = await connection.execute(
+                "DELETE FROM fsm WHERE updated_at < ? OR (state IS NULL AND data IS NULL)",
+                (time.time() - self.ttl,),
+            )
+        else:
+            cursor = await connection.execute(
+                "DELETE FROM fsm WHERE state IS NULL AND data IS NULL"
+            )
+        await connection.commit()
+        if cursor.rowcount:
+            logger.info(f"Удалено устаревших состояний FSM: {cursor.rowcount}")
+        return cursor.rowcount
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._write(key, "state", state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        state, _ = await self._read(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise TypeError(f"Data must be a dict, got {type(data).__name__}")
+        await self._write(key, "data", dump_data(data))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, data = await self._read(key)
+        return load_data(data)
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
@@ -552,6 +552,9 @@ def get_admin_keyboard():
     get_db = InlineKeyboardButton(
         text="📁 Получить базу данных", callback_data="get_db"
     )
+    query_stats = InlineKeyboardButton(
+        text="🐢 Статистика запросов к БД", callback_data="get_query_stats"
+    )
     back_to_main_menu = InlineKeyboardButton(
         text="🔙 В меню", callback_data="back_to_main_menu"
     )
@@ -561,6 +564,7 @@ def get_admin_keyboard():
             [servers_info],
             [broadcast],
             [get_db],
+            [query_stats],
             [back_to_main_menu],
         ]
     )
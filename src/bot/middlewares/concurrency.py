@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from bot.routers.admin_router_sending_message import send_error_report
+
+logger = logging.getLogger(__name__)
+
+# Сколько обновлений обрабатывается одновременно (по всем пользователям)
+HANDLER_CONCURRENCY = int(os.getenv("HANDLER_CONCURRENCY", 50))
+# Через сколько секунд обработчик считается зависшим и о нем сообщается администраторам
+HANDLER_STUCK_TIMEOUT = float(os.getenv("HANDLER_STUCK_TIMEOUT", 60))
+# Через сколько секунд обработчик прерывается (0 — не прерывать)
+HANDLER_TIMEOUT = float(os.getenv("HANDLER_TIMEOUT", 600))
+
+
+class ConcurrencyMiddleware(BaseMiddleware):
+    """
+    Внешний middleware обновлений, ограничивающий параллельную обработку.
+
+    - Обновления разных пользователей обрабатываются параллельно, но не больше
+      `concurrency` одновременно.
+    - Если обработчик работает дольше `stuck_timeout`, администраторам уходит
+      отчет; после `timeout` обработчик прерывается.
+
+    Порядок обновлений одного пользователя обеспечивает изоляция событий
+    диспетчера (`bot.fsm.isolation.UserEventIsolation`). Middleware регистрируется
+    после FSM-middleware диспетчера, поэтому общий слот занимается уже внутри
+    блокировки пользователя: ожидающие обновления одного пользователя не держат
+    слоты остальных. Встроенный `tasks_concurrency_limit` aiogram занимает слот
+    до блокировки пользователя и этого не гарантирует.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = HANDLER_CONCURRENCY,
+        stuck_timeout: float = HANDLER_STUCK_TIMEOUT,
+        timeout: float = HANDLER_TIMEOUT,
+    ):
+        """
+        :param concurrency: Максимальное число одновременно обрабатываемых обновлений.
+        :param stuck_timeout: Через сколько секунд сообщать о зависшем обработчике.
+        :param timeout: Через сколько секунд прерывать обработчик (0 — не прерывать).
+        """
+        self.concurrency = concurrency
+        self.stuck_timeout = stuck_timeout
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.stuck = 0
+        self.timed_out = 0
+        self._reports: set[asyncio.Task] = set()
+
+    @property
+    def stats(self) -> dict:
+        """
+        Счетчики: обрабатывается сейчас, ждут слота, зависших и прерванных всего.
+        """
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "stuck": self.stuck,
+            "timed_out": self.timed_out,
+        }
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            return await self._run(handler, event, data)
+        finally:
+            self._semaphore.release()
+
+    async def _run(self, handler, event: TelegramObject, data: dict[str, Any]) -> Any:
+        self.active += 1
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        stuck_handle = loop.call_later(
+            self.stuck_timeout, self._report_stuck, event, started
+        )
+        try:
+            if self.timeout:
+                return await asyncio.wait_for(handler(event, data), self.timeout)
+            return await handler(event, data)
+        except asyncio.TimeoutError:
+            # Таймаут мог прийти и изнутри обработчика (например, от aiohttp)
+            if time.monotonic() - started < self.timeout:
+                raise
+            self.timed_out += 1
+            message = (
+                f"Обработчик {self._describe(event)} прерван: "
+                f"работал дольше {self.timeout:.0f} с"
+            )
+            logger.error(message)
+            await send_error_report(message)
+            return None
+        finally:
+            stuck_handle.cancel()
+            self.active -= 1
+
+    def _report_stuck(self, event: TelegramObject, started: float) -> None:
+        self.stuck += 1
+        message = (
+            f"Обработчик {self._describe(event)} работает уже "
+            f"{time.monotonic() - started:.0f} с"
+        )
+        logger.warning(message)
+        task = asyncio.create_task(send_error_report(message))
+        self._reports.add(task)
+        task.add_done_callback(self._reports.discard)
+
+    @staticmethod
+    def _describe(event: TelegramObject) -> str:
+        if isinstance(event, Update):
+            return f"обновления {event.update_id} ({event.event_type})"
+        return type(event).__name__
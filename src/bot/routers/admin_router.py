@@ -1,5 +1,5 @@
-from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import asyncio
 import os
 import json
 import logging
@@ -16,7 +16,10 @@ from initialization.outline_processor_init import async_outline_processor
 from initialization.vdsina_processor_init import vdsina_processor
 from initialization.vless_processor_init import vless_processor
 from initialization.db_processor_init import db_processor
+from database.query_instrumentation import format_query_stats
 from bot.utils.string_makers import get_your_key_string
+from bot.utils.broadcast import start_broadcast
+from utils.ttl_cache import TTLCache
 from bot.keyboards.keyboards import (
     get_confirm_broadcast_keyboard,
     get_admin_period_keyboard,
@@ -38,6 +41,13 @@ load_dotenv()
 admin_passwords = json.loads(os.getenv("ADMIN_PASSWORDS"))
 admin_passwords = {int(k): v for k, v in admin_passwords.items()}
 
+# Сколько серверов VDSina опрашивать одновременно
+VDSINA_STATS_CONCURRENCY = int(os.getenv("VDSINA_STATS_CONCURRENCY", 10))
+# Сколько секунд показывать сохраненную статистику серверов
+SERVERS_INFO_CACHE_TTL = int(os.getenv("SERVERS_INFO_CACHE_TTL", 60))
+
+servers_info_cache = TTLCache(ttl=SERVERS_INFO_CACHE_TTL)
+
 pending_admin = {}
 try:
     admin_ids_str = os.getenv("ADMIN_IDS", "[]")
@@ -186,22 +196,36 @@ async def aggregate_statistics(response):
     return aggregated
 
 
-@router.callback_query(F.data == "get_servers_info")
-async def get_servers_info(callback: CallbackQuery, state: FSMContext):
-    await callback.message.edit_text("Получение информации по серверам...")
-    now = datetime.now()
-    start = now - timedelta(days=30)
+async def collect_servers_info() -> str:
+    """
+    Собирает статистику всех серверов VDSina и формирует текст для администратора.
+
+    :return: Текст с информацией по серверам
+
+    Алгоритм работы:
+    1. Получает список серверов.
+    2. Параллельно (не больше `VDSINA_STATS_CONCURRENCY` запросов одновременно)
+       запрашивает статистику каждого сервера и агрегирует ее.
+    3. Формирует текст в порядке списка серверов.
+    """
     servers_lst = await vdsina_processor.get_servers()
-    # print(json.dumps(servers_lst, indent=4, ensure_ascii=False))
+    semaphore = asyncio.Semaphore(VDSINA_STATS_CONCURRENCY)
+
+    async def fetch(server_id):
+        async with semaphore:
+            info = await vdsina_processor.get_server_statistics(server_id)
+        return server_id, await aggregate_statistics(info)
+
+    results = await asyncio.gather(
+        *(fetch(server["id"]) for server in servers_lst["data"])
+    )
+    return await make_servers_info_text(dict(results))
 
-    data = {}
-    for server in servers_lst["data"]:
-        # print(server['id'])
-        info = await vdsina_processor.get_server_statistics(server["id"])
-        aggregated_stat = await aggregate_statistics(info)
-        data[server["id"]] = aggregated_stat
 
-    info = await make_servers_info_text(data)
+@router.callback_query(F.data == "get_servers_info")
+async def get_servers_info(callback: CallbackQuery, state: FSMContext):
+    await callback.message.edit_text("Получение информации по серверам...")
+    info = await servers_info_cache.get_or_set("servers_info", collect_servers_info)
     await callback.message.edit_text(
         text=info, reply_markup=get_back_admin_panel_keyboard()
     )
@@ -246,7 +270,7 @@ async def make_key_for_admin(callback: CallbackQuery, state: FSMContext):
             reply_markup=get_back_admin_panel_keyboard(),
         )
 
-        db_processor.update_database_with_key(
+        await db_processor.update_database_with_key(
             callback.from_user.id, key, chosen_period, server_id, protocol_type
         )
 
@@ -297,6 +321,23 @@ async def send_db(callback: CallbackQuery, state: FSMContext):
     await callback.message.answer_document(db_file, caption="📂 Вот ваша база данных.")
 
 
+@router.callback_query(
+    F.data == "get_query_stats", StateFilter(AdminAccess.correct_password)
+)
+async def send_query_stats(callback: CallbackQuery):
+    """
+    Показывает администратору самые затратные запросы к БД
+    (статистика с момента запуска процесса бота)
+    """
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("🚫 У вас нет доступа.")
+        return
+
+    await callback.message.edit_text(
+        text=format_query_stats(), reply_markup=get_back_admin_panel_keyboard()
+    )
+
+
 @router.callback_query(
     F.data == "admin_broadcast",
     StateFilter(
@@ -347,14 +388,10 @@ async def admin_broadcast_confirm(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     broadcast_text = data.get("broadcast_text")
     if callback.data == "broadcast_confirm":
-        user_ids = await db_processor.get_all_user_ids()
-        for user_id in user_ids:
-            try:
-                await bot.send_message(user_id, broadcast_text)
-            except Exception as e:
-                logger.error(f"Ошибка отправки сообщения пользователю {user_id}: {e}")
-        await callback.message.edit_text(
-            "Рассылка завершена.", reply_markup=get_admin_keyboard()
+        # Рассылка идет в фоне, прогресс обновляется в этом сообщении
+        await callback.message.edit_text("Рассылка запущена...")
+        await start_broadcast(
+            broadcast_text, callback.message.chat.id, callback.message.message_id
         )
     else:
         await callback.message.edit_text(
@@ -54,7 +54,7 @@ async def choosing_key_handler(callback: CallbackQuery, state: FSMContext):
         return
 
     # Получаем информацию о ключе из базы данных
-    key = db_processor.get_key_by_id(selected_key_id)
+    key = await db_processor.get_key_by_id(selected_key_id)
 
     if not key:
         await callback.message.answer("Ключ не найден.")
@@ -77,7 +77,7 @@ async def show_traffic_handler(callback: CallbackQuery, state: FSMContext):
 
     key_info = data.get("key_info")
     if key_info is None:
-        key = db_processor.get_key_by_id(data.get("selected_key_id"))
+        key = await db_processor.get_key_by_id(data.get("selected_key_id"))
         processor = await get_processor(key.protocol_type)
         key_info = await processor.get_key_info(key.key_id, server_id=key.server_id)
         logger.info(f"Key info: {key_info}")
@@ -104,7 +104,7 @@ async def show_traffic_handler(callback: CallbackQuery, state: FSMContext):
 )
 async def show_expiration_handler(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    key = db_processor.get_key_by_id(data["selected_key_id"])
+    key = await db_processor.get_key_by_id(data["selected_key_id"])
 
     expiration_date = key.expiration_date
     if expiration_date:
@@ -173,8 +173,8 @@ async def confirm_rename_handler(callback: CallbackQuery, state: FSMContext):
     new_name = data["new_name"]
 
     # Получаем информацию о ключе из базы данных
-    db_processor.rename_key(key_id, new_name)
-    key = db_processor.get_key_by_id(key_id)
+    await db_processor.rename_key(key_id, new_name)
+    key = await db_processor.get_key_by_id(key_id)
 
     await state.update_data(key_name=key.name)
 
@@ -214,7 +214,7 @@ async def show_key_url_handler(callback: CallbackQuery, state: FSMContext):
     key_info = data.get("key_info")
     key_name = data.get("key_name")
     if key_info is None:
-        key = db_processor.get_key_by_id(data.get("selected_key_id"))
+        key = await db_processor.get_key_by_id(data.get("selected_key_id"))
         key_name = key.name
         processor = await get_processor(key.protocol_type)
         key_info = await processor.get_key_info(key.key_id, server_id=key.server_id)
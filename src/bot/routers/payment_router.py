@@ -84,9 +84,9 @@ async def handle_period_selection(callback: CallbackQuery, state: FSMContext):
             | SubscriptionExtension.choose_extension_period
         ):
             selected_key_id = data.get("selected_key_id")
-            vpn_type = db_processor.get_vpn_type_by_key_id(selected_key_id)
+            vpn_type = await db_processor.get_vpn_type_by_key_id(selected_key_id)
             await state.update_data(vpn_type=vpn_type)
-            key = db_processor.get_key_by_id(selected_key_id)
+            key = await db_processor.get_key_by_id(selected_key_id)
             await state.update_data(key_name=key.name)
             title = "Продление ключа"
             description = f"Продление ключа «{key.name}» от VPN {vpn_type} на {selected_period} {moths}"
@@ -160,7 +160,7 @@ async def successful_payment(message: Message, state: FSMContext):
         # Обновление базы данных
         data = await state.get_data()
         period = data.get("selected_period")
-        db_processor.update_database_with_key(
+        await db_processor.update_database_with_key(
             message.from_user.id, key, period, server_id, protocol_type
         )
 
@@ -195,7 +195,7 @@ async def successful_extension_payment(message: Message, state: FSMContext):
         add_period = 31 * add_period
 
         new_message = await message.answer(text="Оплата прошла успешно")
-        expiration_date = extend_key_in_db(key_id=key_id, add_period=add_period)
+        expiration_date = await extend_key_in_db(key_id=key_id, add_period=add_period)
 
         data = await state.get_data()
         current_state = await state.get_state()
@@ -0,0 +1,302 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+
+from bot.keyboards.keyboards import get_admin_keyboard
+from bot.routers.admin_router_sending_message import send_error_report
+from initialization.bot_init import bot
+from initialization.db_processor_init import db_processor
+
+logger = logging.getLogger(__name__)
+
+# Глобальный лимит Telegram — около 30 сообщений в секунду, оставляем запас
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 25))
+# Число одновременно отправляющих задач
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", 10))
+# Как часто обновлять сообщение с прогрессом (в секундах). Не меньше 1 секунды —
+# это ограничение Telegram на частоту сообщений в один чат
+BROADCAST_PROGRESS_INTERVAL = max(
+    1.0, float(os.getenv("BROADCAST_PROGRESS_INTERVAL", 5))
+)
+# Сколько раз повторять отправку после TelegramRetryAfter
+BROADCAST_MAX_ATTEMPTS = 3
+# Размер порции получателей, читаемой из БД
+BROADCAST_CHUNK_SIZE = 500
+# Сколько результатов доставки копить перед записью в БД. Столько же
+# пользователей (не больше) получат сообщение повторно, если процесс упадет
+BROADCAST_FLUSH_SIZE = 100
+# Через сколько секунд без записи результатов рассылка считается брошенной
+# (процесс упал) и ее может захватить другой процесс
+BROADCAST_CLAIM_TIMEOUT = int(os.getenv("BROADCAST_CLAIM_TIMEOUT", 5 * 60))
+
+# Ссылки на запущенные рассылки, чтобы задачи не собрал сборщик мусора
+_running_broadcasts: set[asyncio.Task] = set()
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты «ведро токенов».
+    Токены пополняются со скоростью `rate` в секунду, не больше `capacity`.
+    `pause()` останавливает выдачу токенов (например, по TelegramRetryAfter).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Ждет и забирает один токен. Ожидающие обслуживаются по очереди.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Приостанавливает выдачу токенов на `seconds` секунд.
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class BroadcastRunner:
+    """
+    Выполняет одну рассылку.
+
+    Получатели читаются из БД порциями и раздаются `BROADCAST_WORKERS` задачам.
+    Все отправки проходят через общий `TokenBucket`. Результаты доставки
+    сохраняются в БД порциями по `BROADCAST_FLUSH_SIZE`, поэтому прерванная
+    рассылка продолжается с того места, где остановилась. Доставка «хотя бы
+    один раз»: при штатной остановке накопленные результаты записываются,
+    а при аварийном завершении процесса пользователи из незаписанной порции
+    (и те, кому сообщение отправлялось в этот момент) получат его повторно.
+    Каждая запись результатов обновляет отметку `claimed_at`, по которой
+    другие процессы видят, что рассылка выполняется.
+    """
+
+    def __init__(self, broadcast, bucket: TokenBucket = None):
+        """
+        :param broadcast: Объект рассылки (`database.models.Broadcast`).
+        :param bucket: Ограничитель частоты; по умолчанию `BROADCAST_RATE` в секунду.
+        """
+        self.broadcast = broadcast
+        self.bucket = bucket or TokenBucket(BROADCAST_RATE)
+        self.counts = Counter()
+        self.total = 0
+        self._pending: list[tuple[int, str]] = []
+        self._last_progress = 0.0
+
+    async def run(self) -> Counter:
+        """
+        Запускает рассылку и дожидается ее окончания.
+        :return: Число доставок по статусам ('sent' / 'blocked' / 'failed')
+        """
+        self.counts.update(await db_processor.get_broadcast_stats(self.broadcast.id))
+        self.total = await db_processor.get_users_count()
+
+        queue = asyncio.Queue(maxsize=BROADCAST_WORKERS * 2)
+        workers = [
+            asyncio.create_task(self._worker(queue)) for _ in range(BROADCAST_WORKERS)
+        ]
+        cancelled = False
+        try:
+            last_user_id = None
+            while True:
+                user_ids = await db_processor.get_broadcast_recipients(
+                    self.broadcast.id, last_user_id, BROADCAST_CHUNK_SIZE
+                )
+                if not user_ids:
+                    break
+                for user_id in user_ids:
+                    await queue.put(user_id)
+                last_user_id = user_ids[-1]
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await self._flush()
+            if cancelled:
+                # Остановка процесса: снимаем отметку после записи результатов,
+                # чтобы рассылку сразу продолжил следующий запуск
+                await db_processor.release_broadcast(self.broadcast.id)
+
+        await db_processor.finish_broadcast(self.broadcast.id)
+        await self._report_progress(final=True)
+        logger.info(f"Рассылка {self.broadcast.id} завершена: {dict(self.counts)}")
+        return self.counts
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while (user_id := await queue.get()) is not None:
+            status = await self._deliver(user_id)
+            self.counts[status] += 1
+            self._pending.append((user_id, status))
+            if len(self._pending) >= BROADCAST_FLUSH_SIZE:
+                await self._flush()
+            if time.monotonic() - self._last_progress >= BROADCAST_PROGRESS_INTERVAL:
+                await self._report_progress()
+
+    async def _deliver(self, user_id: int) -> str:
+        """
+        Отправляет сообщение одному пользователю.
+        :return: Статус доставки
+        """
+        for attempt in range(1, BROADCAST_MAX_ATTEMPTS + 1):
+            await self.bucket.acquire()
+            try:
+                await bot.send_message(user_id, self.broadcast.text)
+                return "sent"
+            except TelegramRetryAfter as e:
+                logger.warning(
+                    f"Telegram просит подождать {e.retry_after} с "
+                    f"(попытка {attempt}/{BROADCAST_MAX_ATTEMPTS})"
+                )
+                self.bucket.pause(e.retry_after)
+            except TelegramForbiddenError:
+                return "blocked"
+            except Exception as e:
+                logger.error(f"Ошибка отправки сообщения пользователю {user_id}: {e}")
+                return "failed"
+        return "failed"
+
+    async def _flush(self) -> None:
+        """
+        Сохраняет накопленные результаты доставки.
+        """
+        deliveries, self._pending = self._pending, []
+        await db_processor.save_broadcast_deliveries(self.broadcast.id, deliveries)
+
+    async def _report_progress(self, final: bool = False) -> None:
+        """
+        Обновляет у администратора сообщение с прогрессом рассылки.
+        """
+        self._last_progress = time.monotonic()
+        done = sum(self.counts.values())
+        text = (
+            f"{'Рассылка завершена' if final else 'Идет рассылка'}: "
+            f"{done} из {self.total}\n"
+            f"✅ Доставлено: {self.counts['sent']}\n"
+            f"🚫 Заблокировали бота: {self.counts['blocked']}\n"
+            f"❌ Ошибок: {self.counts['failed']}"
+        )
+        if not self.broadcast.progress_message_id:
+            return
+        await self.bucket.acquire()
+        try:
+            await bot.edit_message_text(
+                text=text,
+                chat_id=self.broadcast.admin_chat_id,
+                message_id=self.broadcast.progress_message_id,
+                reply_markup=get_admin_keyboard() if final else None,
+            )
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                logger.warning(f"Не удалось обновить прогресс рассылки: {e}")
+        except Exception as e:
+            logger.warning(f"Не удалось обновить прогресс рассылки: {e}")
+
+
+def _spawn(broadcast) -> asyncio.Task:
+    task = asyncio.create_task(BroadcastRunner(broadcast).run())
+    _running_broadcasts.add(task)
+    task.add_done_callback(_running_broadcasts.discard)
+
+    def report_failure(done: asyncio.Task) -> None:
+        # Ошибку фоновой задачи иначе никто не получит
+        if done.cancelled() or done.exception() is None:
+            return
+        error = done.exception()
+        logger.error(
+            f"Рассылка {broadcast.id} прервана ошибкой: {error}", exc_info=error
+        )
+        report = asyncio.create_task(send_error_report(error))
+        _running_broadcasts.add(report)
+        report.add_done_callback(_running_broadcasts.discard)
+
+    task.add_done_callback(report_failure)
+    return task
+
+
+async def start_broadcast(
+    text: str, admin_chat_id, progress_message_id: int
+) -> asyncio.Task:
+    """
+    Создает рассылку и запускает ее в фоне.
+    :param text: Текст рассылки
+    :param admin_chat_id: Чат администратора
+    :param progress_message_id: Сообщение, в котором показывается прогресс
+    :return: Задача рассылки
+    """
+    broadcast = await db_processor.create_broadcast(text, admin_chat_id)
+    await db_processor.set_broadcast_progress_message(broadcast.id, progress_message_id)
+    broadcast.progress_message_id = progress_message_id
+    logger.info(f"Запущена рассылка {broadcast.id}")
+    return _spawn(broadcast)
+
+
+async def stop_broadcasts() -> None:
+    """
+    Прерывает рассылки при остановке бота: накопленные результаты доставки
+    записываются, а отметка захвата снимается.
+    """
+    tasks = list(_running_broadcasts)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def resume_unfinished_broadcasts() -> None:
+    """
+    Продолжает рассылки, прерванные перезапуском или падением бота.
+
+    Рассылка захватывается атомарно (`claim_unfinished_broadcasts`), поэтому
+    при нескольких процессах бота на общей БД ее продолжает только один.
+    Рассылку упавшего процесса можно захватить только через
+    `BROADCAST_CLAIM_TIMEOUT` секунд, поэтому функция вызывается
+    и при запуске, и периодически.
+    """
+    claimed = await db_processor.claim_unfinished_broadcasts(
+        timedelta(seconds=BROADCAST_CLAIM_TIMEOUT)
+    )
+    for broadcast in claimed:
+        logger.info(f"Возобновляем рассылку {broadcast.id}")
+        try:
+            message = await bot.send_message(
+                broadcast.admin_chat_id, "Возобновляем прерванную рассылку..."
+            )
+            broadcast.progress_message_id = message.message_id
+            await db_processor.set_broadcast_progress_message(
+                broadcast.id, message.message_id
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось уведомить администратора о рассылке: {e}")
+        _spawn(broadcast)
@@ -0,0 +1,363 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from dotenv import load_dotenv
+from git import Repo
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Сколько страниц SQLite копировать за один шаг backup API
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", 1024))
+# Пауза между шагами (в секундах), чтобы не мешать записи бота
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", 0.005))
+# Сколько последних снимков хранить
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", 14))
+# Время ежедневного резервного копирования (ЧЧ:ММ, локальное время)
+BACKUP_TIME = os.getenv("BACKUP_TIME", "00:00")
+# Максимальная длительность одного резервного копирования (в секундах)
+BACKUP_TIMEOUT = float(os.getenv("BACKUP_TIMEOUT", 600))
+# Размер блока при хэшировании и сжатии снимка
+BACKUP_CHUNK_SIZE = 1024 * 1024
+
+MANIFEST_NAME = "backups.json"
+
+
+@dataclass
+class Snapshot:
+    file: str
+    sha256: str
+    created_at: str
+    size: int
+    # Размер и время изменения файла базы и WAL на момент снимка
+    source_stamp: str = ""
+
+
+class SQLiteBackup:
+    """
+    Резервные копии SQLite через online backup API.
+
+    Снимок снимается постранично (`BACKUP_PAGES_PER_STEP` страниц за шаг)
+    в согласованном состоянии, даже если бот продолжает писать в базу.
+    Копия пишется во временный файл на диске, затем потоково хэшируется
+    и сжимается gzip, поэтому память не зависит от размера базы.
+    Если файлы базы не менялись с последнего снимка, копия не снимается вовсе;
+    если хэш копии совпадает с последним снимком, новый снимок не сохраняется.
+    Хранятся последние `keep` снимков; список ведется в `backups.json`.
+    """
+
+    def __init__(self, db_path: str, backup_dir: str, keep: int = BACKUP_KEEP):
+        """
+        :param db_path: Путь к файлу базы данных.
+        :param backup_dir: Каталог со снимками.
+        :param keep: Сколько последних снимков хранить.
+        """
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.db_name = os.path.splitext(os.path.basename(db_path))[0]
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.backup_dir, MANIFEST_NAME)
+
+    def load_manifest(self) -> list[Snapshot]:
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path, encoding="utf-8") as file:
+            return [Snapshot(**item) for item in json.load(file)]
+
+    def _save_manifest(self, snapshots: list[Snapshot]) -> None:
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump([asdict(s) for s in snapshots], file, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _source_stamp(self) -> str:
+        parts = []
+        for path in (self.db_path, f"{self.db_path}-wal"):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+        return "|".join(parts)
+
+    def _copy_database(self, target_path: str, deadline: float = None) -> None:
+        """
+        Копирует базу в `target_path` через sqlite3 backup API порциями страниц.
+        :param deadline: Момент (time.monotonic()), после которого копирование прерывается
+        """
+        source = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        target = sqlite3.connect(target_path)
+        try:
+
+            def pause(status, remaining, total):
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError("Превышено время резервного копирования")
+                if remaining and BACKUP_STEP_SLEEP:
+                    time.sleep(BACKUP_STEP_SLEEP)
+
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP, progress=pause)
+        finally:
+            target.close()
+            source.close()
+
+    @staticmethod
+    def _hash_and_compress(source_path: str, target_path: str) -> str:
+        """
+        Потоково сжимает файл и считает SHA-256 его содержимого.
+        :return: Хэш несжатого файла
+        """
+        digest = hashlib.sha256()
+        with open(source_path, "rb") as source, open(
+            target_path, "wb"
+        ) as raw_target, gzip.GzipFile(
+            fileobj=raw_target, mode="wb", mtime=0
+        ) as target:
+            while chunk := source.read(BACKUP_CHUNK_SIZE):
+                digest.update(chunk)
+                target.write(chunk)
+        return digest.hexdigest()
+
+    def create_snapshot(
+        self, deadline: float = None
+    ) -> tuple[Snapshot | None, list[str]]:
+        """
+        Снимает резервную копию, если база изменилась с последнего снимка.
+
+        :param deadline: Момент (time.monotonic()), после которого копирование прерывается
+
+        :return: Новый снимок (None, если база не изменилась) и список удаленных
+                 по политике хранения файлов
+
+        Алгоритм работы:
+        1. Если размер и время изменения файлов базы совпадают с последним
+           снимком — ничего не делает.
+        2. Копирует базу через backup API во временный файл.
+        3. Сжимает копию, одновременно считая хэш содержимого.
+        4. Если хэш равен хэшу последнего снимка — удаляет временные файлы.
+        5. Иначе сохраняет снимок, обновляет backups.json и удаляет снимки
+           сверх `keep`.
+        """
+        if not os.path.exists(self.db_path):
+            raise FileNotFoundError(f"Файл базы данных {self.db_path} не найден.")
+        os.makedirs(self.backup_dir, exist_ok=True)
+
+        source_stamp = self._source_stamp()
+        snapshots = self.load_manifest()
+        if snapshots and snapshots[-1].source_stamp == source_stamp:
+            logger.info(
+                "Файлы базы данных не менялись, резервное копирование не требуется."
+            )
+            return None, []
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_name = f"{self.db_name}-{timestamp}.db.gz"
+        copy_path = os.path.join(self.backup_dir, f".{self.db_name}.tmp")
+        gz_path = os.path.join(self.backup_dir, f".{file_name}.tmp")
+        try:
+            self._copy_database(copy_path, deadline)
+            sha256 = self._hash_and_compress(copy_path, gz_path)
+            if snapshots and snapshots[-1].sha256 == sha256:
+                logger.info(
+                    "База данных не изменилась, резервное копирование не требуется."
+                )
+                snapshots[-1].source_stamp = source_stamp
+                self._save_manifest(snapshots)
+                return None, []
+
+            final_path = os.path.join(self.backup_dir, file_name)
+            shutil.move(gz_path, final_path)
+            snapshot = Snapshot(
+                file=file_name,
+                sha256=sha256,
+                created_at=timestamp,
+                size=os.path.getsize(final_path),
+                source_stamp=source_stamp,
+            )
+            snapshots.append(snapshot)
+            removed = [s.file for s in snapshots[: -self.keep]] if self.keep else []
+            snapshots = snapshots[-self.keep :] if self.keep else snapshots
+            for name in removed:
+                path = os.path.join(self.backup_dir, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            self._save_manifest(snapshots)
+            logger.info(
+                f"Создан снимок базы {file_name} ({snapshot.size} байт), "
+                f"удалено старых снимков: {len(removed)}"
+            )
+            return snapshot, removed
+        finally:
+            for path in (copy_path, gz_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def commit_snapshot(self, snapshot: Snapshot, removed: list[str]) -> None:
+        """
+        Коммитит новый снимок и удаление старых в git-репозиторий `backup_dir`.
+        :param snapshot: Новый снимок
+        :param removed: Удаленные по политике хранения файлы
+        """
+        repo = Repo(self.backup_dir)
+        repo.git.add(snapshot.file, MANIFEST_NAME)
+        if removed:
+            # Файлы уже удалены с диска, убираем их и из индекса
+            repo.git.rm("--cached", "--ignore-unmatch", "--", *removed)
+        commit_message = f"Backup at {snapshot.created_at}"
+        repo.index.commit(commit_message)
+        logger.info(f"Коммит сделан: {commit_message}")
+
+    def push(self, remote_url: str, timeout: float = None) -> None:
+        """
+        Отправляет коммиты в удаленный репозиторий.
+        :param remote_url: Адрес удаленного репозитория (origin)
+        :param timeout: Через сколько секунд прервать git push
+        """
+        repo = Repo(self.backup_dir)
+        if "origin" not in [remote.name for remote in repo.remotes]:
+            repo.create_remote("origin", remote_url)
+        # Ветка указывается явно: у нового репозитория еще нет upstream
+        repo.remote(name="origin").push(
+            repo.active_branch.name, set_upstream=True, kill_after_timeout=timeout
+        )
+        logger.info("Изменения отправлены в удалённый репозиторий.")
+
+
+def next_run_time(at: str, now: datetime = None) -> datetime:
+    """
+    Ближайший момент, когда наступит время `at` (ЧЧ:ММ).
+    """
+    now = now or datetime.now()
+    hour, minute = map(int, at.split(":"))
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return run_at
+
+
+class BackupWorker(threading.Thread):
+    """
+    Фоновый поток резервного копирования со своим расписанием.
+
+    Копирование, сжатие и git push выполняются в этом потоке и не блокируют
+    цикл событий бота. Каждый запуск ограничен `timeout`; если push не удался,
+    коммит остается локально и отправляется при следующем запуске.
+    Состояние последнего запуска доступно через `status`, об ошибках
+    сообщается через `on_error`.
+    """
+
+    def __init__(
+        self,
+        backup: SQLiteBackup,
+        remote_url: str,
+        at: str = BACKUP_TIME,
+        timeout: float = BACKUP_TIMEOUT,
+        on_error: Callable[[str], None] = None,
+    ):
+        """
+        :param backup: Объект, снимающий снимки базы.
+        :param remote_url: Адрес удаленного git-репозитория.
+        :param at: Время ежедневного запуска (ЧЧ:ММ).
+        :param timeout: Максимальная длительность одного запуска в секундах.
+        :param on_error: Вызывается с текстом ошибки (из потока резервного копирования).
+        """
+        super().__init__(name="db-backup", daemon=True)
+        self.backup = backup
+        self.remote_url = remote_url
+        self.at = at
+        self.timeout = timeout
+        self.on_error = on_error
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._run_lock = threading.Lock()
+        self._push_pending = False
+        self._status = {
+            "state": "idle",
+            "next_run": None,
+            "last_started": None,
+            "last_finished": None,
+            "last_duration": None,
+            "last_snapshot": None,
+            "last_error": None,
+        }
+
+    @property
+    def status(self) -> dict:
+        """
+        Состояние резервного копирования: idle / running / ok / failed,
+        время последнего и следующего запуска, последний снимок и ошибка.
+        """
+        return dict(self._status)
+
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            run_at = next_run_time(self.at)
+            self._status["next_run"] = run_at.isoformat(timespec="seconds")
+            self._wakeup.wait((run_at - datetime.now()).total_seconds())
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            self.run_once()
+
+    def trigger(self) -> None:
+        """
+        Запускает резервное копирование вне расписания.
+        """
+        self._wakeup.set()
+
+    def stop(self, timeout: float = 5) -> None:
+        """
+        Останавливает поток. Идущее копирование не прерывается,
+        поток просто не ждет его дольше `timeout` (он демонический).
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run_once(self) -> bool:
+        """
+        Выполняет одно резервное копирование: снимок, коммит и push.
+        :return: True, если все прошло успешно
+        """
+        with self._run_lock:
+            started = time.monotonic()
+            deadline = started + self.timeout
+            self._status.update(
+                state="running",
+                last_started=datetime.now().isoformat(timespec="seconds"),
+            )
+            try:
+                snapshot, removed = self.backup.create_snapshot(deadline=deadline)
+                if snapshot is not None:
+                    self.backup.commit_snapshot(snapshot, removed)
+                    self._status["last_snapshot"] = snapshot.file
+                    self._push_pending = True
+                if self._push_pending:
+                    remaining = max(1.0, deadline - time.monotonic())
+                    self.backup.push(self.remote_url, timeout=remaining)
+                    self._push_pending = False
+                self._status.update(state="ok", last_error=None)
+                return True
+            except Exception as e:
+                message = f"Ошибка при резервном копировании: {e}"
+                logger.error(message)
+                self._status.update(state="failed", last_error=str(e))
+                if self.on_error:
+                    self.on_error(message)
+                return False
+            finally:
+                self._status.update(
+                    last_finished=datetime.now().isoformat(timespec="seconds"),
+                    last_duration=round(time.monotonic() - started, 2),
+                )
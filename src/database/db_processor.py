@@ -1,21 +1,40 @@
+from collections import defaultdict
 from datetime import datetime, timedelta
 import os
 import logging
-import requests
 import asyncio
-from contextlib import contextmanager
-from git import Repo
+from contextlib import asynccontextmanager, contextmanager
 
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import (
+    case,
+    delete,
     func,
-    create_engine,
+    make_url,
+    or_,
+    select,
+    tuple_,
+    update,
 )
 
 from bot.routers.admin_router_sending_message import send_error_report
 from initialization.vdsina_processor_init import vdsina_processor
+from initialization.access_url_cache_init import access_url_cache
 from bot.utils.send_message import send_message_subscription_expired
-from database.models import Base, VpnKey, Server, User
+from database.models import (
+    Base,
+    Broadcast,
+    BroadcastDelivery,
+    VpnKey,
+    Server,
+    User,
+)
+from database.backup import BACKUP_TIME, BackupWorker, SQLiteBackup
+from database.engine import DATABASE_URL, create_engines, is_sqlite_url
+from database.migrate import upgrade_schema
+from database.query_instrumentation import get_query_log_mode, instrument_engine
+from database.server_index import ServerLoadIndex
 from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
@@ -31,8 +50,37 @@ github_remote_url = (
 )
 git_repo_dir = os.path.abspath("DB_LISA")
 
+# Сколько серверов одновременно обрабатывает синхронизация трафика
+TRAFFIC_SYNC_MAX_SERVERS = int(os.getenv("TRAFFIC_SYNC_MAX_SERVERS", 5))
+# Максимальное число пользователей на одном сервере
+MAX_USERS_PER_SERVER = 160
+# Сколько панелей одновременно опрашивает сверка счетчиков пользователей
+SERVER_RECONCILE_MAX_SERVERS = int(os.getenv("SERVER_RECONCILE_MAX_SERVERS", 5))
+# Размер страницы ключей при сканировании истекающих ключей в check_db
+CHECK_DB_CHUNK_SIZE = int(os.getenv("CHECK_DB_CHUNK_SIZE", 1000))
+# Сколько ключей одного сервера удаляются одновременно
+EXPIRED_KEYS_PER_SERVER_CONCURRENCY = int(
+    os.getenv("EXPIRED_KEYS_PER_SERVER_CONCURRENCY", 5)
+)
+# Сколько раз пытаться удалить истекший ключ с сервера
+EXPIRED_KEYS_DELETE_ATTEMPTS = int(os.getenv("EXPIRED_KEYS_DELETE_ATTEMPTS", 3))
+# Задержка перед первым повтором удаления (в секундах), дальше удваивается
+EXPIRED_KEYS_RETRY_DELAY = float(os.getenv("EXPIRED_KEYS_RETRY_DELAY", 2))
+# Сколько строк удалять из БД одним запросом
+EXPIRED_KEYS_DB_BATCH_SIZE = 500
+
 
 class DbProcessor:
+    """
+    Работа с базой данных.
+
+    Все публичные методы асинхронные и работают через `AsyncEngine`
+    (aiosqlite или asyncpg, см. `DATABASE_URL`), поэтому запросы к БД
+    не блокируют цикл событий бота.
+    Синхронные `engine`, `get_session()` и `session_scope()` оставлены
+    для тестов и разовых операций вне цикла событий и доступны только для SQLite.
+    """
+
     def __init__(self):
         # Создаем движок для подключения к базе данных
         base_dir = os.path.dirname(
@@ -41,24 +89,69 @@ class DbProcessor:
         db_path = os.path.join(
             base_dir, "..", "database", "vpn_users.db"
         )  # Поднимаемся на уровень выше
-        db_uri = f"sqlite:///{os.path.abspath(db_path)}"  # Создаем абсолютный путь
+        db_path = os.path.abspath(db_path)  # Создаем абсолютный путь
+        self.database_url = DATABASE_URL or f"sqlite:///{db_path}"
+        # Файл SQLite для резервного копирования (None для PostgreSQL)
+        self.db_path = (
+            make_url(self.database_url).database
+            if is_sqlite_url(self.database_url)
+            else None
+        )
+
+        # Полный echo SQL включается только явным режимом DB_QUERY_LOG_MODE=echo
+        query_log_mode = get_query_log_mode()
+        echo = query_log_mode == "echo"
 
-        self.engine = create_engine(db_uri, echo=True)
+        # Асинхронный движок — основной, синхронный — совместимость для тестов
+        # (только SQLite). Для SQLite оба с профилем соединения из database.engine
+        # (WAL, busy_timeout, ...): файл БД делят бот, задачи по расписанию
+        # и сервер перенаправлений; для PostgreSQL — пул соединений asyncpg
+        self.async_engine, self.engine = create_engines(self.database_url, echo=echo)
+        self.AsyncSession = async_sessionmaker(
+            bind=self.async_engine, expire_on_commit=False
+        )
         self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+
+        instrument_engine(self.async_engine.sync_engine, mode=query_log_mode)
+        if self.engine is not None:
+            instrument_engine(self.engine, mode=query_log_mode)
         self._server_creation_lock = asyncio.Lock()
+        # Загрузка серверов в памяти, согласованная с записью cnt_users в БД
+        self.server_index = ServerLoadIndex()
+        # Поток резервного копирования, запускается в start_backup_worker
+        self.backup_worker: BackupWorker | None = None
 
     def init_db(self):
-        """Синхронная инициализация базы данных."""
-        Base.metadata.create_all(self.engine)
+        """Синхронная инициализация базы данных (SQLite): применяет миграции."""
+        with self.engine.begin() as conn:
+            upgrade_schema(conn)
+
+    async def init_db_async(self):
+        """
+        Асинхронная инициализация базы данных: применяет миграции
+        (`database/migrations`) к SQLite, в том числе к уже существующему
+        файлу БД, или к PostgreSQL.
+        """
+        async with self.async_engine.begin() as conn:
+            await conn.run_sync(upgrade_schema)
+
+    async def close(self):
+        """Закрывает соединения движков и останавливает поток резервного копирования."""
+        if self.backup_worker is not None:
+            self.backup_worker.stop()
+            self.backup_worker = None
+        await self.async_engine.dispose()
+        if self.engine is not None:
+            self.engine.dispose()
 
     def get_session(self):
-        """Создает и возвращает новую сессию."""
+        """Создает и возвращает новую синхронную сессию."""
         return self.Session()
 
     @contextmanager
     def session_scope(self):
         """
-        Контекстный менеджер для работы с сессией.
+        Синхронный контекстный менеджер для работы с сессией.
         Обеспечивает автоматический коммит или откат транзакции.
         :return: Сессия
         """
@@ -72,26 +165,53 @@ class DbProcessor:
         finally:
             session.close()
 
-    def get_key_by_id(self, key_id: str) -> VpnKey | None:
+    @asynccontextmanager
+    async def async_session_scope(self):
+        """
+        Асинхронный контекстный менеджер для работы с сессией.
+        Обеспечивает автоматический коммит или откат транзакции.
+        :return: AsyncSession
+        """
+        async with self.AsyncSession() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+    async def get_key_by_id(self, key_id: str) -> VpnKey | None:
         """Возвращает объект ключа (VpnKey) по его ID или None, если ключ не найден."""
-        with self.session_scope() as session:
-            return session.query(VpnKey).filter_by(key_id=key_id).first()
+        async with self.async_session_scope() as session:
+            return await session.get(VpnKey, key_id)
 
-    def get_vpn_type_by_key_id(self, key_id: str) -> str:
+    async def get_user_keys(self, user_id) -> list[VpnKey]:
+        """
+        Возвращает все ключи пользователя.
+        :param user_id: Telegram ID пользователя
+        :return: Список ключей
+        """
+        async with self.async_session_scope() as session:
+            result = await session.scalars(
+                select(VpnKey).filter_by(user_telegram_id=int(user_id))
+            )
+            return list(result)
+
+    async def get_vpn_type_by_key_id(self, key_id: str) -> str:
         """
         Возвращает тип протокола VPN по ID ключа.
         :param key_id:
         :return:
         """
-        with self.session_scope() as session:
-            key = session.query(VpnKey).filter_by(key_id=key_id).first()
+        async with self.async_session_scope() as session:
+            key = await session.get(VpnKey, key_id)
             if key:
                 return key.protocol_type
             else:
                 logger.error(f"Ошибка при получении информации о ключе {key_id}")
                 return None
 
-    def update_database_with_key(
+    async def update_database_with_key(
         self,
         user_id,
         key,
@@ -109,7 +229,7 @@ class DbProcessor:
         :param protocol_type:
         :return:
         """
-        user_id_str = str(user_id)
+        user_id = int(user_id)
         start_date = datetime.now().replace(minute=0, second=0, microsecond=0)
 
         if is_trial_key:
@@ -122,12 +242,12 @@ class DbProcessor:
                 minute=0, second=0, microsecond=0
             )
 
-        with self.session_scope() as session:
-            user = session.query(User).filter_by(user_telegram_id=user_id_str).first()
+        async with self.async_session_scope() as session:
+            user = await session.get(User, user_id)
 
             if not user:
                 user = User(
-                    user_telegram_id=user_id_str,
+                    user_telegram_id=user_id,
                     subscription_status="active",
                     use_trial_period=False,
                 )
@@ -141,7 +261,7 @@ class DbProcessor:
 
             new_key = VpnKey(
                 key_id=key.key_id,
-                user_telegram_id=user_id_str,
+                user_telegram_id=user_id,
                 expiration_date=expiration_date,
                 start_date=start_date,
                 protocol_type=protocol_type,
@@ -159,8 +279,10 @@ class DbProcessor:
         :return:
         """
         expired_keys = {}
-        with self.session_scope() as session:
-            keys = session.query(VpnKey).filter_by(user_telegram_id=user_id).all()
+        async with self.async_session_scope() as session:
+            keys = await session.scalars(
+                select(VpnKey).filter_by(user_telegram_id=int(user_id))
+            )
             for key in keys:
                 time_remaining = key.expiration_date - datetime.now()
                 if time_remaining < timedelta(days=4):
@@ -174,125 +296,250 @@ class DbProcessor:
         """
         Асинхронная проверка базы данных на истекшие ключи.
         - Если ключ истекает через 3 дня, отправляется уведомление.
-        - Если ключ истекает сегодня, он удаляется из базы данных.
+        - Если ключ истек более 2х дней назад, он удаляется с сервера и из базы данных.
+
+        Алгоритм работы:
+        1. Выбирает по индексу `expiration_date` только ключи, истекающие в ближайшие
+           4 дня или уже истекшие, отсортированные по пользователю
+           (без загрузки всей таблицы пользователей).
+        2. Читает их страницами по `CHECK_DB_CHUNK_SIZE` строк (keyset-пагинация
+           по пользователю и ID ключа); сессия закрывается до обработки страницы,
+           поэтому отправка уведомлений не держит соединение с БД.
+        3. Группирует ключи по пользователю и отправляет одно уведомление на пользователя
+           (ключи пользователя могут продолжаться на следующей странице).
+        4. После сканирования удаляет накопленные истекшие ключи.
         :return:
         """
-        with self.session_scope() as session:
-            users = session.query(User).all()
+        now = datetime.now()
+        expired_keys = []
+        user_id, expiring_keys = None, {}
+
+        # Сортировка по выражению, а не по колонке: иначе SQLite обходит
+        # всю таблицу по индексу user_telegram_id, чтобы не сортировать.
+        # Истекающих ключей мало — их дешевле найти по индексу
+        # expiration_date и отсортировать
+        user_order = func.coalesce(VpnKey.user_telegram_id, 0)
+        query = (
+            select(
+                VpnKey.key_id,
+                VpnKey.user_telegram_id,
+                VpnKey.name,
+                VpnKey.expiration_date,
+                VpnKey.protocol_type,
+                VpnKey.server_id,
+                user_order.label("user_order"),
+            )
+            .filter(VpnKey.expiration_date < now + timedelta(days=4))
+            .order_by(user_order, VpnKey.key_id)
+            .limit(CHECK_DB_CHUNK_SIZE)
+        )
+        page_query = query
+        while True:
+            async with self.async_session_scope() as session:
+                page = (await session.execute(page_query)).all()
 
-            # Обрабатываем каждого пользователя
-            for user in users:
-                expiring_keys = await self._check_user_keys(user, session)
+            for key in page:
+                if key.user_telegram_id != user_id:
+                    await self._notify_expiring_keys(user_id, expiring_keys)
+                    user_id, expiring_keys = key.user_telegram_id, {}
 
-                if expiring_keys:
-                    # Отправляем уведомления об истекающих ключах
-                    await send_message_subscription_expired(
-                        user.user_telegram_id, expiring_keys
+                time_diff = key.expiration_date - now
+                if time_diff > timedelta(days=-2):
+                    # Ключ будет действителен не более 3х дней или уже истек
+                    expiring_keys[key.key_id] = (
+                        key.name,
+                        max(time_diff, timedelta(days=0)).days + 1,
                     )
+                else:
+                    # Если ключ истек более 2х дней назад
+                    expired_keys.append(key)
+                    expiring_keys[key.key_id] = (key.name, 0)
+
+            if len(page) < CHECK_DB_CHUNK_SIZE:
+                break
+            last = page[-1]
+            page_query = query.filter(
+                tuple_(user_order, VpnKey.key_id) > (last.user_order, last.key_id)
+            )
+
+        await self._notify_expiring_keys(user_id, expiring_keys)
+        await self._delete_expired_keys(expired_keys)
 
-    async def _check_user_keys(self, user, session):
+    @staticmethod
+    async def _notify_expiring_keys(user_id, expiring_keys: dict) -> None:
         """
-        Проверяет ключи пользователя на истечение и выполняет соответствующие действия.
-        :param user: Объект пользователя
-        :param session: Сессия базы данных
-        :return: Словарь с истекающими ключами для уведомления
+        Отправляет пользователю уведомление об истекающих ключах.
+        :param user_id: Telegram ID пользователя
+        :param expiring_keys: Словарь {key_id: (имя ключа, осталось дней)}
         """
-        expiring_keys = {}
-        now = datetime.now()
-        for key in user.keys:
-            time_diff = key.expiration_date - now
-
-            if timedelta(days=-2) < time_diff < timedelta(days=4):
-                # Ключ будет действителен не более 3х дней или уже истек
-                expiring_keys[key.key_id] = (
-                    key.name,
-                    max(time_diff, timedelta(days=0)).days + 1,
-                )
-            elif key.expiration_date < now:
-                # Если ключ истек более 2х дней назад
-                await self._delete_expired_key(key, session)
-                expiring_keys[key.key_id] = (key.name, 0)
+        if user_id is None or not expiring_keys:
+            return
+        try:
+            await send_message_subscription_expired(user_id, expiring_keys)
+        except Exception as e:
+            logger.error(f"Не удалось уведомить пользователя {user_id}: {e}")
 
-        return expiring_keys
+    async def _delete_expired_keys(self, keys: list) -> None:
+        """
+        Стадия удаления истекших ключей.
+
+        Алгоритм работы:
+        1. Группирует ключи по серверу.
+        2. Удаляет ключи с серверов параллельно: все серверы одновременно, а внутри
+           сервера не более `EXPIRED_KEYS_PER_SERVER_CONCURRENCY` запросов.
+        3. Неудачное удаление повторяется до `EXPIRED_KEYS_DELETE_ATTEMPTS` раз
+           с экспоненциальной задержкой.
+        4. Из БД пакетно удаляются только ключи, удаленные с сервера; счетчик
+           пользователей каждого сервера уменьшается одним запросом.
+        :param keys: Строки ключей (key_id, protocol_type, server_id)
+        """
+        if not keys:
+            return
+
+        keys_by_server = defaultdict(list)
+        for key in keys:
+            keys_by_server[key.server_id].append(key)
+
+        results = await asyncio.gather(
+            *(
+                self._delete_server_expired_keys(server_id, server_keys)
+                for server_id, server_keys in keys_by_server.items()
+            )
+        )
+        deleted = {
+            server_id: key_ids
+            for server_id, key_ids in zip(keys_by_server, results)
+            if key_ids
+        }
+        if not deleted:
+            return
+
+        deleted_key_ids = [key_id for key_ids in deleted.values() for key_id in key_ids]
+        async with self.async_session_scope() as session:
+            for i in range(0, len(deleted_key_ids), EXPIRED_KEYS_DB_BATCH_SIZE):
+                batch = deleted_key_ids[i : i + EXPIRED_KEYS_DB_BATCH_SIZE]
+                await session.execute(delete(VpnKey).where(VpnKey.key_id.in_(batch)))
+
+            # Обновляем количество пользователей на серверах
+            for server_id, key_ids in deleted.items():
+                await session.execute(
+                    update(Server)
+                    .filter_by(id=server_id)
+                    .values(
+                        cnt_users=case(
+                            (
+                                Server.cnt_users > len(key_ids),
+                                Server.cnt_users - len(key_ids),
+                            ),
+                            else_=0,
+                        )
+                    )
+                )
+        for server_id, key_ids in deleted.items():
+            self.server_index.adjust(server_id, -len(key_ids))
+        for key_id in deleted_key_ids:
+            await access_url_cache.invalidate_async(key_id)
+        logger.info(
+            f"Удалено истекших ключей: {len(deleted_key_ids)} из {len(keys)}, "
+            f"серверов: {len(deleted)}"
+        )
 
     @staticmethod
-    async def _delete_expired_key(key, session):
+    async def _delete_server_expired_keys(server_id: int, keys: list) -> list[str]:
         """
-        Удаляет истекший ключ из базы данных.
-        :param key: Ключ для удаления
-        :param session: Сессия базы данных
+        Удаляет истекшие ключи с одного сервера с ограничением параллельности и повторами.
+        :param server_id: ID сервера
+        :param keys: Строки ключей этого сервера
+        :return: ID ключей, успешно удаленных с сервера
         """
-        from utils import get_processor
+        from utils.get_processor import get_processor
 
-        processor = await get_processor(key.protocol_type.lower())
-        processor.delete_key(key.key_id, server_id=key.server_id)
-        session.delete(key)
+        semaphore = asyncio.Semaphore(EXPIRED_KEYS_PER_SERVER_CONCURRENCY)
 
-        # Обновляем количество пользователей на сервере
-        key.server.cnt_users = max(0, key.server.cnt_users - 1)
+        async def delete_with_retries(key):
+            processor = await get_processor(key.protocol_type.lower())
+            async with semaphore:
+                for attempt in range(1, EXPIRED_KEYS_DELETE_ATTEMPTS + 1):
+                    try:
+                        result = await processor.delete_key(
+                            key.key_id, server_id=server_id
+                        )
+                        if result is True:
+                            return key.key_id
+                        error = result
+                    except Exception as e:
+                        error = e
+                    logger.warning(
+                        f"Не удалось удалить ключ {key.key_id} с сервера {server_id} "
+                        f"(попытка {attempt}/{EXPIRED_KEYS_DELETE_ATTEMPTS}): {error}"
+                    )
+                    if attempt < EXPIRED_KEYS_DELETE_ATTEMPTS:
+                        await asyncio.sleep(
+                            EXPIRED_KEYS_RETRY_DELAY * 2 ** (attempt - 1)
+                        )
+            return None
+
+        results = await asyncio.gather(*(delete_with_retries(key) for key in keys))
+        deleted = [key_id for key_id in results if key_id is not None]
+        if len(deleted) < len(keys):
+            await send_error_report(
+                f"Не удалось удалить {len(keys) - len(deleted)} истекших ключей "
+                f"с сервера {server_id}"
+            )
+        return deleted
 
     async def get_server_with_min_users(self, protocol_type: str) -> Server:
         """
         Выбирает сервер с минимальным количеством пользователей для указанного протокола.
         Если такого сервера нет, создает новый, гарантируя, что одновременно создается не более одного сервера.
+
+        Сервер выбирается по индексу загрузки в памяти (`server_index`) за O(log n),
+        в БД выполняется только увеличение счетчика пользователей.
         :param protocol_type: Например, "outline" или "vless"
         :return: Объект сервера
         """
+        from utils.get_processor import get_processor
+
         async with self._server_creation_lock:
-            with self.session_scope() as session:
-                count_servers = session.query(Server).count()
-                server = (
-                    session.query(Server)
-                    .filter(func.lower(Server.protocol_type) == protocol_type.lower())
-                    .filter(Server.cnt_users < 160)
-                    .order_by(Server.cnt_users.asc())
-                    .with_for_update()  # Блокируем строку для изменения
-                    .first()
-                )
-                from utils.get_processor import get_processor
+            await self._ensure_server_index()
+            server_id = self.server_index.least_loaded(
+                protocol_type, max_users=MAX_USERS_PER_SERVER
+            )
 
-                if not server:
-                    logger.info(f"Сервера с протоколом {protocol_type} не найдено.")
+            if server_id is None:
+                logger.info(f"Сервера с протоколом {protocol_type} не найдено.")
 
-                    new_server, server_ip, server_password = (
-                        await self.create_new_server(count_servers)
-                    )
+                new_server, server_ip, server_password = await self.create_new_server(
+                    len(self.server_index)
+                )
 
-                    if not new_server:
-                        await send_error_report("Ошибка при создании нового сервера")
-                        logger.error("Ошибка при создании нового сервера")
-                        return None
+                if not new_server:
+                    await send_error_report("Ошибка при создании нового сервера")
+                    logger.error("Ошибка при создании нового сервера")
+                    return None
 
-                    new_server_db = self.add_server(
-                        new_server, protocol_type, server_ip, server_password
+                new_server_db = await self.add_server(
+                    new_server, protocol_type, server_ip, server_password
+                )
+                processor = await get_processor(protocol_type.lower())
+                result = await processor.setup_server(new_server_db)
+                if not result:
+                    await send_error_report(
+                        "Ошибка при настройке сервера {protocol_type}"
                     )
-                    processor = await get_processor(protocol_type.lower())
-                    result = await processor.setup_server(new_server_db)
-                    if not result:
-                        await send_error_report(
-                            "Ошибка при настройке сервера {protocol_type}"
-                        )
-                        logger.error(
-                            f"Ошибка при настройке сервера типа {protocol_type}"
-                        )
-                        return None
-                    server = new_server_db
+                    logger.error(f"Ошибка при настройке сервера типа {protocol_type}")
+                    return None
+                server_id = new_server_db.id
 
-                self.increment_server_user_count(server.id)
-                server = self.get_server_by_id(server.id)
-                return server
+            return await self.increment_server_user_count(server_id)
 
-    def get_server_info(self, server_id):
+    async def get_server_info(self, server_id):
         """
         Запрашивает информацию о сервере по его ID.
         :param server_id:
         :return:
         """
-        url = f"https://userapi.vdsina.com/v1/server/{server_id}"
-        headers = {"Authorization": f"Bearer {os.getenv('VDSINA_TOKEN')}"}
-
-        response = requests.get(url, headers=headers)
-        data = response.json()
+        data = await vdsina_processor.get_server_status(server_id)
 
         if data.get("status") == "ok":
             return data.get("data", {})
@@ -306,7 +553,7 @@ class DbProcessor:
         :return: True, если сервер активен, иначе False
         """
         for _ in range(timeout // 5):  # Проверяем каждые 5 секунд
-            server_data = self.get_server_info(server_id)
+            server_data = await self.get_server_info(server_id)
             if server_data and server_data.get("status") == "active":
                 return True
             logger.info("Сервер еще не активен, ждем...")
@@ -315,44 +562,33 @@ class DbProcessor:
         await send_error_report("Таймаут ожидания сервера!")
         return False
 
-    def get_server_ip(self, server_id):
+    async def get_server_ip(self, server_id):
         """
         Запрашивает информацию о сервере по его ID.
         :param server_id:
         :return: IP-адрес сервера
         """
-        url = f"https://userapi.vdsina.com/v1/server/{server_id}"
-        headers = {"Authorization": f"Bearer {os.getenv('VDSINA_TOKEN')}"}
-        response = requests.get(url, headers=headers)
-        data = response.json()
-        if data.get("status") == "ok":
-            server_data = data.get("data", {})
+        server_data = await self.get_server_info(server_id)
+        if server_data:
             ip_list = server_data.get("ip", [])
             if ip_list:
                 return ip_list[0].get("ip")
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(send_error_report("Ошибка при получении IP сервера"))
+        await send_error_report("Ошибка при получении IP сервера")
         return None
 
-    def get_server_password(self, server_id):
+    async def get_server_password(self, server_id):
         """
         Получает пароль сервера по его ID.
         :param server_id:
         :return: Пароль сервера
         """
-        url = f"https://userapi.vdsina.com/v1/server.password/{server_id}"
-        headers = {"Authorization": f"Bearer {os.getenv('VDSINA_TOKEN')}"}
-        response = requests.get(url, headers=headers)
-        data = response.json()
+        data = await vdsina_processor.get_server_password(server_id)
         if data.get("status") == "ok":
             server_data = data.get("data", {})
             password = server_data.get("password", [])
             if password:
                 return password
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(
-            send_error_report("Ошибка при получении пароля сервера")
-        )
+        await send_error_report("Ошибка при получении пароля сервера")
         return None
 
     async def create_new_server(self, count_servers):
@@ -384,12 +620,12 @@ class DbProcessor:
             )
             logger.error("Сервер не стал активным, невозможно получить IP и пароль")
             return None
-        server_ip = self.get_server_ip(server_id)
-        server_password = self.get_server_password(server_id)
+        server_ip = await self.get_server_ip(server_id)
+        server_password = await self.get_server_password(server_id)
         logger.info(f"Сервер готов: IP={server_ip}, Пароль={server_password}")
         return new_server, server_ip, server_password
 
-    def add_server(
+    async def add_server(
         self,
         server_data: dict,
         protocol_type: str,
@@ -402,7 +638,7 @@ class DbProcessor:
         :param protocol_type: Тип протокола (например, "Outline").
         :return: Объект нового сервера.
         """
-        with self.session_scope() as session:
+        async with self.async_session_scope() as session:
             new_server = Server(
                 ip=server_ip,
                 password=server_password,
@@ -412,194 +648,540 @@ class DbProcessor:
                 protocol_type=protocol_type,
             )
             session.add(new_server)
-            session.commit()
-            session.refresh(new_server)
+            await session.flush()
             logger.info(f"Сервер {new_server.id} успешно добавлен в БД.")
-            return new_server
+        self.server_index.set(new_server.id, protocol_type, 0)
+        return new_server
 
-    def get_server_id_by_key_id(self, key_id) -> int:
+    async def get_server_id_by_key_id(self, key_id) -> int:
         """
         Возвращает ID сервера по ID ключа.
         :param key_id:
         :return: ID сервера
         """
-        with self.session_scope() as session:
-            key = session.query(VpnKey).filter_by(key_id=key_id).first()
+        async with self.async_session_scope() as session:
+            key = await session.get(VpnKey, key_id)
             if key:
                 return key.server_id
             else:
-                loop = asyncio.get_event_loop()
-                loop.run_until_complete(
-                    send_error_report("Ошибка при получении ID сервера")
-                )
+                await send_error_report("Ошибка при получении ID сервера")
                 logger.error(f"Ошибка при получении информации о ключе {key_id}")
                 return None
 
-    def get_server_by_id(self, server_id: str) -> Server:
+    async def get_server_by_id(self, server_id: str) -> Server:
         """
         Возвращает сервер по ID.
         :param server_id:
         :return:
         """
-        with self.session_scope() as session:
-            server = session.query(Server).filter_by(id=server_id).first()
+        async with self.async_session_scope() as session:
+            server = await session.get(Server, server_id)
             if server:
                 logger.info(f"Найден сервер с id: {server_id}")
             else:
-                loop = asyncio.get_event_loop()
-                loop.run_until_complete(
-                    send_error_report("Ошибка при получении сервера по ID")
-                )
+                await send_error_report("Ошибка при получении сервера по ID")
                 logger.error(f"Сервер с id {server_id} не найден.")
                 raise ValueError("Нет сервера с переданным id")
             return server
 
-    def increment_server_user_count(self, server_id: int) -> Server:
-        with self.session_scope() as session:
-            server = session.query(Server).filter_by(id=server_id).one()
-            server.cnt_users += 1
-            session.commit()
-            session.refresh(server)
-            return server
+    async def increment_server_user_count(self, server_id: int) -> Server:
+        """
+        Увеличивает счетчик пользователей сервера в БД и в индексе загрузки.
+        :param server_id: ID сервера
+        :return: Обновленный объект сервера
+        """
+        async with self.async_session_scope() as session:
+            server = await session.scalar(
+                update(Server)
+                .filter_by(id=server_id)
+                .values(cnt_users=func.coalesce(Server.cnt_users, 0) + 1)
+                .returning(Server)
+            )
+        if server is None:
+            raise ValueError("Нет сервера с переданным id")
+        self.server_index.set(server.id, server.protocol_type, server.cnt_users)
+        return server
 
-    def rename_key(self, key_id: str, new_name: str) -> bool:
+    async def rename_key(self, key_id: str, new_name: str) -> bool:
         """
         Изменяет имя ключа.
         :param key_id:
         :param new_name:
         :return:
         """
-        with self.session_scope() as session:
-            key = session.query(VpnKey).filter_by(key_id=key_id).first()
+        async with self.async_session_scope() as session:
+            key = await session.get(VpnKey, key_id)
             if not key:
                 logger.warning(f"Ключ с ID {key_id} не найден.")
                 return False
             key.name = new_name
             logger.info(f"Имя ключа с ID {key_id} изменено на {new_name}")
-            return True
+        # Имя входит в ссылку VLESS
+        await access_url_cache.invalidate_async(key_id)
+        return True
 
     async def check_count_keys_on_servers(self):
         """
         Асинхронная проверка числа клиентов на серверах
         - Если на всех серверах какого-то типа > 159 клиентов, то поднимаем новый сервер соответствующего типа
+        Индекс загрузки перечитывается из БД одним запросом: ключи могли выдать
+        другие процессы бота, а индекс в памяти у каждого процесса свой.
         :return:
         """
         from utils.get_processor import get_processor
 
         async with self._server_creation_lock:
-            with self.session_scope() as session:
-                count_servers = session.query(Server).count()
-                server_types = ("outline", "vless")
-                for protocol_type in server_types:
-                    servers = (
-                        session.query(Server)
-                        .filter_by(protocol_type=protocol_type)
-                        .all()
+            await self.load_server_index()
+            count_servers = len(self.server_index)
+            server_types = ("outline", "vless")
+            for protocol_type in server_types:
+                if self.server_index.all_full(
+                    protocol_type, threshold=MAX_USERS_PER_SERVER - 1
+                ):
+                    logger.info(
+                        f"Все сервера типа {protocol_type} имеют не менее 159 ключей"
                     )
-                    all_servers_full = all(
-                        server.cnt_users >= 159 for server in servers
+                    new_server, server_ip, server_password = (
+                        await self.create_new_server(count_servers)
                     )
-                    if all_servers_full:
-                        logger.info(
-                            f"Все сервера типа {protocol_type} имеют не менее 159 ключей"
+                    logger.info(f"Подняли новый сервер типа {protocol_type}")
+                    new_server = await self.add_server(
+                        new_server, protocol_type, server_ip, server_password
+                    )
+                    logger.info(f"Записали данные нового сервера в БД")
+                    processor = await get_processor(protocol_type)
+                    logger.info(f"Передаем сервер в setup_server: {new_server}")
+                    result = await processor.setup_server(new_server)
+                    if not result:
+                        logger.error(
+                            f"Ошибка при настройке сервера типа {protocol_type}"
                         )
-                        new_server, server_ip, server_password = (
-                            await self.create_new_server(count_servers)
+                        return
+                    logger.info(f"Настроили сервер типа {protocol_type}")
+
+    async def load_server_index(self) -> None:
+        """
+        Загружает индекс загрузки серверов из БД.
+        """
+        async with self.async_session_scope() as session:
+            result = await session.execute(
+                select(Server.id, Server.protocol_type, Server.cnt_users)
+            )
+            self.server_index.load(result.all())
+
+    async def _ensure_server_index(self) -> None:
+        """
+        Загружает индекс серверов при первом обращении.
+        """
+        if not self.server_index.loaded:
+            await self.load_server_index()
+
+    async def reconcile_server_user_counts(self) -> None:
+        """
+        Сверяет счетчики пользователей серверов с реальным числом ключей на панелях.
+
+        Алгоритм работы:
+        1. Под `_server_creation_lock` перечитывает индекс из БД: индекс в памяти
+           свой у каждого процесса бота и не видит ключи, выданные другими
+           процессами (например, несколькими ботами на общей PostgreSQL).
+        2. Параллельно (не более `SERVER_RECONCILE_MAX_SERVERS` серверов) для
+           каждого сервера читает счетчик и ID ключей сервера из БД и сразу
+           после этого получает ключи на панели. Считаются только ключи панели,
+           которые есть в БД: служебный клиент `test1`, создаваемый вместе
+           с inbound VLESS, и клиенты, добавленные не ботом, в счетчик не входят.
+        3. Под `_server_creation_lock` прибавляет расхождение к текущему значению
+           в БД (`cnt_users = cnt_users + (на панели - прочитано)`), поэтому
+           ключи, выданные или удаленные за время опроса панелей, не теряются.
+        4. Обновляет индекс значениями из БД.
+        """
+        from utils.get_processor import get_processor
+
+        async with self._server_creation_lock:
+            async with self.async_session_scope() as session:
+                result = await session.execute(
+                    select(Server.id, Server.protocol_type, Server.cnt_users)
+                )
+                servers = result.all()
+            self.server_index.load(servers)
+
+        semaphore = asyncio.Semaphore(SERVER_RECONCILE_MAX_SERVERS)
+
+        async def count_panel_keys(server_id, protocol_type):
+            async with semaphore:
+                try:
+                    async with self.async_session_scope() as session:
+                        seen = await session.scalar(
+                            select(Server.cnt_users).filter_by(id=server_id)
                         )
-                        logger.info(f"Подняли новый сервер типа {protocol_type}")
-                        new_server = self.add_server(
-                            new_server, protocol_type, server_ip, server_password
+                        known = set(
+                            await session.scalars(
+                                select(VpnKey.key_id).filter_by(server_id=server_id)
+                            )
                         )
-                        logger.info(f"Записали данные нового сервера в БД")
-                        processor = await get_processor(protocol_type)
-                        logger.info(f"Передаем сервер в setup_server: {new_server}")
-                        result = await processor.setup_server(new_server)
-                        if not result:
-                            logger.error(
-                                f"Ошибка при настройке сервера типа {protocol_type}"
+                    processor = await get_processor(protocol_type)
+                    usage = await processor.get_keys_usage(server_id=server_id)
+                except Exception as e:
+                    logger.error(f"Не удалось получить ключи сервера {server_id}: {e}")
+                    return None
+                if usage is None:
+                    return None
+                return len(known.intersection(usage)) - (seen or 0)
+
+        drifts = await asyncio.gather(
+            *(count_panel_keys(server.id, server.protocol_type) for server in servers)
+        )
+
+        fixed = 0
+        async with self._server_creation_lock:
+            async with self.async_session_scope() as session:
+                for server, drift in zip(servers, drifts):
+                    if not drift:
+                        continue
+                    cnt_users = await session.scalar(
+                        update(Server)
+                        .filter_by(id=server.id)
+                        .values(
+                            cnt_users=case(
+                                (
+                                    func.coalesce(Server.cnt_users, 0) + drift > 0,
+                                    func.coalesce(Server.cnt_users, 0) + drift,
+                                ),
+                                else_=0,
                             )
-                            return
-                        logger.info(f"Настроили сервер типа {protocol_type}")
+                        )
+                        .returning(Server.cnt_users)
+                    )
+                    if cnt_users is None:
+                        # Сервер удален, пока шла сверка
+                        self.server_index.remove(server.id)
+                        continue
+                    logger.warning(
+                        f"Счетчик сервера {server.id}: расхождение с панелью {drift:+d}, "
+                        f"теперь {cnt_users}"
+                    )
+                    self.server_index.set(server.id, server.protocol_type, cnt_users)
+                    fixed += 1
+        logger.info(f"Сверка счетчиков серверов завершена, исправлено: {fixed}")
 
     async def check_and_update_key_data_limit(self):
+        """
+        Пакетная синхронизация лимитов трафика действующих ключей.
+
+        Алгоритм работы:
+        1. Одним запросом получает из БД все действующие ключи и группирует их по серверам.
+        2. Для каждого сервера один раз получает трафик и лимиты всех ключей (`get_keys_usage`).
+        3. В памяти вычисляет новые лимиты: лимит + трафик с прошлой синхронизации.
+        4. Отправляет обновления лимитов; серверы обрабатываются параллельно,
+           но не более `TRAFFIC_SYNC_MAX_SERVERS` одновременно.
+        5. Сохраняет `used_bytes_last_month` одним пакетом и только для успешно обновленных ключей.
+        """
+        now = datetime.now()
+        async with self.async_session_scope() as session:
+            result = await session.execute(
+                select(
+                    VpnKey.key_id,
+                    VpnKey.name,
+                    VpnKey.protocol_type,
+                    VpnKey.server_id,
+                    VpnKey.used_bytes_last_month,
+                ).filter(VpnKey.expiration_date >= now)
+            )
+            keys = result.all()
+
+        keys_by_server = defaultdict(list)
+        for key in keys:
+            keys_by_server[(key.protocol_type.lower(), key.server_id)].append(key)
+
+        semaphore = asyncio.Semaphore(TRAFFIC_SYNC_MAX_SERVERS)
+        results = await asyncio.gather(
+            *(
+                self._sync_server_traffic(
+                    protocol_type, server_id, server_keys, semaphore
+                )
+                for (protocol_type, server_id), server_keys in keys_by_server.items()
+            )
+        )
+
+        synced = {key_id: used for result in results for key_id, used in result.items()}
+        if synced:
+            async with self.async_session_scope() as session:
+                await session.execute(
+                    update(VpnKey),
+                    [
+                        {"key_id": key_id, "used_bytes_last_month": used_bytes}
+                        for key_id, used_bytes in synced.items()
+                    ],
+                )
+        logger.info(
+            f"Синхронизация трафика: серверов {len(keys_by_server)}, "
+            f"ключей {len(keys)}, обновлено лимитов {len(synced)}"
+        )
+
+    async def _sync_server_traffic(
+        self, protocol_type: str, server_id: int, keys: list, semaphore
+    ) -> dict[str, int]:
+        """
+        Синхронизирует лимиты трафика ключей одного сервера.
+
+        :param protocol_type: Тип протокола сервера.
+        :param server_id: ID сервера.
+        :param keys: Ключи сервера из БД.
+        :param semaphore: Семафор, ограничивающий число одновременно обрабатываемых серверов.
+        :return: Словарь {key_id: used_bytes} для ключей, лимит которых был обновлен.
+        """
         from utils.get_processor import get_processor
 
-        with self.session_scope() as session:
-            keys = session.query(VpnKey).all()
+        async with semaphore:
+            processor = await get_processor(protocol_type)
+            try:
+                usage = await processor.get_keys_usage(server_id=server_id)
+            except Exception as e:
+                await send_error_report(e)
+                logger.error(f"Не удалось получить трафик сервера {server_id}: {e}")
+                return {}
+            if usage is None:
+                return {}
+
+            updates = []
             for key in keys:
-                now = datetime.now()
-                if key.expiration_date >= now:
-                    processor = await get_processor(key.protocol_type)
-                    key_info = await processor.get_key_info(
-                        key.key_id, server_id=key.server_id
+                key_usage = usage.get(key.key_id)
+                if key_usage is None:
+                    logger.warning(
+                        f"Ключ {key.key_id} не найден на сервере {server_id}"
                     )
-                    logger.info("Обновляем лимит")
-                    await processor.update_data_limit(
-                        key.key_id,
-                        key_info.data_limit
-                        + (key_info.used_bytes - key.used_bytes_last_month),
-                        server_id=key.server_id,
-                        key_name=key.name,
+                    continue
+                delta = key_usage.used_bytes - (key.used_bytes_last_month or 0)
+                if delta == 0 or key_usage.data_limit is None:
+                    continue
+                updates.append(
+                    (key, key_usage.data_limit + delta, key_usage.used_bytes)
+                )
+
+            results = await asyncio.gather(
+                *(
+                    processor.update_data_limit(
+                        key.key_id, new_limit, server_id=server_id, key_name=key.name
                     )
-                    key.used_bytes_last_month = key_info.used_bytes
+                    for key, new_limit, _ in updates
+                ),
+                return_exceptions=True,
+            )
+
+        synced = {}
+        for (key, _, used_bytes), result in zip(updates, results):
+            if result is True:
+                synced[key.key_id] = used_bytes
+            else:
+                logger.error(f"Не удалось обновить лимит ключа {key.key_id}: {result}")
+        return synced
 
-    def update_server_by_id(self, server_id, api_url, cert_sha256):
-        with self.session_scope() as session:
+    async def update_server_by_id(self, server_id, api_url, cert_sha256):
+        async with self.async_session_scope() as session:
             # Берём сервер непосредственно в этой же сессии
-            server = session.query(Server).filter_by(id=server_id).one()
+            server = await session.get_one(Server, server_id)
             server.api_url = api_url
             server.cert_sha256 = cert_sha256
-            session.commit()
-            # При необходимости можно сделать session.refresh(server)
-            session.refresh(server)
             logger.info(
                 f"Сервер {server_id} успешно обновлен, server.api_url={api_url}, server.cert_sha256={cert_sha256}"
             )
 
     async def get_all_user_ids(self):
-        with self.session_scope() as session:
-            users = session.query(User).all()
-            return [user.user_telegram_id for user in users]
+        async with self.async_session_scope() as session:
+            result = await session.scalars(select(User.user_telegram_id))
+            return list(result)
 
-    @staticmethod
-    async def backup_bd():
-        db_path = os.path.abspath("database/vpn_users.db")
-        if not os.path.exists(db_path):
-            logger.error(f"Файл базы данных {db_path} не найден.")
-            await send_error_report(f"Файл базы данных {db_path} не найден.")
-            return None
-        if not db_path:
+    async def get_users_count(self) -> int:
+        """
+        Возвращает число пользователей.
+        """
+        async with self.async_session_scope() as session:
+            return await session.scalar(select(func.count()).select_from(User))
+
+    async def create_broadcast(self, text: str, admin_chat_id) -> Broadcast:
+        """
+        Создает запись о новой рассылке.
+        :param text: Текст рассылки
+        :param admin_chat_id: Чат администратора, куда отправляется прогресс
+        :return: Объект рассылки
+        """
+        async with self.async_session_scope() as session:
+            now = datetime.now()
+            broadcast = Broadcast(
+                text=text,
+                admin_chat_id=str(admin_chat_id),
+                status="running",
+                created_at=now,
+                claimed_at=now,
+            )
+            session.add(broadcast)
+            await session.flush()
+            return broadcast
+
+    async def set_broadcast_progress_message(self, broadcast_id: int, message_id: int):
+        """
+        Запоминает сообщение, в котором показывается прогресс рассылки.
+        """
+        async with self.async_session_scope() as session:
+            await session.execute(
+                update(Broadcast)
+                .filter_by(id=broadcast_id)
+                .values(progress_message_id=message_id)
+            )
+
+    async def claim_unfinished_broadcasts(
+        self, stale_after: timedelta
+    ) -> list[Broadcast]:
+        """
+        Захватывает рассылки, которые были прерваны (например, перезапуском бота).
+
+        Рассылка считается прерванной, если она не завершена, а ее отметка
+        `claimed_at` не обновлялась дольше `stale_after` или снята при остановке.
+        Отметка ставится тем же запросом (UPDATE ... RETURNING), поэтому
+        каждую рассылку захватывает только один процесс.
+        :param stale_after: Через сколько без отметки рассылка считается прерванной
+        :return: Захваченные рассылки
+        """
+        now = datetime.now()
+        async with self.async_session_scope() as session:
+            result = await session.scalars(
+                update(Broadcast)
+                .where(
+                    Broadcast.status == "running",
+                    or_(
+                        Broadcast.claimed_at.is_(None),
+                        Broadcast.claimed_at < now - stale_after,
+                    ),
+                )
+                .values(claimed_at=now)
+                .returning(Broadcast)
+            )
+            return sorted(result, key=lambda broadcast: broadcast.id)
+
+    async def release_broadcast(self, broadcast_id: int) -> None:
+        """
+        Снимает отметку с незавершенной рассылки при остановке процесса,
+        чтобы после перезапуска ее сразу продолжил любой процесс.
+        """
+        async with self.async_session_scope() as session:
+            await session.execute(
+                update(Broadcast).filter_by(id=broadcast_id).values(claimed_at=None)
+            )
+
+    async def get_broadcast_recipients(
+        self, broadcast_id: int, after_user_id: int | None, limit: int
+    ) -> list[int]:
+        """
+        Возвращает порцию получателей рассылки, которым она еще не доставлялась.
+        Пагинация по ключу (`user_telegram_id > after_user_id`), поэтому
+        вся таблица пользователей в память не загружается.
+        :param broadcast_id: ID рассылки
+        :param after_user_id: Последний ID из предыдущей порции (None для первой)
+        :param limit: Размер порции
+        :return: Список Telegram ID
+        """
+        delivered = select(BroadcastDelivery.user_telegram_id).where(
+            BroadcastDelivery.broadcast_id == broadcast_id,
+            BroadcastDelivery.user_telegram_id == User.user_telegram_id,
+        )
+        query = select(User.user_telegram_id).where(~delivered.exists())
+        if after_user_id is not None:
+            query = query.where(User.user_telegram_id > after_user_id)
+        async with self.async_session_scope() as session:
+            result = await session.scalars(
+                query.order_by(User.user_telegram_id).limit(limit)
+            )
+            return list(result)
+
+    async def save_broadcast_deliveries(
+        self, broadcast_id: int, deliveries: list[tuple[int, str]]
+    ) -> None:
+        """
+        Сохраняет результаты доставки рассылки пакетом и в той же транзакции
+        обновляет отметку `claimed_at`: рассылка выполняется этим процессом.
+        :param broadcast_id: ID рассылки
+        :param deliveries: Список пар (Telegram ID, статус)
+        """
+        if not deliveries:
             return
+        async with self.async_session_scope() as session:
+            await session.execute(
+                update(Broadcast)
+                .filter_by(id=broadcast_id)
+                .values(claimed_at=datetime.now())
+            )
+            session.add_all(
+                [
+                    BroadcastDelivery(
+                        broadcast_id=broadcast_id,
+                        user_telegram_id=user_id,
+                        status=status,
+                    )
+                    for user_id, status in deliveries
+                ]
+            )
 
-        repo_db_path = os.path.join(git_repo_dir, os.path.basename(db_path))
-        with open(db_path, "rb") as f:
-            new_content = f.read()
-        if os.path.exists(repo_db_path):
-            with open(repo_db_path, "rb") as f:
-                current_content = f.read()
-        else:
-            current_content = None
+    async def get_broadcast_stats(self, broadcast_id: int) -> dict[str, int]:
+        """
+        Возвращает число доставок рассылки по статусам.
+        """
+        async with self.async_session_scope() as session:
+            result = await session.execute(
+                select(BroadcastDelivery.status, func.count())
+                .filter_by(broadcast_id=broadcast_id)
+                .group_by(BroadcastDelivery.status)
+            )
+            return dict(result.all())
 
-        if new_content != current_content:
-            with open(repo_db_path, "wb") as f:
-                f.write(new_content)
-            logger.info(f"Файл базы данных обновлён в репозитории: {repo_db_path}")
-            try:
-                repo = Repo(git_repo_dir)
-                repo.git.add(os.path.basename(db_path))
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                commit_message = f"Backup at {timestamp}"
-                repo.index.commit(commit_message)
-                logger.info(f"Коммит сделан: {commit_message}")
-                if "origin" not in [remote.name for remote in repo.remotes]:
-                    repo.create_remote("origin", github_remote_url)
-                origin = repo.remote(name="origin")
-                origin.push()
-                logger.info("Изменения отправлены в удалённый репозиторий.")
-            except Exception as e:
-                logger.error(f"Ошибка при резервном копировании: {e}")
-                await send_error_report(f"Ошибка при резервном копировании: {e}")
-        else:
+    async def finish_broadcast(self, broadcast_id: int) -> None:
+        """
+        Отмечает рассылку завершенной.
+        """
+        async with self.async_session_scope() as session:
+            await session.execute(
+                update(Broadcast).filter_by(id=broadcast_id).values(status="finished")
+            )
+
+    def _make_backup_worker(self) -> BackupWorker:
+        loop = asyncio.get_running_loop()
+
+        def report(message: str) -> None:
+            # Вызывается из потока резервного копирования
+            asyncio.run_coroutine_threadsafe(send_error_report(message), loop)
+
+        return BackupWorker(
+            SQLiteBackup(self.db_path, git_repo_dir),
+            github_remote_url,
+            on_error=report,
+        )
+
+    def start_backup_worker(self) -> None:
+        """
+        Запускает фоновый поток ежедневного резервного копирования (`BACKUP_TIME`).
+        Резервное копирование в git выполняется только для SQLite.
+        """
+        if self.db_path is None:
             logger.info(
-                "База данных не изменилась, резервное копирование не требуется."
+                "Резервное копирование в git отключено: БД не SQLite "
+                "(для PostgreSQL используйте pg_dump)"
             )
+            return
+        if self.backup_worker is None:
+            self.backup_worker = self._make_backup_worker()
+            self.backup_worker.start()
+            logger.info(
+                f"Резервное копирование запланировано на "
+                f"{self.backup_worker.status['next_run'] or BACKUP_TIME}"
+            )
+
+    async def backup_bd(self) -> bool:
+        """
+        Выполняет резервное копирование вне расписания: снимок базы
+        (`database.backup.SQLiteBackup`), коммит и push в отдельном потоке,
+        не блокируя цикл событий.
+        :return: True, если копирование прошло успешно
+        """
+        if self.db_path is None:
+            logger.warning("Резервное копирование в git доступно только для SQLite")
+            return False
+        worker = self.backup_worker or self._make_backup_worker()
+        return await asyncio.to_thread(worker.run_once)
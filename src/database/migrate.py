@@ -0,0 +1,34 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy.engine import Connection
+
+# Каталог миграций Alembic
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def make_alembic_config(connection: Connection | None = None) -> Config:
+    """
+    Создает конфигурацию Alembic без alembic.ini.
+    :param connection: Открытое соединение, в котором выполняются миграции
+    :return: Конфигурация Alembic
+    """
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    config.attributes["connection"] = connection
+    return config
+
+
+def upgrade_schema(connection: Connection, revision: str = "head") -> None:
+    """
+    Применяет миграции к базе данных.
+
+    Вызывается при запуске бота (`DbProcessor.init_db_async`), поэтому
+    существующий vpn_users.db без таблицы alembic_version сначала
+    проходит базовую миграцию, которая не трогает уже созданные таблицы,
+    а затем получает индексы и целочисленные Telegram ID и счетчики трафика.
+    :param connection: Синхронное соединение (для AsyncEngine — через run_sync)
+    :param revision: Целевая ревизия
+    """
+    command.upgrade(make_alembic_config(connection), revision)
@@ -0,0 +1,44 @@
+import asyncio
+
+from alembic import context
+
+from database.engine import DATABASE_URL, create_engines
+from database.models import Base
+
+config = context.config
+target_metadata = Base.metadata
+# DATABASE_URL приложения важнее sqlalchemy.url из alembic.ini
+url = DATABASE_URL or config.get_main_option("sqlalchemy.url")
+
+
+def run_migrations(connection) -> None:
+    # render_as_batch: SQLite не умеет ALTER COLUMN, таблицы пересоздаются
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    # Тот же движок, что у приложения: aiosqlite или asyncpg
+    async_engine, engine = create_engines(url)
+    async with async_engine.begin() as connection:
+        await connection.run_sync(run_migrations)
+    await async_engine.dispose()
+    if engine is not None:
+        engine.dispose()
+
+
+if context.is_offline_mode():
+    # Базовая миграция и смена типов смотрят на текущую схему БД
+    raise RuntimeError(
+        "Миграции требуют подключения к БД, режим --sql не поддерживается"
+    )
+elif config.attributes.get("connection") is not None:
+    # Соединение передано из приложения (database.migrate.upgrade_schema)
+    run_migrations(config.attributes["connection"])
+else:
+    asyncio.run(run_async_migrations())
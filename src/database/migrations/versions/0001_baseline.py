@@ -0,0 +1,84 @@
+"""Базовая схема: таблицы users, keys, servers, broadcasts, broadcast_deliveries
+
+Схема, которую до появления миграций создавал Base.metadata.create_all.
+Таблицы создаются только если их еще нет, поэтому ревизию можно применить
+к существующему vpn_users.db без потери данных.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("user_telegram_id", sa.String(), primary_key=True),
+            sa.Column("subscription_status", sa.String()),
+            sa.Column("use_trial_period", sa.Boolean()),
+        )
+    if "servers" not in existing:
+        op.create_table(
+            "servers",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("ip", sa.String()),
+            sa.Column("password", sa.String()),
+            sa.Column("api_url", sa.String()),
+            sa.Column("cert_sha256", sa.String()),
+            sa.Column("cnt_users", sa.Integer()),
+            sa.Column("protocol_type", sa.String()),
+        )
+    if "keys" not in existing:
+        op.create_table(
+            "keys",
+            sa.Column("key_id", sa.String(), primary_key=True),
+            sa.Column(
+                "user_telegram_id",
+                sa.String(),
+                sa.ForeignKey("users.user_telegram_id"),
+            ),
+            sa.Column("start_date", sa.DateTime()),
+            sa.Column("expiration_date", sa.DateTime()),
+            sa.Column("name", sa.String()),
+            sa.Column("used_bytes_last_month", sa.Integer()),
+            sa.Column("protocol_type", sa.String()),
+            sa.Column("server_id", sa.Integer(), sa.ForeignKey("servers.id")),
+        )
+    if "broadcasts" not in existing:
+        op.create_table(
+            "broadcasts",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("text", sa.String()),
+            sa.Column("admin_chat_id", sa.String()),
+            sa.Column("progress_message_id", sa.Integer()),
+            sa.Column("status", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+        )
+    if "broadcast_deliveries" not in existing:
+        op.create_table(
+            "broadcast_deliveries",
+            sa.Column(
+                "broadcast_id",
+                sa.Integer(),
+                sa.ForeignKey("broadcasts.id"),
+                primary_key=True,
+            ),
+            sa.Column("user_telegram_id", sa.String(), primary_key=True),
+            sa.Column("status", sa.String()),
+        )
+
+
+def downgrade() -> None:
+    for table in ("broadcast_deliveries", "broadcasts", "keys", "servers", "users"):
+        op.drop_table(table)
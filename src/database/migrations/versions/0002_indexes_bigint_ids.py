@@ -0,0 +1,82 @@
+"""Индексы горячих запросов и целочисленные Telegram ID
+
+- keys.user_telegram_id, keys.server_id, keys.expiration_date — выборка ключей
+  пользователя, сканирование истекающих ключей в check_db, ключи сервера;
+- servers (protocol_type, cnt_users) — выбор наименее загруженного сервера;
+- users.user_telegram_id, keys.user_telegram_id,
+  broadcast_deliveries.user_telegram_id: String -> BigInteger.
+
+В SQLite таблицы пересоздаются (batch), значения переносятся через CAST.
+В PostgreSQL внешний ключ keys -> users снимается на время смены типа.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# (таблица, колонка) с Telegram ID
+TELEGRAM_ID_COLUMNS = (
+    ("users", "user_telegram_id"),
+    ("keys", "user_telegram_id"),
+    ("broadcast_deliveries", "user_telegram_id"),
+)
+# (имя индекса, таблица, колонки)
+INDEXES = (
+    ("ix_keys_user_telegram_id", "keys", ["user_telegram_id"]),
+    ("ix_keys_server_id", "keys", ["server_id"]),
+    ("ix_keys_expiration_date", "keys", ["expiration_date"]),
+    ("ix_servers_protocol_type_cnt_users", "servers", ["protocol_type", "cnt_users"]),
+)
+
+
+def user_foreign_keys() -> list[str]:
+    """
+    Имена внешних ключей keys -> users, мешающих сменить тип колонок.
+    В SQLite таблица пересоздается вместе с ними, снимать их не нужно.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        return []
+    return [
+        fk["name"]
+        for fk in sa.inspect(bind).get_foreign_keys("keys")
+        if fk["referred_table"] == "users"
+    ]
+
+
+def alter_telegram_ids(existing_type, type_, cast: str | None) -> None:
+    foreign_keys = user_foreign_keys()
+    for name in foreign_keys:
+        op.drop_constraint(name, "keys", type_="foreignkey")
+    for table, column in TELEGRAM_ID_COLUMNS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(
+                column,
+                existing_type=existing_type,
+                type_=type_,
+                postgresql_using=f"{column}::{cast}" if cast else None,
+            )
+    for name in foreign_keys:
+        op.create_foreign_key(
+            name, "keys", "users", ["user_telegram_id"], ["user_telegram_id"]
+        )
+
+
+def upgrade() -> None:
+    alter_telegram_ids(sa.String(), sa.BigInteger(), "bigint")
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table, if_exists=True)
+    alter_telegram_ids(sa.BigInteger(), sa.String(), "varchar")
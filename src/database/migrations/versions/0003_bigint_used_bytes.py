@@ -0,0 +1,37 @@
+"""Счетчик трафика ключа в BigInteger
+
+keys.used_bytes_last_month: Integer -> BigInteger. В колонку записываются
+счетчики байтов с панелей, а в int4 PostgreSQL не помещается больше 2 ГиБ.
+
+В SQLite таблица пересоздается (batch), в PostgreSQL тип меняется на месте.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("keys") as batch_op:
+        batch_op.alter_column(
+            "used_bytes_last_month",
+            existing_type=sa.Integer(),
+            type_=sa.BigInteger(),
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("keys") as batch_op:
+        batch_op.alter_column(
+            "used_bytes_last_month",
+            existing_type=sa.BigInteger(),
+            type_=sa.Integer(),
+        )
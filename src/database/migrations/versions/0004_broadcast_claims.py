@@ -0,0 +1,28 @@
+"""Захват рассылок процессом бота
+
+broadcasts.claimed_at — когда процесс, выполняющий рассылку, последний раз
+отметился. Прерванную рассылку продолжает тот процесс, который первым
+захватил ее запросом UPDATE ... RETURNING после того, как отметка устарела.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("broadcasts") as batch_op:
+        batch_op.add_column(sa.Column("claimed_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("broadcasts") as batch_op:
+        batch_op.drop_column("claimed_at")
@@ -1,10 +1,12 @@
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import declarative_base
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
     DateTime,
     ForeignKey,
+    Index,
     String,
     Integer,
 )
@@ -18,7 +20,7 @@ class User(Base):
     __tablename__ = "users"
 
     user_telegram_id = Column(
-        String, primary_key=True
+        BigInteger, primary_key=True, autoincrement=False
     )  # Уникальный Telegram ID пользователя
     subscription_status = Column(String)  # Статус подписки ('active' / 'inactive')
     use_trial_period = Column(Boolean)  # Использовал ли пользователь пробный период
@@ -34,23 +36,23 @@ class VpnKey(Base):
 
     key_id = Column(String, primary_key=True)  # Уникальный идентификатор ключа
     user_telegram_id = Column(
-        String, ForeignKey("users.user_telegram_id")
+        BigInteger, ForeignKey("users.user_telegram_id"), index=True
     )  # telegram_id пользователя
 
     # Связь с таблицей User (обратная связь)
     user = relationship("User", back_populates="keys")
 
     start_date = Column(DateTime)  # Дата начала подписки
-    expiration_date = Column(DateTime)  # Дата окончания подписки
+    expiration_date = Column(DateTime, index=True)  # Дата окончания подписки
 
     name = Column(String, default=None)  # имя ключа
     used_bytes_last_month = Column(
-        Integer, default=0
+        BigInteger, default=0
     )  # использовано байтов к концу прошлого месяца
     protocol_type = Column(String, default="Outline")  # Тип протокола (Outline/VLESS)
 
     server_id = Column(
-        Integer, ForeignKey("servers.id")
+        Integer, ForeignKey("servers.id"), index=True
     )  # ID сервера, на котором находится ключ
 
     # Связь с таблицей Server (каждый ключ привязан к серверу)
@@ -62,6 +64,10 @@ class Server(Base):
     """Модель таблицы servers, содержащая информацию о серверах VPN."""
 
     __tablename__ = "servers"
+    # Выбор наименее загруженного сервера нужного протокола
+    __table_args__ = (
+        Index("ix_servers_protocol_type_cnt_users", "protocol_type", "cnt_users"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)  # Уникальный ID сервера
     ip = Column(
@@ -81,3 +87,33 @@ class Server(Base):
 
     # Связь один ко многим с таблицей Key (на сервере может быть несколько ключей)
     keys = relationship("VpnKey", back_populates="server")
+
+
+class Broadcast(Base):
+    """Модель таблицы broadcasts, содержащая рассылки администратора."""
+
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)  # ID рассылки
+    text = Column(String)  # Текст рассылки
+    admin_chat_id = Column(String)  # Чат администратора для отчета о прогрессе
+    progress_message_id = Column(Integer, default=None)  # Сообщение с прогрессом
+    status = Column(String, default="running")  # Статус ('running' / 'finished')
+    created_at = Column(DateTime)  # Дата запуска рассылки
+    claimed_at = Column(
+        DateTime, default=None
+    )  # Когда выполняющий рассылку процесс последний раз отметился
+
+
+class BroadcastDelivery(Base):
+    """Модель таблицы broadcast_deliveries: результат доставки рассылки пользователю."""
+
+    __tablename__ = "broadcast_deliveries"
+
+    broadcast_id = Column(
+        Integer, ForeignKey("broadcasts.id"), primary_key=True
+    )  # ID рассылки
+    user_telegram_id = Column(
+        BigInteger, primary_key=True, autoincrement=False
+    )  # Telegram ID пользователя
+    status = Column(String)  # Результат ('sent' / 'blocked' / 'failed')
@@ -0,0 +1,209 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Режим логирования SQL-запросов:
+#   off    — без инструментации;
+#   slow   — статистика задержек + лог медленных запросов (по умолчанию);
+#   sample — как slow, плюс лог случайной доли всех запросов;
+#   echo   — как sample, плюс штатный echo SQLAlchemy (только для отладки).
+QUERY_LOG_MODES = ("off", "slow", "sample", "echo")
+DB_QUERY_LOG_MODE = os.getenv("DB_QUERY_LOG_MODE", "slow").lower()
+# Порог, начиная с которого запрос считается медленным (в миллисекундах)
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+# Доля запросов, попадающих в лог в режимах sample и echo
+DB_QUERY_SAMPLE_RATE = float(os.getenv("DB_QUERY_SAMPLE_RATE", 0.01))
+
+# Верхние границы корзин гистограммы задержек (в миллисекундах)
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+# Сколько самых затратных запросов показывать в отчете
+QUERY_STATS_TOP = int(os.getenv("QUERY_STATS_TOP", 10))
+# Максимальная длина текста запроса в отчете
+QUERY_STATS_STATEMENT_LEN = 300
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Нумерованные параметры asyncpg ($1, $2, ...)
+_NUMBERED_PARAM_RE = re.compile(r"\$\d+")
+_IN_PARAMS_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+def get_query_log_mode() -> str:
+    """
+    Возвращает режим логирования запросов из окружения.
+    Неизвестное значение считается режимом `slow`.
+    """
+    if DB_QUERY_LOG_MODE not in QUERY_LOG_MODES:
+        logger.warning(
+            f"Неизвестный DB_QUERY_LOG_MODE={DB_QUERY_LOG_MODE}, используется slow"
+        )
+        return "slow"
+    return DB_QUERY_LOG_MODE
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Приводит SQL к ключу для статистики: схлопывает пробелы, заменяет
+    нумерованные параметры (`$1`, asyncpg) на `?` и раскрытые списки
+    параметров `IN (?, ?, ...)` на `IN (?)`.
+    """
+    statement = _WHITESPACE_RE.sub(" ", statement).strip()
+    statement = _NUMBERED_PARAM_RE.sub("?", statement)
+    return _IN_PARAMS_RE.sub("(?)", statement)
+
+
+class QueryStats:
+    """
+    Гистограммы задержек SQL-запросов, сгруппированные по тексту запроса.
+    Потокобезопасна: синхронный и асинхронный движки пишут в один объект.
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_MS):
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+
+    def observe(self, statement: str, duration_ms: float) -> None:
+        """
+        Учитывает выполнение запроса.
+
+        :param statement: Нормализованный текст запроса.
+        :param duration_ms: Время выполнения в миллисекундах.
+        """
+        bucket = bisect_left(self._buckets, duration_ms)
+        with self._lock:
+            stat = self._stats.get(statement)
+            if stat is None:
+                stat = self._stats[statement] = {
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "histogram": [0] * (len(self._buckets) + 1),
+                }
+            stat["count"] += 1
+            stat["total_ms"] += duration_ms
+            stat["max_ms"] = max(stat["max_ms"], duration_ms)
+            stat["histogram"][bucket] += 1
+
+    def snapshot(self) -> dict[str, dict]:
+        """
+        Возвращает копию статистики.
+        Гистограмма — словарь {"<=N ms": count, ..., "+inf": count}.
+        """
+        labels = [f"<={bound}ms" for bound in self._buckets] + ["+inf"]
+        with self._lock:
+            return {
+                statement: {
+                    "count": stat["count"],
+                    "avg_ms": stat["total_ms"] / stat["count"],
+                    "max_ms": stat["max_ms"],
+                    "histogram": dict(zip(labels, stat["histogram"])),
+                }
+                for statement, stat in self._stats.items()
+            }
+
+    def reset(self) -> None:
+        """Очищает накопленную статистику."""
+        with self._lock:
+            self._stats.clear()
+
+
+query_stats = QueryStats()
+
+
+def format_query_stats(
+    stats: QueryStats = query_stats, top: int = QUERY_STATS_TOP
+) -> str:
+    """
+    Формирует текстовый отчет о самых затратных запросах (по суммарному времени).
+
+    :param stats: Статистика запросов.
+    :param top: Сколько запросов включить в отчет.
+    :return: Текст отчета
+    """
+    snapshot = stats.snapshot()
+    if not snapshot:
+        return "Статистика запросов к БД пуста"
+    ranked = sorted(
+        snapshot.items(),
+        key=lambda item: item[1]["count"] * item[1]["avg_ms"],
+        reverse=True,
+    )
+    lines = [f"Запросов к БД: {sum(stat['count'] for stat in snapshot.values())}"]
+    for statement, stat in ranked[:top]:
+        if len(statement) > QUERY_STATS_STATEMENT_LEN:
+            statement = statement[:QUERY_STATS_STATEMENT_LEN] + "..."
+        lines.append(
+            f"\n{stat['count']} раз, всего {stat['count'] * stat['avg_ms']:.0f} мс, "
+            f"в среднем {stat['avg_ms']:.1f} мс, максимум {stat['max_ms']:.1f} мс\n"
+            f"{statement}"
+        )
+    return "\n".join(lines)
+
+
+def instrument_engine(
+    engine,
+    mode: str = None,
+    slow_query_ms: float = DB_SLOW_QUERY_MS,
+    sample_rate: float = DB_QUERY_SAMPLE_RATE,
+    stats: QueryStats = query_stats,
+) -> None:
+    """
+    Подключает инструментацию к движку SQLAlchemy через события
+    `before_cursor_execute`/`after_cursor_execute`; при ошибке запроса
+    `handle_error` снимает его время начала со стека соединения.
+
+    :param engine: Синхронный движок (для AsyncEngine передается `async_engine.sync_engine`).
+    :param mode: Режим из QUERY_LOG_MODES; по умолчанию берется из окружения.
+    :param slow_query_ms: Порог медленного запроса в миллисекундах.
+    :param sample_rate: Доля запросов, попадающих в лог в режимах sample и echo.
+    :param stats: Куда записывать гистограммы задержек.
+    """
+    mode = mode or get_query_log_mode()
+    if mode == "off":
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("query_start_time", []).append(
+            (context, time.perf_counter())
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _, started = conn.info["query_start_time"].pop()
+        duration_ms = (time.perf_counter() - started) * 1000
+        normalized = normalize_statement(statement)
+        stats.observe(normalized, duration_ms)
+
+        if duration_ms >= slow_query_ms:
+            logger.warning(
+                f"slow_query duration_ms={duration_ms:.1f} "
+                f"rows={cursor.rowcount} executemany={executemany} "
+                f"statement={normalized!r}"
+            )
+        elif mode in ("sample", "echo") and random.random() < sample_rate:
+            logger.info(
+                f"sampled_query duration_ms={duration_ms:.1f} "
+                f"rows={cursor.rowcount} statement={normalized!r}"
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # after_cursor_execute для упавшего запроса не вызывается
+        connection = exception_context.connection
+        if connection is None:
+            return
+        start_times = connection.info.get("query_start_time")
+        if start_times and start_times[-1][0] is exception_context.execution_context:
+            start_times.pop()
@@ -0,0 +1,118 @@
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ServerLoadIndex:
+    """
+    Индекс загрузки серверов в памяти процесса.
+
+    Для каждого протокола хранится куча `(cnt_users, server_id)`, поэтому
+    наименее загруженный сервер выбирается за O(log n) без запроса к БД.
+    Изменение загрузки добавляет в кучу новую запись, а устаревшие записи
+    отбрасываются при чтении (ленивое удаление).
+    Индекс должен обновляться вместе с записью `cnt_users` в БД.
+    Индекс свой у каждого процесса: изменения, сделанные другими процессами,
+    видны только после перечитывания из БД (`DbProcessor.load_server_index`).
+    """
+
+    def __init__(self):
+        self._heaps: dict[str, list[tuple[int, int]]] = {}
+        # server_id -> (протокол, текущее число пользователей)
+        self._loads: dict[int, tuple[str, int]] = {}
+        self.loaded = False
+
+    def load(self, servers) -> None:
+        """
+        Полностью перестраивает индекс.
+
+        :param servers: Итерируемое из `(server_id, protocol_type, cnt_users)`.
+        """
+        self._heaps.clear()
+        self._loads.clear()
+        for server_id, protocol_type, cnt_users in servers:
+            self.set(server_id, protocol_type, cnt_users)
+        self.loaded = True
+        logger.info(f"Индекс серверов загружен: {len(self._loads)} серверов")
+
+    def set(self, server_id: int, protocol_type: str, cnt_users: int) -> None:
+        """
+        Добавляет сервер или задает его загрузку.
+
+        :param server_id: ID сервера.
+        :param protocol_type: Протокол сервера.
+        :param cnt_users: Число пользователей на сервере.
+        """
+        protocol_type = protocol_type.lower()
+        cnt_users = cnt_users or 0
+        self._loads[server_id] = (protocol_type, cnt_users)
+        heap = self._heaps.setdefault(protocol_type, [])
+        heapq.heappush(heap, (cnt_users, server_id))
+        if len(heap) > 2 * len(self._loads) + 16:
+            self._compact(protocol_type)
+
+    def adjust(self, server_id: int, delta: int) -> int | None:
+        """
+        Изменяет загрузку сервера на `delta` (не опуская ниже нуля).
+
+        :return: Новое число пользователей или `None`, если сервера нет в индексе.
+        """
+        if server_id not in self._loads:
+            return None
+        protocol_type, cnt_users = self._loads[server_id]
+        cnt_users = max(0, cnt_users + delta)
+        self.set(server_id, protocol_type, cnt_users)
+        return cnt_users
+
+    def remove(self, server_id: int) -> None:
+        """Удаляет сервер из индекса."""
+        self._loads.pop(server_id, None)
+
+    def get_load(self, server_id: int) -> int | None:
+        """Возвращает число пользователей на сервере или `None`."""
+        entry = self._loads.get(server_id)
+        return entry[1] if entry else None
+
+    def least_loaded(self, protocol_type: str, max_users: int = None) -> int | None:
+        """
+        Возвращает ID наименее загруженного сервера протокола.
+
+        :param protocol_type: Протокол.
+        :param max_users: Если задан, серверы с `cnt_users >= max_users` не подходят.
+        :return: ID сервера или `None`, если подходящего сервера нет.
+        """
+        protocol_type = protocol_type.lower()
+        heap = self._heaps.get(protocol_type, [])
+        while heap:
+            cnt_users, server_id = heap[0]
+            if self._loads.get(server_id) != (protocol_type, cnt_users):
+                heapq.heappop(heap)  # устаревшая запись
+                continue
+            if max_users is not None and cnt_users >= max_users:
+                return None
+            return server_id
+        return None
+
+    def all_full(self, protocol_type: str, threshold: int) -> bool:
+        """
+        Проверяет, что у всех серверов протокола не меньше `threshold` пользователей.
+        Если серверов протокола нет, возвращает True.
+        """
+        return self.least_loaded(protocol_type, max_users=threshold) is None
+
+    def _compact(self, protocol_type: str) -> None:
+        """Пересобирает кучу протокола без устаревших записей."""
+        heap = [
+            (cnt_users, server_id)
+            for server_id, (server_protocol, cnt_users) in self._loads.items()
+            if server_protocol == protocol_type
+        ]
+        heapq.heapify(heap)
+        self._heaps[protocol_type] = heap
+
+    def __len__(self) -> int:
+        return len(self._loads)
+
+    def __contains__(self, server_id: int) -> bool:
+        return server_id in self._loads
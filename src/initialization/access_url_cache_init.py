@@ -0,0 +1,56 @@
+import logging
+import os
+from dotenv import load_dotenv
+
+from utils.cache_backends import SQLiteCacheBackend
+from utils.ttl_cache import TTLCache
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Сколько секунд хранить ссылку подключения для /open/{key_id}
+ACCESS_URL_CACHE_TTL = int(os.getenv("ACCESS_URL_CACHE_TTL", 60 * 60))
+# Максимальное число ключей в кэше ссылок
+ACCESS_URL_CACHE_SIZE = int(os.getenv("ACCESS_URL_CACHE_SIZE", 10000))
+# Режим запуска (см. main.py): в режимах single и webhook бот и сервер
+# перенаправлений работают в одном процессе, в режиме bot сервер запускается отдельно
+RUN_MODE = os.getenv("RUN_MODE", "bot").lower()
+# Режимы, в которых кэшу в памяти процесса достаточно
+SINGLE_PROCESS_RUN_MODES = ("single", "webhook")
+# Где хранить кэш: memory — в памяти процесса (по умолчанию),
+# sqlite — в общем файле; нужен, если сервер перенаправлений запущен
+# отдельным процессом, иначе сбросы кэша в боте до него не доходят
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+# Каталог для файлов данных, которые не должны лежать среди исходников
+DATA_DIR = os.getenv(
+    "DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data"),
+)
+# Файл общего кэша для CACHE_BACKEND=sqlite
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", os.path.join(DATA_DIR, "cache.db"))
+# Сколько миллисекунд ждать, пока файл кэша занят другим процессом
+CACHE_SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("CACHE_SQLITE_BUSY_TIMEOUT_MS", 200))
+
+if CACHE_BACKEND == "memory" and RUN_MODE not in SINGLE_PROCESS_RUN_MODES:
+    # Сброс записи в боте не дойдет до отдельного процесса сервера перенаправлений,
+    # и тот будет отдавать ссылки переименованных и удаленных ключей до истечения TTL
+    logger.warning(
+        f"RUN_MODE={RUN_MODE}: если сервер перенаправлений запущен отдельным "
+        f"процессом, задайте CACHE_BACKEND=sqlite и общий CACHE_SQLITE_PATH"
+    )
+
+if CACHE_BACKEND == "sqlite":
+    # Файл открывается при первом обращении к кэшу
+    backend = SQLiteCacheBackend(
+        CACHE_SQLITE_PATH,
+        namespace="access_url",
+        busy_timeout_ms=CACHE_SQLITE_BUSY_TIMEOUT_MS,
+    )
+else:
+    backend = None
+
+# Кэш ссылок подключения: key_id -> (протокол, ссылка).
+# Сбрасывается при переименовании, продлении и удалении ключа.
+access_url_cache = TTLCache(
+    ttl=ACCESS_URL_CACHE_TTL, maxsize=ACCESS_URL_CACHE_SIZE, backend=backend
+)
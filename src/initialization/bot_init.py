@@ -5,11 +5,23 @@ from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 
+from bot.fsm.isolation import UserEventIsolation
+from bot.fsm.sqlite_storage import SQLiteStorage
+
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 BOT_TOKEN = os.getenv("TOKEN")
+# Хранилище состояний FSM: sqlite — на диске (переживает перезапуск), memory — в памяти
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite").lower()
+# Файл базы состояний FSM
+FSM_STORAGE_PATH = os.getenv(
+    "FSM_STORAGE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "database", "fsm.db"),
+)
+# Через сколько секунд неактивный диалог удаляется (по умолчанию 7 дней)
+FSM_TTL = int(os.getenv("FSM_TTL", 7 * 24 * 60 * 60))
 
 if not BOT_TOKEN:
     logger.critical("BOT_TOKEN не задан. Проверьте .env файл.")
@@ -17,10 +29,15 @@ if not BOT_TOKEN:
 
 logger.info("Инициализация бота...")
 bot = Bot(token=BOT_TOKEN)
-logger.info("Инициализация хранилища состояний (MemoryStorage)...")
-storage = MemoryStorage()
+if FSM_STORAGE == "memory":
+    logger.info("Инициализация хранилища состояний (MemoryStorage)...")
+    storage = MemoryStorage()
+else:
+    logger.info(f"Инициализация хранилища состояний (SQLite: {FSM_STORAGE_PATH})...")
+    storage = SQLiteStorage(FSM_STORAGE_PATH, ttl=FSM_TTL)
 
 logger.info("Инициализация диспетчера...")
-dp = Dispatcher(storage=storage)
+# Обновления одного пользователя обрабатываются по очереди (см. UserEventIsolation)
+dp = Dispatcher(storage=storage, events_isolation=UserEventIsolation())
 
 logger.info("Бот инициализирован.")
@@ -1,6 +1,8 @@
 import os
 from dotenv import load_dotenv
 
+from sqlalchemy import func, select
+
 from database.db_processor import DbProcessor
 from database.models import Server
 
@@ -10,10 +12,10 @@ load_dotenv()
 db_processor = DbProcessor()
 
 
-def main_init_db():
-    db_processor.init_db()
-    with db_processor.session_scope() as session:
-        if session.query(Server).count() == 0:
+async def main_init_db():
+    await db_processor.init_db_async()
+    async with db_processor.async_session_scope() as session:
+        if await session.scalar(select(func.count()).select_from(Server)) == 0:
             servers = [
                 Server(
                     api_url=os.getenv("OUTLINE_API_URL"),
@@ -29,3 +31,6 @@ def main_init_db():
                 ),
             ]
             session.add_all(servers)
+
+    # индекс загрузки серверов строится после того, как таблица заполнена
+    await db_processor.load_server_index()
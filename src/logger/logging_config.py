@@ -1,21 +1,136 @@
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 LOG_FILE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "bot.log"))
+# Максимальное число записей, ожидающих записи в фоне
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Формат вывода: text — обычные строки, json — JSON lines
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+_listener: QueueListener | None = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Форматирует запись как одну строку JSON.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "location": f"{record.filename}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc_info"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler с ограниченной очередью: если очередь заполнена, запись
+    отбрасывается, а не блокирует вызывающий поток (цикл событий бота).
+    Число отброшенных записей сообщается в лог, как только очередь освобождается.
+
+    В вызывающем потоке сообщение только собирается из `msg % args`
+    (и трейсбек — в текст), чтобы фоновый поток не увидел аргументы,
+    измененные после вызова логгера. Остальное форматирование (время,
+    шаблон, JSON) выполняется в фоновом потоке обработчиками QueueListener.
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self._unreported_drops = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        with self._lock:
+            try:
+                if self._unreported_drops:
+                    self.queue.put_nowait(self._make_drop_report())
+                    self._unreported_drops = 0
+                self.queue.put_nowait(record)
+                self.enqueued += 1
+            except queue.Full:
+                self.dropped += 1
+                self._unreported_drops += 1
+
+    def _make_drop_report(self) -> logging.LogRecord:
+        return logging.LogRecord(
+            name=__name__,
+            level=logging.WARNING,
+            pathname=__file__,
+            lineno=0,
+            msg=f"Очередь логов переполнена, отброшено записей: {self._unreported_drops}",
+            args=None,
+            exc_info=None,
+        )
+
+
+def get_log_stats() -> dict:
+    """
+    Возвращает счетчики очереди логов.
+    :return: Словарь с размером очереди, числом принятых и отброшенных записей
+    """
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, DroppingQueueHandler):
+            return {
+                "queue_size": handler.queue.qsize(),
+                "queue_capacity": handler.queue.maxsize,
+                "enqueued": handler.enqueued,
+                "dropped": handler.dropped,
+            }
+    return {}
 
 
 def configure_logging():
+    """
+    Настраивает логирование через очередь.
+
+    Логгеры только кладут записи в ограниченную очередь (`DroppingQueueHandler`),
+    а форматирование, запись в файл с ротацией и вывод в консоль выполняет
+    фоновый поток `QueueListener`. Поэтому дисковый IO не блокирует цикл событий.
+    """
+    global _listener
+
     # Устанавливаем общий уровень логирования
     logging.basicConfig(level=logging.INFO)
 
     # Формат
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s"
-    )
+    if LOG_FORMAT == "json":
+        formatter = JsonLinesFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s"
+        )
 
-    # Обработчик ротации (max 5 МБ, храним 3 файла)
+    # Обработчик ротации (max 10 МБ, храним 3 файла)
     file_handler = RotatingFileHandler(
         LOG_FILE_PATH, maxBytes=10 * 1024 * 1024, backupCount=3
     )
@@ -25,11 +140,34 @@ def configure_logging():
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
 
-    # Очищаем обработчики у root-логгера и добавляем наши
+    # Останавливаем прежний фоновый поток при повторной настройке
+    if _listener is not None:
+        _listener.stop()
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _listener = QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _listener.start()
+
+    # Очищаем обработчики у root-логгера и добавляем наш
     root_logger = logging.getLogger()
     root_logger.handlers = []
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    root_logger.addHandler(DroppingQueueHandler(log_queue))
 
     # Если нужен уровень именно на root
     root_logger.setLevel(logging.INFO)
+
+
+def stop_logging():
+    """
+    Дописывает записи из очереди и останавливает фоновый поток логирования.
+    """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -1,13 +1,28 @@
 import asyncio
 import aiocron
 import logging
+import os
 import uvicorn
+from contextlib import contextmanager
 
-from fastapi import FastAPI
 from servers.redirect_server import redirect_server
+from servers.webhook import (
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    update_limiter,
+    webhook_router,
+)
 from initialization.bot_init import dp, bot
-from initialization.vdsina_processor_init import vdsina_processor_init
+from initialization.vdsina_processor_init import (
+    vdsina_processor,
+    vdsina_processor_init,
+)
 from initialization.db_processor_init import db_processor, main_init_db
+from initialization.outline_processor_init import async_outline_processor
+from initialization.vless_processor_init import vless_processor
+from bot.middlewares.concurrency import ConcurrencyMiddleware
+from bot.utils.broadcast import resume_unfinished_broadcasts, stop_broadcasts
 from bot.routers import (
     admin_router,
     buy_key_router,
@@ -26,6 +41,14 @@ configure_logging()
 
 logger = logging.getLogger(__name__)
 
+# Режим запуска: bot — только бот (сервер перенаправлений запускается отдельно),
+# single — бот и сервер перенаправлений в одном процессе и одном цикле событий,
+# webhook — как single, но обновления приходят на вебхук вместо polling
+RUN_MODE = os.getenv("RUN_MODE", "bot").lower()
+# Адрес и порт сервера перенаправлений в режимах single и webhook
+REDIRECT_SERVER_HOST = os.getenv("REDIRECT_SERVER_HOST", "0.0.0.0")
+REDIRECT_SERVER_PORT = int(os.getenv("REDIRECT_SERVER_PORT", 8000))
+
 logger.info("Регистрация обработчиков...")
 dp.include_router(main_menu_router.router)
 dp.include_router(payment_router.router)
@@ -37,19 +60,109 @@ dp.include_router(utils_router.router)
 dp.include_router(choice_vpn_type_router.router)
 dp.include_router(admin_router.router)
 
+# Ограничиваем параллельную обработку; регистрируется после FSM-middleware
+# диспетчера, поэтому слот занимается уже внутри блокировки пользователя
+concurrency_middleware = ConcurrencyMiddleware()
+dp.update.outer_middleware(concurrency_middleware)
+
+
+def make_server_config() -> uvicorn.Config:
+    return uvicorn.Config(
+        redirect_server,
+        host=REDIRECT_SERVER_HOST,
+        port=REDIRECT_SERVER_PORT,
+        log_config=None,  # используем уже настроенное логирование
+    )
+
+
+class EmbeddedServer(uvicorn.Server):
+    """
+    uvicorn.Server без собственных обработчиков сигналов.
+    Сигналы SIGINT/SIGTERM обрабатывает aiogram, а сервер останавливается
+    вместе с polling в `run_single_process`.
+    """
+
+    @contextmanager
+    def capture_signals(self):
+        yield
+
+
+async def start_polling() -> None:
+    """
+    Удаляет вебхук, оставшийся от запуска в режиме RUN_MODE=webhook,
+    и запускает polling: пока вебхук установлен, getUpdates завершается
+    конфликтом. Накопленные обновления не сбрасываются.
+    """
+    await bot.delete_webhook()
+    await dp.start_polling(bot)
 
-# async def run_fastapi_server():
-#     # Настраиваем uvicorn для работы в том же цикле событий
-#     config = uvicorn.Config(
-#         redirect_server,  # наш объект FastAPI()
-#         host="192.168.160.1",
-#         port=8000,
-#         loop="asyncio",  # важно указать, что работаем на asyncio
-#         log_level="info",
-#     )
-#     server = uvicorn.Server(config)
-#     # Запускаем сервер (он будет «заблокирован» внутри своей задачи)
-#     await server.serve()
+
+async def run_single_process() -> None:
+    """
+    Запускает polling бота и сервер перенаправлений в одном цикле событий.
+
+    Оба используют одни и те же синглтоны: DbProcessor, пулы сессий VPN-серверов
+    и кэши. Когда останавливается один из них (сигнал, ошибка), корректно
+    останавливается и второй.
+    """
+    server = EmbeddedServer(make_server_config())
+    server_task = asyncio.create_task(server.serve())
+    polling_task = asyncio.create_task(start_polling())
+
+    await asyncio.wait({server_task, polling_task}, return_when=asyncio.FIRST_COMPLETED)
+    if not polling_task.done():
+        logger.error("Сервер перенаправлений остановился, останавливаем polling...")
+        try:
+            await dp.stop_polling()
+        except RuntimeError:
+            polling_task.cancel()
+    server.should_exit = True
+
+    for task in (server_task, polling_task):
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка при остановке: {e}")
+
+
+async def run_webhook() -> None:
+    """
+    Принимает обновления через вебхук на сервере перенаправлений.
+
+    Алгоритм работы:
+    1. Подключает обработчик вебхука к FastAPI-приложению и запускает
+       прием обновлений (каждое обновление — отдельная задача, их число
+       ограничивает `update_limiter`).
+    2. Регистрирует вебхук в Telegram с секретом.
+    3. Запускает uvicorn; он же обрабатывает сигналы остановки.
+    4. После остановки сервера дожидается обработки принятых обновлений.
+       Вебхук не удаляется: новые обновления дождутся следующего запуска
+       на стороне Telegram (режимы с polling удаляют его при старте).
+    """
+    if not WEBHOOK_BASE_URL or not WEBHOOK_SECRET:
+        raise ValueError(
+            "Для RUN_MODE=webhook нужно задать WEBHOOK_BASE_URL и WEBHOOK_SECRET"
+        )
+
+    redirect_server.include_router(webhook_router)
+    workflow_data = {"bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, dispatcher=dp, **workflow_data)
+    update_limiter.start(dp, bot, **workflow_data)
+    try:
+        await bot.set_webhook(
+            url=f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        await uvicorn.Server(make_server_config()).serve()
+    finally:
+        await update_limiter.stop()
+        try:
+            await dp.emit_shutdown(bot=bot, dispatcher=dp, **workflow_data)
+        finally:
+            await bot.session.close()
 
 
 @aiocron.crontab("0 10,21 * * *")
@@ -67,16 +180,45 @@ async def scheduled_check_servers():
     await db_processor.check_count_keys_on_servers()
 
 
-@aiocron.crontab("0 0 * * *")
-async def scheduled_back_up_db():
-    await db_processor.backup_bd()
+@aiocron.crontab("*/30 * * * *")
+async def scheduled_reconcile_server_user_counts():
+    await db_processor.reconcile_server_user_counts()
+
+
+@aiocron.crontab("*/5 * * * *")
+async def scheduled_resume_broadcasts():
+    # Рассылки процессов, упавших без штатной остановки
+    await resume_unfinished_broadcasts()
 
 
 async def main() -> None:
     await vdsina_processor_init()  # инициализируем VDSina API
-    main_init_db()  # инициализируем БД 1ый раз при запуске
-    logger.info("Запуск polling...")
-    await dp.start_polling(bot)
+    await main_init_db()  # инициализируем БД 1ый раз при запуске
+    db_processor.start_backup_worker()  # резервное копирование в отдельном потоке
+    await resume_unfinished_broadcasts()  # продолжаем прерванные рассылки
+    try:
+        if RUN_MODE == "single":
+            logger.info(
+                f"Запуск polling и сервера перенаправлений на "
+                f"{REDIRECT_SERVER_HOST}:{REDIRECT_SERVER_PORT}..."
+            )
+            await run_single_process()
+        elif RUN_MODE == "webhook":
+            logger.info(
+                f"Запуск вебхука и сервера перенаправлений на "
+                f"{REDIRECT_SERVER_HOST}:{REDIRECT_SERVER_PORT}..."
+            )
+            await run_webhook()
+        else:
+            logger.info("Запуск polling...")
+            await start_polling()
+    finally:
+        await stop_broadcasts()  # сохраняем прогресс рассылок
+        # закрываем HTTP-сессии всех VPN-серверов
+        await async_outline_processor.close()
+        await vless_processor.close()
+        await vdsina_processor.close()
+        await db_processor.close()
 
 
 if __name__ == "__main__":
@@ -1,9 +1,18 @@
-from fastapi import FastAPI, HTTPException
+from dataclasses import dataclass
+from functools import lru_cache
+from html import escape
+from string import Template
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.responses import HTMLResponse
 from urllib.parse import quote
+import gzip
+import hashlib
+import json
+import os
 import uvicorn
 import socket
 from utils.get_processor import get_processor
+from initialization.access_url_cache_init import access_url_cache
 from initialization.db_processor_init import db_processor
 
 
@@ -21,52 +30,141 @@ redirect_server = FastAPI()
 #         return "127.0.0.1"  # fallback на localhost
 
 
-def generate_redirect_html(protocol: str, url: str) -> HTMLResponse:
-    templates = {
-        "outline": f"""
+# Сколько секунд браузер может показывать страницу без повторного запроса
+REDIRECT_CACHE_MAX_AGE = int(os.getenv("REDIRECT_CACHE_MAX_AGE", 60))
+# Сжимать ли страницы gzip (если клиент это поддерживает)
+REDIRECT_GZIP = os.getenv("REDIRECT_GZIP", "true").lower() == "true"
+# Страницы меньше этого размера (в байтах) не сжимаются
+REDIRECT_GZIP_MIN_SIZE = 512
+
+# Шаблоны собираются один раз при импорте. В них подставляются:
+# $attr_url — ссылка, экранированная для HTML-атрибутов и текста,
+# $js_url — ссылка в виде строкового литерала JavaScript.
+REDIRECT_TEMPLATES = {
+    "outline": Template(
+        """
         <html>
             <head>
                 <title>Launch Outline</title>
-                <meta http-equiv="refresh" content="0; url='{url}'">
+                <meta http-equiv="refresh" content="0; url='$attr_url'">
             </head>
             <body>
                 <script>
-                    window.location.href = '{url}';
+                    window.location.href = $js_url;
                     setTimeout(() => window.close(), 30000);
                 </script>
-                <p>Если Outline не открылся, <a href="{url}">нажмите здесь</a></p>
+                <p>Если Outline не открылся, <a href="$attr_url">нажмите здесь</a></p>
             </body>
         </html>
-        """,
-        "vless": f"""
+        """
+    ),
+    "vless": Template(
+        """
         <html>
             <head>
                 <title>Launch Hiddify</title>
-                <meta http-equiv="refresh" content="0; url='{url}'">
+                <meta http-equiv="refresh" content="0; url='$attr_url'">
             </head>
             <body>
                 <h2>Hiddify Connection</h2>
                 <div style="margin: 20px; padding: 15px; border: 1px solid #ddd;">
                     <p>Ссылка для подключения:</p>
-                    <input type="text" value="{url}" 
+                    <input type="text" value="$attr_url" 
                            style="width: 100%; padding: 8px; margin: 10px 0;" 
                            id="hiddifyUrl" readonly>
-                    <button onclick="navigator.clipboard.writeText('{url}')">
+                    <button onclick="navigator.clipboard.writeText(document.getElementById('hiddifyUrl').value)">
                         Скопировать
                     </button>
                 </div>
                 <script>
                     // Попытка открыть десктопное приложение
-                    window.location.href = '{url}';
+                    window.location.href = $js_url;
 
                     // Автоматическое закрытие через 30 сек
                     setTimeout(() => window.close(), 30000);
                 </script>
             </body>
         </html>
-        """,
+        """
+    ),
+}
+
+
+@dataclass(frozen=True)
+class RenderedPage:
+    body: bytes
+    etag: str
+    gzipped: bytes | None
+
+
+@lru_cache(maxsize=4096)
+def render_redirect_page(protocol: str, url: str) -> RenderedPage:
+    """
+    Подставляет ссылку в шаблон и готовит все, что нужно для ответа:
+    тело страницы, ETag и сжатую версию. Результат кэшируется,
+    поэтому повторные открытия одного ключа не рендерят страницу заново.
+    :param protocol: Протокол ключа ("outline" или "vless")
+    :param url: Ссылка для открытия в приложении
+    :return: Готовая страница
+    """
+    # "</" в литерале не даст закрыть тег <script> изнутри строки
+    js_url = json.dumps(url).replace("</", "<\\/")
+    body = (
+        REDIRECT_TEMPLATES[protocol]
+        .substitute(attr_url=escape(url, quote=True), js_url=js_url)
+        .encode("utf-8")
+    )
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    gzipped = None
+    if REDIRECT_GZIP and len(body) >= REDIRECT_GZIP_MIN_SIZE:
+        gzipped = gzip.compress(body, mtime=0)
+    return RenderedPage(body=body, etag=etag, gzipped=gzipped)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Проверяет, есть ли `etag` в заголовке If-None-Match.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+def generate_redirect_html(
+    protocol: str, url: str, request: Request | None = None
+) -> Response:
+    """
+    Формирует ответ со страницей перенаправления в приложение.
+
+    Ответ содержит ETag и короткий приватный Cache-Control (в странице ссылка
+    с секретом ключа, поэтому общим кэшам ее хранить нельзя). Если клиент
+    прислал совпадающий If-None-Match, возвращается 304 без тела.
+    :param protocol: Протокол ключа
+    :param url: Ссылка для открытия в приложении
+    :param request: Входящий запрос (для условных запросов и gzip)
+    :return: HTTP-ответ
+    """
+    page = render_redirect_page(protocol, url)
+    headers = {
+        "ETag": page.etag,
+        "Cache-Control": f"private, max-age={REDIRECT_CACHE_MAX_AGE}",
+        "Vary": "Accept-Encoding",
     }
-    return HTMLResponse(content=templates[protocol])
+    if request is None:
+        return HTMLResponse(content=page.body, headers=headers)
+
+    if etag_matches(request.headers.get("if-none-match"), page.etag):
+        return Response(status_code=304, headers=headers)
+
+    if page.gzipped is not None and "gzip" in request.headers.get(
+        "accept-encoding", ""
+    ):
+        headers["Content-Encoding"] = "gzip"
+        return HTMLResponse(content=page.gzipped, headers=headers)
+    return HTMLResponse(content=page.body, headers=headers)
 
 
 def generate_hiddify_url(base_url: str, key_name: str) -> str:
@@ -87,34 +185,55 @@ def generate_hiddify_url(base_url: str, key_name: str) -> str:
     return f"hiddify://import/{encoded_vless}"
 
 
-@redirect_server.get("/open/{key_id}")
-async def open_connection(key_id: str):
-    try:
-        key = db_processor.get_key_by_id(key_id)
+async def resolve_access_url(key_id: str) -> tuple[str, str]:
+    """
+    Получает ссылку подключения ключа из БД и панели VPN-сервера.
+    :param key_id: ID ключа
+    :return: Протокол ключа и ссылка для открытия в приложении
+    """
+    key = await db_processor.get_key_by_id(key_id)
+
+    if not key:
+        raise HTTPException(status_code=404, detail="Key not found")
 
-        if not key:
-            raise HTTPException(status_code=404, detail="Key not found")
+    key_protocol = key.protocol_type.lower()
+    processor = await get_processor(key_protocol)
+    key_info = await processor.get_key_info(key_id, server_id=key.server_id)
 
-        key_protocol = key.protocol_type.lower()
-        processor = await get_processor(key_protocol)
-        key_info = await processor.get_key_info(key_id, server_id=key.server_id)
+    match key_protocol:
+        case "outline":
+            url = key_info.access_url
+        case "vless":
+            # Добавляем имя ключа из базы данных
+            url = generate_hiddify_url(
+                key_info.access_url,
+                key.name or f"Server-{key.server_id}",  # Дефолтное имя
+            )
+        case _:
+            raise HTTPException(status_code=400, detail="Unsupported protocol")
 
-        match key_protocol:
-            case "outline":
-                url = key_info.access_url
-            case "vless":
-                # Добавляем имя ключа из базы данных
-                url = generate_hiddify_url(
-                    key_info.access_url,
-                    key.name or f"Server-{key.server_id}",  # Дефолтное имя
-                )
-            case _:
-                raise HTTPException(status_code=400, detail="Unsupported protocol")
+    return key_protocol, url
 
-        return generate_redirect_html(key_protocol, url)
 
+@redirect_server.get("/open/{key_id}")
+async def open_connection(key_id: str, request: Request):
+    try:
+        # Ссылка почти не меняется, поэтому панель сервера опрашивается
+        # только при первом обращении или после изменения ключа
+        key_protocol, url = await access_url_cache.get_or_set(
+            key_id, lambda: resolve_access_url(key_id)
+        )
+        return generate_redirect_html(key_protocol, url, request)
+
+    except HTTPException as e:
+        return HTMLResponse(
+            content=f"<h1>Error</h1><p>{escape(str(e.detail))}</p>",
+            status_code=e.status_code,
+        )
     except Exception as e:
-        return HTMLResponse(content=f"<h1>Error</h1><p>{str(e)}</p>", status_code=500)
+        return HTMLResponse(
+            content=f"<h1>Error</h1><p>{escape(str(e))}</p>", status_code=500
+        )
 
 
 if __name__ == "__main__":
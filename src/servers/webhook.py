@@ -0,0 +1,177 @@
+import asyncio
+import hmac
+import logging
+import os
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import JSONResponse
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Публичный адрес, на который Telegram будет присылать обновления (https://host)
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+# Путь обработчика вебхука на сервере
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Секрет, который Telegram присылает в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Максимальное число принятых, но еще не обработанных обновлений
+WEBHOOK_MAX_INFLIGHT = int(os.getenv("WEBHOOK_MAX_INFLIGHT", 1000))
+# Сколько секунд при остановке ждать обработки уже принятых обновлений
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", 30))
+
+
+class UpdateLimiter:
+    """
+    Ограничитель числа входящих обновлений в обработке.
+
+    Очереди и пула воркеров нет: обработчик вебхука запускает обработку
+    обновления отдельной задачей и сразу отвечает Telegram. Задачи не ждут
+    друг друга: обновления одного пользователя упорядочивает изоляция событий
+    диспетчера, а общее число одновременно работающих обработчиков ограничивает
+    `ConcurrencyMiddleware`, поэтому медленный пользователь не задерживает остальных.
+    Если принятых и еще не обработанных обновлений `limit`, запрос отклоняется
+    с кодом 503 — Telegram повторит доставку позже, а бот не накапливает
+    бесконечный backlog в памяти. Счетчики доступны через `metrics`.
+    """
+
+    def __init__(self, limit: int):
+        """
+        :param limit: Максимальное число обновлений в обработке.
+        """
+        self.limit = limit
+        self.bot: Bot | None = None
+        self._dp: Dispatcher | None = None
+        self._kwargs: dict = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.received = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_inflight = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._dp is not None
+
+    def start(self, dp: Dispatcher, bot: Bot, **kwargs) -> None:
+        """
+        Начинает принимать обновления.
+        :param dp: Диспетчер, в который передаются обновления
+        :param bot: Бот
+        :param kwargs: Дополнительные данные для обработчиков (workflow data)
+        """
+        self.bot = bot
+        self._dp = dp
+        self._kwargs = kwargs
+
+    def submit(self, update: Update) -> bool:
+        """
+        Запускает обработку обновления без ожидания.
+        :return: False, если достигнут лимит или прием не запущен
+        """
+        if not self.running:
+            return False
+        if len(self._tasks) >= self.limit:
+            self.rejected += 1
+            return False
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self.received += 1
+        self.max_inflight = max(self.max_inflight, len(self._tasks))
+        return True
+
+    async def _process(self, update: Update) -> None:
+        started = time.monotonic()
+        try:
+            await self._dp.feed_update(self.bot, update, **self._kwargs)
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Ошибка обработки обновления {update.update_id}: {e}")
+        finally:
+            self.last_duration = time.monotonic() - started
+            self.max_duration = max(self.max_duration, self.last_duration)
+
+    async def stop(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT) -> None:
+        """
+        Перестает принимать обновления, дожидается обработки принятых
+        (не дольше `timeout`) и прерывает оставшиеся.
+        """
+        if not self.running:
+            return
+        self._dp = None
+        tasks = set(self._tasks)
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            if pending:
+                logger.warning(
+                    f"Не обработано обновлений при остановке: {len(pending)}"
+                )
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    @property
+    def metrics(self) -> dict:
+        """
+        Счетчики: обновлений в обработке (сейчас, лимит и максимум), принятые,
+        отклоненные и обработанные обновления, время обработки (в секундах).
+        """
+        return {
+            "inflight": len(self._tasks),
+            "inflight_limit": self.limit,
+            "max_inflight": self.max_inflight,
+            "received": self.received,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "last_duration": round(self.last_duration, 4),
+            "max_duration": round(self.max_duration, 4),
+        }
+
+
+update_limiter = UpdateLimiter(WEBHOOK_MAX_INFLIGHT)
+webhook_router = APIRouter()
+
+
+def check_secret(request: Request) -> bool:
+    """
+    Проверяет секрет из заголовка X-Telegram-Bot-Api-Secret-Token.
+    """
+    received = request.headers.get("x-telegram-bot-api-secret-token", "")
+    return hmac.compare_digest(received.encode(), WEBHOOK_SECRET.encode())
+
+
+@webhook_router.post(WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+    if not check_secret(request):
+        return Response(status_code=401)
+    try:
+        # Привязываем обновление к боту сразу, чтобы feed_update не пересоздавал его
+        update = Update.model_validate(
+            await request.json(), context={"bot": update_limiter.bot}
+        )
+    except ValueError as e:
+        logger.warning(f"Некорректное обновление от Telegram: {e}")
+        return Response(status_code=400)
+    if not update_limiter.submit(update):
+        logger.warning(
+            "Слишком много обновлений в обработке, Telegram повторит доставку"
+        )
+        return Response(status_code=503)
+    return Response(status_code=200)
+
+
+@webhook_router.get(f"{WEBHOOK_PATH}/metrics")
+async def webhook_metrics(request: Request):
+    if not check_secret(request):
+        return Response(status_code=401)
+    return JSONResponse(update_limiter.metrics)
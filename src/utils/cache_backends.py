@@ -0,0 +1,148 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Iterator, MutableMapping
+from typing import Any
+
+
+class SQLiteCacheBackend(MutableMapping):
+    """
+    Хранилище записей `TTLCache` в файле SQLite, общее для нескольких процессов.
+
+    Используется, когда бот и сервер перенаправлений запущены отдельными
+    процессами: сброс записи в одном процессе сразу виден в другом.
+    Записи хранятся как (время записи, значение), значения сериализуются в JSON,
+    поэтому ключи должны быть строками, а значения — JSON-совместимыми
+    (кортежи возвращаются списками).
+
+    Запросы блокирующие (`blocking = True`): `TTLCache` выполняет их
+    в отдельном потоке, а не в цикле событий. Файл открывается при первом
+    обращении, а не при создании хранилища.
+    """
+
+    # Для TTLCache: обращения к хранилищу нужно выносить из цикла событий
+    blocking = True
+
+    def __init__(self, path: str, namespace: str, busy_timeout_ms: int = 200):
+        """
+        :param path: Путь к файлу базы данных.
+        :param namespace: Имя кэша; разные кэши могут жить в одном файле.
+        :param busy_timeout_ms: Сколько миллисекунд ждать, пока файл занят
+            другим процессом.
+        """
+        self.path = path
+        self.namespace = namespace
+        self.busy_timeout_ms = busy_timeout_ms
+        self._connection: sqlite3.Connection | None = None
+        # Соединение используется из потоков asyncio.to_thread по очереди
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        connection.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        connection.execute("PRAGMA journal_mode=WAL")
+        # В режиме WAL записи не ждут fsync, при сбое питания теряется
+        # лишь хвост кэша, который все равно вычисляется заново
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " value TEXT NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS cache_entries_stored_at"
+            " ON cache_entries (namespace, stored_at)"
+        )
+        return connection
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            return self._connection.execute(sql, params)
+
+    def _fetchall(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            return self._connection.execute(sql, params).fetchall()
+
+    def get(self, key: str, default=None) -> tuple[float, Any] | None:
+        rows = self._fetchall(
+            "SELECT stored_at, value FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        )
+        if not rows:
+            return default
+        return rows[0][0], json.loads(rows[0][1])
+
+    def __getitem__(self, key: str) -> tuple[float, Any]:
+        entry = self.get(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry
+
+    def __setitem__(self, key: str, entry: tuple[float, Any]) -> None:
+        stored_at, value = entry
+        self._execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, stored_at, value)"
+            " VALUES (?, ?, ?, ?)",
+            (self.namespace, key, stored_at, json.dumps(value, ensure_ascii=False)),
+        )
+
+    def __delitem__(self, key: str) -> None:
+        cursor = self._execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        )
+        if not cursor.rowcount:
+            raise KeyError(key)
+
+    def pop(self, key: str, *default):
+        # Удаление и чтение одним запросом: запись может удалить другой процесс
+        rows = self._fetchall(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?"
+            " RETURNING stored_at, value",
+            (self.namespace, key),
+        )
+        if not rows:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        return rows[0][0], json.loads(rows[0][1])
+
+    def __iter__(self) -> Iterator[str]:
+        # От старых записей к новым, как порядок вставки в dict
+        rows = self._fetchall(
+            "SELECT key FROM cache_entries WHERE namespace = ? ORDER BY stored_at",
+            (self.namespace,),
+        )
+        for (key,) in rows:
+            yield key
+
+    def __len__(self) -> int:
+        ((count,),) = self._fetchall(
+            "SELECT count(*) FROM cache_entries WHERE namespace = ?",
+            (self.namespace,),
+        )
+        return count
+
+    def clear(self) -> None:
+        self._execute(
+            "DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,)
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections.abc import MutableMapping
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Асинхронный кэш результатов с временем жизни записей.
+
+    Одновременные запросы одного ключа не дублируют вызов `factory`:
+    первый вычисляет значение, остальные дожидаются его результата.
+    Если задан `maxsize`, при переполнении вытесняются самые старые записи.
+
+    Если задан `stale_ttl`, устаревшая запись еще `stale_ttl` секунд отдается
+    сразу, а новое значение вычисляется в фоне (stale-while-revalidate).
+    Если задан `path`, записи сохраняются в JSON-файл и читаются из него
+    при создании кэша, поэтому переживают перезапуск процесса
+    (ключи при этом должны быть строками, а значения — сериализоваться в JSON).
+    Записи хранятся в словаре процесса или во внешнем хранилище `backend`
+    (например, `utils.cache_backends.SQLiteCacheBackend`, общем для процессов).
+    Обращения к хранилищу с атрибутом `blocking = True` из `get_or_set`
+    и `invalidate_async` выполняются в отдельном потоке.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float = 0,
+        path: str = None,
+        maxsize: int = None,
+        backend: MutableMapping = None,
+    ):
+        """
+        :param ttl: Время жизни записи в секундах.
+        :param stale_ttl: Сколько секунд после истечения `ttl` отдавать устаревшее значение.
+        :param path: Файл для сохранения записей между перезапусками.
+        :param maxsize: Максимальное число записей (None — без ограничения).
+        :param backend: Хранилище записей (по умолчанию словарь в памяти процесса).
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.path = path
+        self.maxsize = maxsize
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries: MutableMapping[Hashable, tuple[float, Any]] = (
+            backend if backend is not None else {}
+        )
+        self._blocking = getattr(backend, "blocking", False)
+        # Выполняющиеся вычисления значений, по одному на ключ
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        if path:
+            self._load()
+
+    @property
+    def stats(self) -> dict:
+        """
+        Счетчики обращений к кэшу.
+        """
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+        }
+
+    def _age(self, entry: tuple[float, Any]) -> float:
+        return time.time() - entry[0]
+
+    def get(self, key: Hashable, default=None):
+        """
+        Возвращает значение из кэша, если оно еще не устарело.
+        """
+        entry = self._entries.get(key)
+        if entry is None or self._age(entry) > self.ttl:
+            return default
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        # Переставляем ключ в конец, чтобы вытеснялись самые старые записи
+        self._entries.pop(key, None)
+        self._entries[key] = (time.time(), value)
+        if self.maxsize is not None:
+            while len(self._entries) > self.maxsize:
+                del self._entries[next(iter(self._entries))]
+        if self.path:
+            self._save()
+
+    async def _run(self, func: Callable, *args) -> Any:
+        """
+        Вызывает метод хранилища: блокирующее — в отдельном потоке, словарь — сразу.
+        """
+        if self._blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def get_or_set(
+        self, key: Hashable, factory: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Возвращает значение из кэша или вычисляет его через `factory`.
+        :param key: Ключ записи
+        :param factory: Корутинная функция, вычисляющая значение
+        :return: Значение
+        """
+        entry = await self._run(self._entries.get, key)
+        if entry is not None:
+            age = self._age(entry)
+            if age <= self.ttl:
+                self.hits += 1
+                return entry[1]
+            if age <= self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._refresh_in_background(key, factory)
+                return entry[1]
+
+        self.misses += 1
+        return await self._compute(key, factory)
+
+    def _start_compute(
+        self, key: Hashable, factory: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Future:
+        """
+        Запускает вычисление значения или возвращает уже запущенное для этого ключа.
+        """
+        future = self._inflight.get(key)
+        if future is None:
+
+            async def compute():
+                value = await factory()
+                # Если запись сбросили (invalidate), пока значение вычислялось,
+                # оно уже устарело и в кэш не попадает
+                task = asyncio.current_task()
+                if self._inflight.get(key) is task:
+                    await self._run(self.set, key, value)
+                    # Сброс мог случиться, пока запись сохранялась в хранилище
+                    if self._inflight.get(key) is not task:
+                        await self._run(self._entries.pop, key, None)
+                return value
+
+            def forget(done: asyncio.Future) -> None:
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+
+            future = asyncio.ensure_future(compute())
+            self._inflight[key] = future
+            future.add_done_callback(forget)
+        return future
+
+    async def _compute(
+        self, key: Hashable, factory: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        # shield: отмена одного ожидающего не прерывает вычисление для остальных
+        return await asyncio.shield(self._start_compute(key, factory))
+
+    def _refresh_in_background(
+        self, key: Hashable, factory: Callable[[], Awaitable[Any]]
+    ) -> None:
+        if key in self._inflight:
+            return
+
+        def log_error(future: asyncio.Future) -> None:
+            if not future.cancelled() and future.exception() is not None:
+                logger.warning(
+                    f"Не удалось обновить запись кэша {key!r}: {future.exception()}"
+                )
+
+        self._start_compute(key, factory).add_done_callback(log_error)
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """
+        Удаляет запись `key` или, если ключ не указан, весь кэш.
+        Уже запущенные вычисления этих ключей отвязываются от кэша: их результат
+        получат только те, кто его уже ждет, а в кэш он не запишется.
+        """
+        if key is None:
+            self._inflight.clear()
+        else:
+            self._inflight.pop(key, None)
+        self._drop_entries(key)
+
+    async def invalidate_async(self, key: Hashable = None) -> None:
+        """
+        То же, что `invalidate`, но блокирующее хранилище опрашивается
+        в отдельном потоке. Используется в корутинах.
+        """
+        # Вычисления отвязываются сразу, до обращения к хранилищу
+        if key is None:
+            self._inflight.clear()
+        else:
+            self._inflight.pop(key, None)
+        await self._run(self._drop_entries, key)
+
+    def _drop_entries(self, key: Hashable = None) -> None:
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+        if self.path:
+            self._save()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                items = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш из {self.path}: {e}")
+            return
+        for key, stored_at, value in items:
+            self._entries[key] = (stored_at, value)
+
+    def _save(self) -> None:
+        # Пишем во временный файл и заменяем, чтобы не оставить файл недописанным
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(
+                    [
+                        [key, stored_at, value]
+                        for key, (stored_at, value) in self._entries.items()
+                    ],
+                    file,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_path, self.path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Не удалось сохранить кэш в {self.path}: {e}")
@@ -1,7 +1,10 @@
 import pytest
 import aiohttp
+from types import SimpleNamespace
 
+from api_processors import outline_processor as outline_module
 from api_processors.key_models import OutlineKey
+from api_processors.outline_processor import OutlineProcessor
 
 
 @pytest.mark.asyncio
@@ -11,9 +14,9 @@ async def test_create_server_session(mock_outline_processor):
     запускаем функцию с сервером
     проверяем что сессия создалась
     """
-    await mock_outline_processor.create_server_session()
-    assert isinstance(mock_outline_processor.session, aiohttp.ClientSession)
-    assert mock_outline_processor.server_id == 1
+    conn = await mock_outline_processor.create_server_session()
+    assert isinstance(conn.session, aiohttp.ClientSession)
+    assert conn.server_id == 1
 
 
 @pytest.mark.asyncio
@@ -30,7 +33,9 @@ async def test_create_vpn_key(mock_outline_processor, mock_outline_vpn_key):
 async def test_delete_key(mock_outline_processor, mock_outline_vpn_key):
     """Тестирование возможности удалить ключ"""
     key, server_id = await anext(mock_outline_vpn_key)
-    delete_status = await mock_outline_processor.delete_key(key.key_id)
+    delete_status = await mock_outline_processor.delete_key(
+        key.key_id, server_id=server_id
+    )
     assert delete_status is True
 
 
@@ -107,3 +112,73 @@ async def test_delete_data_limit(mock_outline_processor, mock_outline_vpn_key):
     await mock_outline_processor.delete_data_limit(key.key_id, server_id)
     key_info = await mock_outline_processor.get_key_info(key.key_id, server_id)
     assert key_info.data_limit is None
+
+
+OLD_CERT = "AA" * 32
+NEW_CERT = "BB" * 32
+
+
+@pytest.mark.asyncio
+async def test_open_connection_requires_configured_server(monkeypatch):
+    """Сервер без api_url/cert_sha256 дает понятную ошибку, а не AttributeError"""
+
+    class FakeDbProcessor:
+        async def get_server_by_id(self, server_id):
+            return SimpleNamespace(id=server_id, api_url=None, cert_sha256=None)
+
+    monkeypatch.setattr(outline_module, "get_db_processor", FakeDbProcessor)
+
+    with pytest.raises(ValueError, match="не настроен"):
+        await OutlineProcessor._open_connection(7)
+
+
+@pytest.mark.asyncio
+async def test_setup_server_invalidates_pooled_connection(monkeypatch):
+    """После смены api_url/cert_sha256 подключение из пула пересоздается"""
+    server = SimpleNamespace(
+        id=1,
+        ip="127.0.0.1",
+        password="pwd",
+        api_url="https://old",
+        cert_sha256=OLD_CERT,
+    )
+
+    class FakeDbProcessor:
+        async def get_server_by_id(self, server_id):
+            return server
+
+        async def update_server_by_id(self, server_id, api_url, cert_sha256):
+            server.api_url, server.cert_sha256 = api_url, cert_sha256
+
+    class FakeSSH:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def run(self, cmd, input=None):
+            return SimpleNamespace(exit_status=0, stdout="", stderr="")
+
+    async def fake_report(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(outline_module, "get_db_processor", FakeDbProcessor)
+    monkeypatch.setattr(outline_module, "send_new_server_report", fake_report)
+    monkeypatch.setattr(outline_module.asyncssh, "connect", lambda **kw: FakeSSH())
+
+    processor = OutlineProcessor()
+    monkeypatch.setattr(
+        processor,
+        "extract_outline_config",
+        lambda stdout: {"apiUrl": "https://new", "certSha256": NEW_CERT},
+    )
+    old_conn = await processor._get_connection(1)
+
+    assert await processor.setup_server(server) is True
+    new_conn = await processor._get_connection(1)
+
+    assert old_conn.session.closed
+    assert new_conn is not old_conn
+    assert new_conn.api_url == "https://new"
+    await processor._pool.close_all()
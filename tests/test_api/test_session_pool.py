@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from api_processors.session_pool import ServerSessionPool
+
+
+class FakeConnection:
+    """Подключение-заглушка, запоминающее, было ли оно закрыто."""
+
+    def __init__(self, server_id):
+        self.server_id = server_id
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_one_connection_per_server():
+    """Одновременные запросы к одному серверу создают одно подключение"""
+    created = []
+
+    async def factory(server_id):
+        await asyncio.sleep(0.01)
+        created.append(server_id)
+        return FakeConnection(server_id)
+
+    pool = ServerSessionPool(factory, idle_ttl=60)
+    connections = await asyncio.gather(*(pool.get(1) for _ in range(10)))
+    other = await pool.get(2)
+
+    assert created == [1, 2]
+    assert all(conn is connections[0] for conn in connections)
+    assert other.server_id == 2
+    assert len(pool) == 2
+
+
+@pytest.mark.asyncio
+async def test_idle_connections_are_evicted():
+    """Подключения, простаивающие дольше idle_ttl, закрываются"""
+
+    async def factory(server_id):
+        return FakeConnection(server_id)
+
+    pool = ServerSessionPool(factory, idle_ttl=0.01)
+    first = await pool.get(1)
+    await asyncio.sleep(0.02)
+    second = await pool.get(1)
+
+    assert first.closed is True
+    assert second is not first
+
+
+@pytest.mark.asyncio
+async def test_close_all():
+    """close_all закрывает все подключения пула"""
+
+    async def factory(server_id):
+        return FakeConnection(server_id)
+
+    pool = ServerSessionPool(factory, idle_ttl=60)
+    connections = [await pool.get(server_id) for server_id in (1, 2, 3)]
+    await pool.close_all()
+
+    assert all(conn.closed for conn in connections)
+    assert len(pool) == 0
+    assert 1 not in pool
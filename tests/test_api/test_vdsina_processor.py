@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+from api_processors import vdsina_processor as vdsina_module
+from api_processors.vdsina_processor import VDSinaAPI
+from utils.ttl_cache import TTLCache
+
+
+def make_api(monkeypatch, responses, cache):
+    """VDSinaAPI, у которого request отдает заранее заданные ответы"""
+    api = VDSinaAPI()
+    api.catalog_cache = cache
+    calls = []
+
+    async def fake_request(method, endpoint, data=None, timeout=None):
+        calls.append(endpoint)
+        return responses.pop(0)
+
+    monkeypatch.setattr(api, "request", fake_request)
+    return api, calls
+
+
+@pytest.mark.asyncio
+async def test_catalog_is_cached_and_errors_are_not(monkeypatch):
+    """Успешный ответ справочника кэшируется, ответ с ошибкой — нет"""
+    ok = {"status": "ok", "data": [{"id": 1}]}
+    api, calls = make_api(monkeypatch, [{"status": "error"}, ok], TTLCache(ttl=60))
+
+    assert (await api.get_templates())["status"] == "error"
+    assert await api.get_templates() == ok
+    assert await api.get_templates() == ok
+    assert calls == ["/template", "/template"]
+    assert api.get_cache_stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_catalog_is_served_while_refreshing(monkeypatch):
+    """Устаревший справочник отдается сразу, а обновляется в фоне"""
+    old = {"status": "ok", "data": "old"}
+    new = {"status": "ok", "data": "new"}
+    api, calls = make_api(monkeypatch, [old, new], TTLCache(ttl=0, stale_ttl=60))
+
+    assert await api.get_datacenters() == old
+    assert await api.get_datacenters() == old
+    await asyncio.sleep(0)
+    assert await api.get_datacenters() == new
+    assert api.get_cache_stats()["stale_hits"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_catalog_survives_restart(monkeypatch, tmp_path):
+    """Справочник, сохраненный в файл, доступен новому процессу без запроса"""
+    path = str(tmp_path / "catalog.json")
+    plans = {"status": "ok", "data": [{"id": 1, "name": "plan"}]}
+    api, _ = make_api(monkeypatch, [plans], TTLCache(ttl=60, path=path))
+    await api.get_server_plans()
+
+    restarted, calls = make_api(monkeypatch, [], TTLCache(ttl=60, path=path))
+    assert await restarted.get_server_plans() == plans
+    assert calls == []
+
+
+class FakeResponse:
+    def __init__(self, session, status, data):
+        self.session = session
+        self.status = status
+        self.data = data
+
+    async def __aenter__(self):
+        self.session.open_responses += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.session.open_responses -= 1
+
+    async def json(self, content_type="application/json"):
+        return self.data
+
+
+class FakeSession:
+    """
+    Сессия aiohttp: принимает только `valid_token`, авторизация выдает `issued_token`
+    """
+
+    closed = False
+
+    def __init__(self, valid_token="new", issued_token="new"):
+        self.valid_token = valid_token
+        self.issued_token = issued_token
+        self.open_responses = 0
+        self.requests = []
+        self.auth_calls = 0
+        self.responses_open_during_auth = []
+
+    def request(self, method, url, json=None, headers=None, timeout=None):
+        self.requests.append((headers["Authorization"], timeout))
+        if headers["Authorization"] != self.valid_token:
+            return FakeResponse(self, 401, {"status": "error", "status_code": 401})
+        return FakeResponse(self, 200, {"status": "ok", "data": url})
+
+    def post(self, url, json=None, headers=None):
+        self.auth_calls += 1
+        self.responses_open_during_auth.append(self.open_responses)
+        return FakeAuthResponse(self)
+
+
+class FakeAuthResponse(FakeResponse):
+    def __init__(self, session):
+        super().__init__(session, 200, None)
+
+    async def json(self, content_type="application/json"):
+        # Пока токен обновляется, остальные запросы тоже получают отказ
+        await asyncio.sleep(0.01)
+        return {"status": "ok", "data": {"token": self.session.issued_token}}
+
+
+def make_authenticated_api(session):
+    api = VDSinaAPI()
+    api.token = "old"
+    api.email, api.password = "admin@example.com", "secret"
+    api._session = session
+    return api
+
+
+@pytest.mark.asyncio
+async def test_auth_error_refreshes_token_once_for_concurrent_requests():
+    """
+    Отказ в авторизации у нескольких запросов — одна повторная авторизация
+    (после закрытия ответов) и по одному повтору каждого запроса
+    """
+    session = FakeSession()
+    api = make_authenticated_api(session)
+
+    results = await asyncio.gather(*(api.request("GET", f"/s/{i}") for i in range(3)))
+
+    assert [result["status"] for result in results] == ["ok"] * 3
+    assert session.auth_calls == 1
+    assert session.responses_open_during_auth == [0]
+    assert [token for token, _ in session.requests].count("old") == 3
+    assert [token for token, _ in session.requests].count("new") == 3
+
+
+@pytest.mark.asyncio
+async def test_auth_error_is_retried_only_once():
+    """Если и новый токен отвергнут, ответ с ошибкой возвращается без новых попыток"""
+    session = FakeSession(valid_token="other")
+    api = make_authenticated_api(session)
+
+    result = await api.request("GET", "/servers")
+
+    assert result["status_code"] == 401
+    assert session.auth_calls == 1
+    assert len(session.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_request_timeouts_are_passed_to_session():
+    """Таймаут запроса передается в сессию; без него действует таймаут сессии"""
+    session = FakeSession()
+    api = make_authenticated_api(session)
+    api.token = "new"
+
+    await api.request("GET", "/servers", timeout=5)
+    await api.request("GET", "/servers")
+
+    (_, timeout), (_, default) = session.requests
+    assert timeout.total == 5
+    assert default is None
+
+    api._session = None
+    real_session = await api._get_session()
+    try:
+        assert real_session.timeout.total == vdsina_module.VDSINA_REQUEST_TIMEOUT
+        assert real_session.timeout.connect == vdsina_module.VDSINA_CONNECT_TIMEOUT
+    finally:
+        await api.close()
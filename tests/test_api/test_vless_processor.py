@@ -10,9 +10,9 @@ async def test_create_server_session(mock_vless_processor):
     запускаем функцию с сервером
     проверяем что сессия создалась
     """
-    await mock_vless_processor.create_server_session()
-    assert mock_vless_processor.ip == os.getenv("VLESS_IP")
-    assert mock_vless_processor.server_id == 1
+    conn = await mock_vless_processor.create_server_session()
+    assert conn.ip == os.getenv("VLESS_IP")
+    assert conn.server_id == 1
 
 
 @pytest.mark.asyncio
@@ -29,7 +29,9 @@ async def test_create_vpn_key(mock_vless_processor, mock_vless_vpn_key):
 async def test_delete_key(mock_vless_processor, mock_vless_vpn_key):
     """Тестирование возможности удалить ключ"""
     key, server_id = await anext(mock_vless_vpn_key)
-    delete_status = await mock_vless_processor.delete_key(key.key_id)
+    delete_status = await mock_vless_processor.delete_key(
+        key.key_id, server_id=server_id
+    )
     assert delete_status is True
 
 
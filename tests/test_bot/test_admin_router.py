@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bot.routers import admin_router
+from utils.ttl_cache import TTLCache
+
+
+class FakeVDSina:
+    """Заглушка API VDSina: считает одновременные запросы статистики"""
+
+    def __init__(self, server_ids, delay=0.01):
+        self.server_ids = server_ids
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.servers_calls = 0
+
+    async def get_servers(self):
+        self.servers_calls += 1
+        return {"data": [{"id": server_id} for server_id in self.server_ids]}
+
+    async def get_server_statistics(self, server_id):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            # Последние серверы отвечают первыми
+            await asyncio.sleep(self.delay / server_id)
+        finally:
+            self.active -= 1
+        stat = {"cpu": server_id, "vnet_rx": server_id * 10**9}
+        return {"data": [{"stat": stat}]}
+
+
+@pytest.mark.asyncio
+async def test_collect_servers_info_is_bounded_and_ordered(monkeypatch):
+    """Не больше VDSINA_STATS_CONCURRENCY запросов сразу, порядок — как в списке"""
+    vdsina = FakeVDSina(server_ids=list(range(1, 8)))
+    monkeypatch.setattr(admin_router, "vdsina_processor", vdsina)
+    monkeypatch.setattr(admin_router, "VDSINA_STATS_CONCURRENCY", 3)
+
+    text = await admin_router.collect_servers_info()
+
+    assert vdsina.max_active == 3
+    positions = [text.index(f"«{server_id}»") for server_id in range(1, 8)]
+    assert positions == sorted(positions)
+    assert "Средняя в час загрузка CPU: 7.0%" in text
+
+
+class FakeMessage:
+    def __init__(self):
+        self.texts = []
+
+    async def edit_text(self, text, reply_markup=None):
+        self.texts.append(text)
+
+
+class FakeState:
+    async def set_state(self, state):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_servers_info_cache_coalesces_concurrent_callers(monkeypatch):
+    """Одновременные запросы админов опрашивают VDSina один раз"""
+    vdsina = FakeVDSina(server_ids=[1, 2])
+    monkeypatch.setattr(admin_router, "vdsina_processor", vdsina)
+    monkeypatch.setattr(admin_router, "servers_info_cache", TTLCache(ttl=60))
+    callbacks = [SimpleNamespace(message=FakeMessage()) for _ in range(5)]
+
+    await asyncio.gather(
+        *(
+            admin_router.get_servers_info(callback, FakeState())
+            for callback in callbacks
+        )
+    )
+    await admin_router.get_servers_info(callbacks[0], FakeState())
+
+    assert vdsina.servers_calls == 1
+    texts = {callback.message.texts[-1] for callback in callbacks}
+    assert len(texts) == 1 and "«2»" in texts.pop()
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from bot.utils import broadcast as broadcast_module
+from bot.utils.broadcast import BroadcastRunner, TokenBucket
+from database.db_processor import DbProcessor
+from database.models import User
+
+
+class FakeBot:
+    """Бот-заглушка: запоминает отправленные сообщения"""
+
+    def __init__(self, blocked=(), retry_after_once=()):
+        self.sent = []
+        self.edits = []
+        self.blocked = set(blocked)
+        self.retry_after_once = set(retry_after_once)
+
+    async def send_message(self, chat_id, text):
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method=None, message="blocked")
+        if chat_id in self.retry_after_once:
+            self.retry_after_once.discard(chat_id)
+            raise TelegramRetryAfter(method=None, message="flood", retry_after=0)
+        self.sent.append(chat_id)
+
+    async def edit_message_text(self, **kwargs):
+        self.edits.append(kwargs["text"])
+
+
+@pytest_asyncio.fixture
+async def broadcast_db(tmp_path, monkeypatch):
+    """DbProcessor с временной базой и десятью пользователями"""
+    processor = DbProcessor()
+    processor.async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'test.db'}"
+    )
+    processor.AsyncSession = async_sessionmaker(
+        bind=processor.async_engine, expire_on_commit=False
+    )
+    await processor.init_db_async()
+    async with processor.async_session_scope() as session:
+        session.add_all([User(user_telegram_id=i) for i in range(10)])
+
+    monkeypatch.setattr(broadcast_module, "db_processor", processor)
+    monkeypatch.setattr(broadcast_module, "BROADCAST_CHUNK_SIZE", 3)
+    monkeypatch.setattr(broadcast_module, "BROADCAST_FLUSH_SIZE", 2)
+    yield processor
+    await processor.async_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    """Ведро выдает не больше rate токенов в секунду после исчерпания запаса"""
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        await bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_broadcast_delivers_and_records_state(broadcast_db, monkeypatch):
+    """Рассылка доходит до всех, статусы доставки сохраняются в БД"""
+    fake_bot = FakeBot(blocked={3}, retry_after_once={5})
+    monkeypatch.setattr(broadcast_module, "bot", fake_bot)
+
+    broadcast = await broadcast_db.create_broadcast("hello", admin_chat_id=1)
+    broadcast.progress_message_id = 42
+    counts = await BroadcastRunner(broadcast, TokenBucket(rate=1000)).run()
+
+    assert counts == {"sent": 9, "blocked": 1}
+    assert sorted(fake_bot.sent) == [i for i in range(10) if i != 3]
+    assert await broadcast_db.get_broadcast_stats(broadcast.id) == {
+        "sent": 9,
+        "blocked": 1,
+    }
+    assert await broadcast_db.claim_unfinished_broadcasts(timedelta(0)) == []
+    assert fake_bot.edits[-1].startswith("Рассылка завершена: 10 из 10")
+
+
+@pytest.mark.asyncio
+async def test_broadcast_resume_skips_delivered(broadcast_db, monkeypatch):
+    """Возобновленная рассылка не отправляет сообщение повторно"""
+    fake_bot = FakeBot()
+    monkeypatch.setattr(broadcast_module, "bot", fake_bot)
+
+    broadcast = await broadcast_db.create_broadcast("hello", admin_chat_id=1)
+    await broadcast_db.save_broadcast_deliveries(
+        broadcast.id, [(i, "sent") for i in range(6)]
+    )
+    # Процесс упал: отметка устарела
+    (unfinished,) = await broadcast_db.claim_unfinished_broadcasts(timedelta(0))
+    counts = await BroadcastRunner(unfinished, TokenBucket(rate=1000)).run()
+
+    assert fake_bot.sent == [6, 7, 8, 9]
+    assert counts == {"sent": 10}
+
+
+@pytest.mark.asyncio
+async def test_claim_unfinished_broadcasts(broadcast_db):
+    """
+    Выполняющуюся рассылку другой процесс не захватывает; брошенную
+    захватывает только один из одновременно запущенных процессов
+    """
+    broadcast = await broadcast_db.create_broadcast("hello", admin_chat_id=1)
+    lease = timedelta(minutes=5)
+    assert await broadcast_db.claim_unfinished_broadcasts(lease) == []
+
+    await broadcast_db.release_broadcast(broadcast.id)
+    claims = await asyncio.gather(
+        *(broadcast_db.claim_unfinished_broadcasts(lease) for _ in range(3))
+    )
+
+    assert sorted(len(claimed) for claimed in claims) == [0, 0, 1]
+    assert await broadcast_db.claim_unfinished_broadcasts(lease) == []
+
+
+@pytest.mark.asyncio
+async def test_stopped_broadcast_saves_progress_and_releases_claim(
+    broadcast_db, monkeypatch
+):
+    """При остановке результаты записываются, рассылку сразу можно продолжить"""
+    fake_bot = FakeBot()
+    monkeypatch.setattr(broadcast_module, "bot", fake_bot)
+    broadcast = await broadcast_db.create_broadcast("hello", admin_chat_id=1)
+    runner = BroadcastRunner(broadcast, TokenBucket(rate=50, capacity=1))
+    task = asyncio.create_task(runner.run())
+    while len(fake_bot.sent) < 3:
+        await asyncio.sleep(0.01)
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    stats = await broadcast_db.get_broadcast_stats(broadcast.id)
+    assert stats["sent"] == len(fake_bot.sent)
+    (claimed,) = await broadcast_db.claim_unfinished_broadcasts(timedelta(minutes=5))
+    assert claimed.id == broadcast.id
+
+
+@pytest.mark.asyncio
+async def test_failed_broadcast_is_logged_and_reported(monkeypatch, caplog):
+    """Ошибка фоновой рассылки попадает в лог и отчет администраторам"""
+    reports = []
+
+    async def fake_report(error):
+        reports.append(error)
+
+    async def failing_run(self):
+        raise RuntimeError("БД недоступна")
+
+    monkeypatch.setattr(broadcast_module, "send_error_report", fake_report)
+    monkeypatch.setattr(BroadcastRunner, "run", failing_run)
+
+    with caplog.at_level(logging.ERROR, logger=broadcast_module.__name__):
+        task = broadcast_module._spawn(SimpleNamespace(id=7))
+        with pytest.raises(RuntimeError):
+            await task
+        while broadcast_module._running_broadcasts:
+            await asyncio.sleep(0)
+
+    assert [str(error) for error in reports] == ["БД недоступна"]
+    assert "Рассылка 7 прервана ошибкой" in caplog.text
@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Chat, Message, Update, User
+
+from bot.fsm.isolation import UserEventIsolation
+from bot.middlewares import concurrency as concurrency_module
+from bot.middlewares.concurrency import ConcurrencyMiddleware
+
+
+def make_update(update_id: int, user_id: int, text: str) -> Update:
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            from_user=User(id=user_id, is_bot=False, first_name="user"),
+            text=text,
+        ),
+    )
+
+
+def make_dispatcher(middleware, handled, delays):
+    """Диспетчер с изоляцией пользователей и обработчиком, записывающим порядок"""
+    isolation = UserEventIsolation()
+    dp = Dispatcher(storage=MemoryStorage(), events_isolation=isolation)
+    dp.update.outer_middleware(middleware)
+    router = Router()
+
+    @router.message()
+    async def handler(message: Message):
+        await asyncio.sleep(delays.get(message.text, 0))
+        handled.append(message.text)
+
+    dp.include_router(router)
+    return dp, isolation
+
+
+async def feed_all(dp, updates):
+    bot = Bot(token="42:TEST")
+    tasks = []
+    for update in updates:
+        tasks.append(asyncio.create_task(dp.feed_update(bot, update)))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_user_order_kept_and_others_not_blocked():
+    """
+    Обновления одного пользователя идут по очереди, а его очередь не занимает
+    общий слот: при единственном слоте второй пользователь обслуживается сразу
+    после текущего обработчика, а не после всей очереди первого
+    """
+    handled = []
+    middleware = ConcurrencyMiddleware(concurrency=1, stuck_timeout=60, timeout=0)
+    dp, isolation = make_dispatcher(middleware, handled, {"a1": 0.05})
+
+    await feed_all(
+        dp,
+        [
+            make_update(1, 1, "a1"),
+            make_update(2, 1, "a2"),
+            make_update(3, 1, "a3"),
+            make_update(4, 2, "b1"),
+        ],
+    )
+
+    assert handled == ["a1", "b1", "a2", "a3"]
+    assert isolation.size == 0
+    assert middleware.stats == {"active": 0, "waiting": 0, "stuck": 0, "timed_out": 0}
+
+
+@pytest.mark.asyncio
+async def test_slow_handler_is_reported_and_cancelled(monkeypatch):
+    """Зависший обработчик попадает в отчет, а после таймаута прерывается"""
+    reports = []
+
+    async def fake_report(message):
+        reports.append(message)
+
+    monkeypatch.setattr(concurrency_module, "send_error_report", fake_report)
+    handled = []
+    middleware = ConcurrencyMiddleware(concurrency=5, stuck_timeout=0.01, timeout=0.1)
+    dp, isolation = make_dispatcher(middleware, handled, {"slow": 5})
+
+    await feed_all(dp, [make_update(1, 1, "slow"), make_update(2, 1, "fast")])
+    await asyncio.sleep(0)
+
+    assert handled == ["fast"]
+    assert middleware.stats["stuck"] == 1
+    assert middleware.stats["timed_out"] == 1
+    assert len(reports) == 2 and "прерван" in reports[1]
+    assert isolation.size == 0
+
+
+@pytest.mark.asyncio
+async def test_isolation_releases_lock_on_error():
+    """Блокировка пользователя удаляется и после исключения в обработчике"""
+    isolation = UserEventIsolation()
+    dp = Dispatcher(storage=MemoryStorage(), events_isolation=isolation)
+    key = dp.fsm.resolve_context(bot=Bot(token="42:TEST"), chat_id=1, user_id=1).key
+
+    with pytest.raises(RuntimeError):
+        async with isolation.lock(key):
+            raise RuntimeError
+    assert isolation.size == 0
@@ -0,0 +1,134 @@
+import pickle
+import time
+
+import aiosqlite
+import pytest
+import pytest_asyncio
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+
+from api_processors.key_models import OutlineKey, VlessKey
+from bot.fsm.sqlite_storage import SQLiteStorage, dump_data, load_data
+
+KEY = StorageKey(bot_id=42, chat_id=1, user_id=1)
+
+
+class Form(StatesGroup):
+    name = State()
+
+
+@pytest_asyncio.fixture
+async def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fsm.db"), ttl=60, purge_interval=3600)
+    yield storage
+    await storage.close()
+
+
+async def age_rows(storage: SQLiteStorage, seconds: float) -> None:
+    """Сдвигает время последней активности всех диалогов в прошлое"""
+    connection = await storage._get_connection()
+    await connection.execute("UPDATE fsm SET updated_at = updated_at - ?", (seconds,))
+    await connection.commit()
+
+
+def test_dump_data_is_json_with_key_dataclasses():
+    data = {
+        "key_info": VlessKey("id", "name", "mail", "vless://x", 10, None),
+        "outline": OutlineKey(1, "n", "p", 443, "aes", "ss://y", None, 5),
+        "selected_period": "1 месяц",
+        "ids": [1, 2],
+    }
+    blob = dump_data(data)
+    assert blob[:1] == b"\x02"
+    assert b"__dataclass__" in blob
+    assert load_data(blob) == data
+
+    big = {"text": "x" * 2000}
+    blob = dump_data(big)
+    assert blob[:1] == b"\x03" and len(blob) < 200
+    assert load_data(blob) == big
+
+    assert dump_data({}) is None and load_data(None) == {}
+    with pytest.raises(TypeError):
+        dump_data({"obj": object()})
+
+
+def test_load_data_skips_legacy_pickle():
+    assert load_data(b"\x00" + pickle.dumps({"a": 1})) == {}
+
+
+@pytest.mark.asyncio
+async def test_state_and_data_roundtrip(storage):
+    await storage.set_state(KEY, Form.name)
+    await storage.set_data(KEY, {"key_name": "ключ"})
+
+    assert await storage.get_state(KEY) == "Form:name"
+    assert await storage.get_data(KEY) == {"key_name": "ключ"}
+
+
+@pytest.mark.asyncio
+async def test_expired_dialog_is_empty(storage):
+    await storage.set_state(KEY, Form.name)
+    await storage.set_data(KEY, {"a": 1})
+    await age_rows(storage, 120)
+
+    assert await storage.get_state(KEY) is None
+    assert await storage.get_data(KEY) == {}
+
+
+@pytest.mark.asyncio
+async def test_write_after_expiry_does_not_resurrect_old_values(storage):
+    await storage.set_state(KEY, Form.name)
+    await storage.set_data(KEY, {"a": 1})
+    await age_rows(storage, 120)
+
+    # Новое состояние не возвращает устаревшие данные
+    await storage.set_state(KEY, "new")
+    assert await storage.get_data(KEY) == {}
+    assert await storage.get_state(KEY) == "new"
+
+    await age_rows(storage, 120)
+    # Новые данные не возвращают устаревшее состояние
+    await storage.set_data(KEY, {"b": 2})
+    assert await storage.get_state(KEY) is None
+    assert await storage.get_data(KEY) == {"b": 2}
+
+
+@pytest.mark.asyncio
+async def test_write_before_expiry_keeps_other_column(storage):
+    await storage.set_data(KEY, {"a": 1})
+    await age_rows(storage, 30)
+
+    await storage.set_state(KEY, Form.name)
+    assert await storage.get_data(KEY) == {"a": 1}
+
+
+@pytest.mark.asyncio
+async def test_purge_expired_removes_old_and_empty_rows(storage):
+    other = StorageKey(bot_id=42, chat_id=2, user_id=2)
+    empty = StorageKey(bot_id=42, chat_id=3, user_id=3)
+    await storage.set_state(KEY, Form.name)
+    await age_rows(storage, 120)
+    await storage.set_data(other, {"a": 1})
+    await storage.set_state(empty, None)
+
+    assert await storage.purge_expired() == 2
+
+    async with aiosqlite.connect(storage.path) as connection:
+        async with connection.execute("SELECT COUNT(*) FROM fsm") as cursor:
+            assert (await cursor.fetchone())[0] == 1
+    assert await storage.get_data(other) == {"a": 1}
+
+
+@pytest.mark.asyncio
+async def test_purge_runs_on_write_after_interval(storage):
+    await storage.set_state(KEY, Form.name)
+    await age_rows(storage, 120)
+    storage.purge_interval = 0
+
+    await storage.set_state(StorageKey(bot_id=42, chat_id=2, user_id=2), "s")
+
+    connection = await storage._get_connection()
+    async with connection.execute("SELECT COUNT(*) FROM fsm") as cursor:
+        assert (await cursor.fetchone())[0] == 1
+    assert time.monotonic() - storage._last_purge < 5
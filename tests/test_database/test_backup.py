@@ -0,0 +1,171 @@
+import gzip
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from git import Repo
+
+from database import backup as backup_module
+from database.backup import BackupWorker, SQLiteBackup, next_run_time
+
+
+class FakeDatetime(datetime):
+    """datetime.now(), сдвигающийся на секунду при каждом вызове"""
+
+    current = datetime(2025, 1, 1, 12, 0, 0)
+
+    @classmethod
+    def now(cls, tz=None):
+        cls.current += timedelta(seconds=1)
+        return cls.current
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "vpn_users.db")
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    return path
+
+
+@pytest.fixture
+def backup_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup_module, "datetime", FakeDatetime)
+    path = tmp_path / "backups"
+    repo = Repo.init(path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "backup")
+        config.set_value("user", "email", "backup@example.com")
+    return str(path)
+
+
+def write_row(db_path: str, name: str) -> None:
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("INSERT INTO users (name) VALUES (?)", (name,))
+    # Время изменения файла должно отличаться от предыдущего снимка
+    stat = os.stat(db_path)
+    os.utime(db_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_next_run_time():
+    now = datetime(2025, 1, 1, 10, 30)
+    assert next_run_time("11:00", now) == datetime(2025, 1, 1, 11, 0)
+    assert next_run_time("09:15", now) == datetime(2025, 1, 2, 9, 15)
+    # Ровно в момент запуска следующий запуск — через сутки
+    assert next_run_time("10:30", now) == datetime(2025, 1, 2, 10, 30)
+
+
+def test_create_snapshot_dedupes_unchanged_database(db_path, backup_dir):
+    backup = SQLiteBackup(db_path, backup_dir)
+    write_row(db_path, "first")
+
+    snapshot, removed = backup.create_snapshot()
+    assert snapshot is not None and removed == []
+    with gzip.open(os.path.join(backup_dir, snapshot.file)) as file:
+        restored = str(os.path.join(backup_dir, "restored.db"))
+        with open(restored, "wb") as target:
+            target.write(file.read())
+    with sqlite3.connect(restored) as connection:
+        assert connection.execute("SELECT name FROM users").fetchall() == [("first",)]
+    os.remove(restored)
+
+    # Файлы базы не менялись — копия не снимается
+    assert backup.create_snapshot() == (None, [])
+
+    # Файл «тронули», но содержимое то же — снимок не сохраняется, отметка обновляется
+    stat = os.stat(db_path)
+    os.utime(db_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+    assert backup.create_snapshot() == (None, [])
+    manifest = backup.load_manifest()
+    assert len(manifest) == 1
+    assert manifest[0].source_stamp == backup._source_stamp()
+    assert sorted(os.listdir(backup_dir)) == [".git", "backups.json", snapshot.file]
+
+
+def test_create_snapshot_keeps_last_snapshots(db_path, backup_dir):
+    backup = SQLiteBackup(db_path, backup_dir, keep=2)
+    files = []
+    for i in range(4):
+        write_row(db_path, f"row {i}")
+        snapshot, removed = backup.create_snapshot()
+        files.append(snapshot.file)
+
+    assert removed == [files[1]]
+    assert [s.file for s in backup.load_manifest()] == files[2:]
+    assert sorted(f for f in os.listdir(backup_dir) if f.endswith(".gz")) == files[2:]
+
+
+def test_run_once_commits_and_pushes(db_path, backup_dir, tmp_path):
+    remote = tmp_path / "remote.git"
+    Repo.init(remote, bare=True)
+    worker = BackupWorker(SQLiteBackup(db_path, backup_dir), str(remote))
+    write_row(db_path, "first")
+
+    assert worker.run_once() is True
+
+    status = worker.status
+    assert status["state"] == "ok"
+    assert status["last_error"] is None
+    assert status["last_snapshot"].endswith(".db.gz")
+    assert status["last_duration"] is not None
+    remote_head = Repo(remote).head.commit
+    assert remote_head.message.startswith("Backup at")
+    assert status["last_snapshot"] in remote_head.tree
+
+
+def test_run_once_reports_failed_push_and_retries_it(db_path, backup_dir, tmp_path):
+    remote = tmp_path / "remote.git"
+    errors = []
+    backup = SQLiteBackup(db_path, backup_dir)
+    worker = BackupWorker(backup, str(remote), on_error=errors.append)
+    write_row(db_path, "first")
+
+    # Удаленного репозитория еще нет: коммит остается локально
+    assert worker.run_once() is False
+    assert worker.status["state"] == "failed"
+    assert len(errors) == 1 and errors[0].startswith("Ошибка при резервном")
+    assert len(backup.load_manifest()) == 1
+
+    # База не менялась, но неотправленный коммит отправляется при следующем запуске
+    Repo.init(remote, bare=True)
+    assert worker.run_once() is True
+    assert worker.status["state"] == "ok"
+    assert Repo(remote).head.commit.message.startswith("Backup at")
+
+
+def test_run_once_respects_deadline(db_path, backup_dir, tmp_path):
+    errors = []
+    backup = SQLiteBackup(db_path, backup_dir)
+    worker = BackupWorker(
+        backup, str(tmp_path / "remote.git"), timeout=-1, on_error=errors.append
+    )
+    write_row(db_path, "first")
+
+    assert worker.run_once() is False
+    assert "Превышено время" in worker.status["last_error"]
+    assert len(errors) == 1
+    # Временные файлы прерванного снимка удалены
+    assert sorted(os.listdir(backup_dir)) == [".git"]
+
+
+def test_trigger_and_stop(db_path, backup_dir, tmp_path):
+    remote = tmp_path / "remote.git"
+    Repo.init(remote, bare=True)
+    worker = BackupWorker(SQLiteBackup(db_path, backup_dir), str(remote), at="03:00")
+    write_row(db_path, "first")
+    worker.start()
+    try:
+        deadline = time.monotonic() + 10
+        while worker.status["next_run"] is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert worker.status["last_started"] is None
+
+        worker.trigger()
+        while worker.status["last_finished"] is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert worker.status["state"] == "ok"
+    finally:
+        worker.stop()
+    assert not worker.is_alive()
@@ -0,0 +1,340 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from api_processors.key_models import KeyUsage
+from database.db_processor import DbProcessor
+from database.engine import create_engines
+from database.models import Base, Server, User, VpnKey
+
+# Пустая база PostgreSQL для тестов (postgresql://...); без нее — временный файл SQLite
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest_asyncio.fixture
+async def async_db_processor(tmp_path):
+    """DbProcessor, работающий с временной базой (SQLite или TEST_DATABASE_URL)"""
+    processor = DbProcessor()
+    processor.async_engine, _ = create_engines(
+        TEST_DATABASE_URL or f"sqlite:///{tmp_path / 'test.db'}"
+    )
+    processor.AsyncSession = async_sessionmaker(
+        bind=processor.async_engine, expire_on_commit=False
+    )
+    await processor.init_db_async()
+    yield processor
+    if TEST_DATABASE_URL:
+        async with processor.async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.execute(text("DROP TABLE alembic_version"))
+    await processor.async_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_update_database_with_key(async_db_processor):
+    """Новый ключ сохраняется и доступен через асинхронные методы"""
+    key = SimpleNamespace(key_id="key-1", name="first key")
+    status = await async_db_processor.update_database_with_key(
+        12345, key, "1 month", server_id=1, protocol_type="vless"
+    )
+    assert status is True
+
+    stored = await async_db_processor.get_key_by_id("key-1")
+    assert stored.name == "first key"
+    assert await async_db_processor.get_vpn_type_by_key_id("key-1") == "vless"
+    assert [k.key_id for k in await async_db_processor.get_user_keys(12345)] == [
+        "key-1"
+    ]
+    assert await async_db_processor.get_all_user_ids() == [12345]
+
+
+@pytest.mark.asyncio
+async def test_trial_key_only_once(async_db_processor):
+    """Пробный ключ выдается пользователю только один раз"""
+    first = SimpleNamespace(key_id="trial-1", name="trial")
+    second = SimpleNamespace(key_id="trial-2", name="trial")
+
+    assert await async_db_processor.update_database_with_key(
+        1, first, 2, 1, "outline", True
+    )
+    assert not await async_db_processor.update_database_with_key(
+        1, second, 2, 1, "outline", True
+    )
+    assert await async_db_processor.get_key_by_id("trial-2") is None
+
+
+@pytest.mark.asyncio
+async def test_rename_key(async_db_processor):
+    """Переименование ключа"""
+    key = SimpleNamespace(key_id="key-1", name="old")
+    await async_db_processor.update_database_with_key(1, key, "1 month", 1)
+
+    assert await async_db_processor.rename_key("key-1", "new") is True
+    assert (await async_db_processor.get_key_by_id("key-1")).name == "new"
+    assert await async_db_processor.rename_key("missing", "new") is False
+
+
+@pytest.mark.asyncio
+async def test_get_server_with_min_users(async_db_processor):
+    """Выбирается наименее загруженный сервер, счетчик пользователей растет"""
+    async with async_db_processor.async_session_scope() as session:
+        session.add_all(
+            [
+                Server(id=1, protocol_type="vless", cnt_users=5),
+                Server(id=2, protocol_type="vless", cnt_users=2),
+                Server(id=3, protocol_type="outline", cnt_users=0),
+            ]
+        )
+
+    server = await async_db_processor.get_server_with_min_users("vless")
+
+    assert server.id == 2
+    assert server.cnt_users == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chunk_size", [1, 1000])
+async def test_check_db(async_db_processor, monkeypatch, chunk_size):
+    """
+    Уведомления группируются по пользователю (и когда его ключи на разных
+    страницах), отправляются без открытого соединения с БД; давно истекшие
+    ключи удаляются
+    """
+    monkeypatch.setattr("database.db_processor.CHECK_DB_CHUNK_SIZE", chunk_size)
+    now = datetime.now()
+    async with async_db_processor.async_session_scope() as session:
+        session.add(Server(id=1, protocol_type="vless", cnt_users=3))
+        session.add_all(
+            [
+                User(user_telegram_id=1),
+                User(user_telegram_id=2),
+                VpnKey(
+                    key_id="old",
+                    user_telegram_id=1,
+                    name="old",
+                    protocol_type="vless",
+                    server_id=1,
+                    expiration_date=now - timedelta(days=5),
+                ),
+                VpnKey(
+                    key_id="soon",
+                    user_telegram_id=1,
+                    name="soon",
+                    protocol_type="vless",
+                    server_id=1,
+                    expiration_date=now + timedelta(days=2, hours=1),
+                ),
+                VpnKey(
+                    key_id="fresh",
+                    user_telegram_id=2,
+                    name="fresh",
+                    protocol_type="vless",
+                    server_id=1,
+                    expiration_date=now + timedelta(days=30),
+                ),
+            ]
+        )
+
+    notifications = []
+    deleted = []
+
+    async def fake_send(user_id, keys):
+        assert async_db_processor.async_engine.pool.checkedout() == 0
+        notifications.append((user_id, keys))
+
+    class FakeProcessor:
+        async def delete_key(self, key_id, server_id=None):
+            deleted.append((key_id, server_id))
+            return True
+
+    async def fake_get_processor(protocol_type):
+        return FakeProcessor()
+
+    monkeypatch.setattr(
+        "database.db_processor.send_message_subscription_expired", fake_send
+    )
+    monkeypatch.setattr("utils.get_processor.get_processor", fake_get_processor)
+
+    await async_db_processor.check_db()
+
+    assert notifications == [(1, {"old": ("old", 0), "soon": ("soon", 3)})]
+    assert deleted == [("old", 1)]
+    assert await async_db_processor.get_key_by_id("old") is None
+    assert await async_db_processor.get_key_by_id("soon") is not None
+    assert (await async_db_processor.get_server_by_id(1)).cnt_users == 2
+
+
+@pytest.mark.asyncio
+async def test_delete_expired_keys_with_retries(async_db_processor, monkeypatch):
+    """Строка ключа удаляется из БД только после успешного удаления с сервера"""
+    async with async_db_processor.async_session_scope() as session:
+        session.add(Server(id=1, protocol_type="vless", cnt_users=2))
+        session.add(Server(id=2, protocol_type="vless", cnt_users=1))
+        session.add_all(
+            [
+                VpnKey(key_id="flaky", protocol_type="vless", server_id=1),
+                VpnKey(key_id="broken", protocol_type="vless", server_id=1),
+                VpnKey(key_id="ok", protocol_type="vless", server_id=2),
+            ]
+        )
+
+    attempts = {}
+
+    class FakeProcessor:
+        async def delete_key(self, key_id, server_id=None):
+            attempts[key_id] = attempts.get(key_id, 0) + 1
+            if key_id == "broken":
+                return False, "panel error"
+            if key_id == "flaky" and attempts[key_id] == 1:
+                raise ConnectionError("timeout")
+            return True
+
+    async def fake_get_processor(protocol_type):
+        return FakeProcessor()
+
+    async def fake_send_error_report(error):
+        pass
+
+    monkeypatch.setattr("utils.get_processor.get_processor", fake_get_processor)
+    monkeypatch.setattr(
+        "database.db_processor.send_error_report", fake_send_error_report
+    )
+    monkeypatch.setattr("database.db_processor.EXPIRED_KEYS_RETRY_DELAY", 0)
+
+    keys = [
+        SimpleNamespace(key_id=key_id, protocol_type="vless", server_id=server_id)
+        for key_id, server_id in (("flaky", 1), ("broken", 1), ("ok", 2))
+    ]
+    await async_db_processor._delete_expired_keys(keys)
+
+    assert attempts == {"flaky": 2, "broken": 3, "ok": 1}
+    assert await async_db_processor.get_key_by_id("flaky") is None
+    assert await async_db_processor.get_key_by_id("ok") is None
+    assert await async_db_processor.get_key_by_id("broken") is not None
+    assert (await async_db_processor.get_server_by_id(1)).cnt_users == 1
+    assert (await async_db_processor.get_server_by_id(2)).cnt_users == 0
+
+
+@pytest.mark.asyncio
+async def test_reconcile_keeps_counts_changed_during_panel_requests(
+    async_db_processor, monkeypatch
+):
+    """
+    Расхождение с панелью прибавляется к текущему счетчику в БД: ключ,
+    выданный, пока шла сверка, не теряется
+    """
+    async with async_db_processor.async_session_scope() as session:
+        session.add_all(
+            [
+                Server(id=1, protocol_type="vless", cnt_users=5),
+                Server(id=2, protocol_type="vless", cnt_users=3),
+                Server(id=3, protocol_type="outline", cnt_users=1),
+            ]
+        )
+        session.add_all(
+            VpnKey(key_id=f"{server_id}-{i}", server_id=server_id)
+            for server_id, count in ((1, 5), (2, 3))
+            for i in range(count)
+        )
+
+    # Ключей на панелях: на сервере 1 — 4 (в БД 5), на сервере 2 — 3 (совпадает)
+    panel_keys = {1: 4, 2: 3}
+
+    class FakeProcessor:
+        async def get_keys_usage(self, server_id):
+            if server_id == 3:
+                raise ConnectionError("timeout")
+            if server_id == 2:
+                # Бот выдает ключ на сервере 1 уже после ответа его панели,
+                # пока опрашиваются остальные
+                await asyncio.sleep(0.05)
+                await async_db_processor.increment_server_user_count(1)
+            return {f"{server_id}-{i}": None for i in range(panel_keys[server_id])}
+
+    async def fake_get_processor(protocol_type):
+        return FakeProcessor()
+
+    monkeypatch.setattr("utils.get_processor.get_processor", fake_get_processor)
+
+    await async_db_processor.reconcile_server_user_counts()
+
+    # 5 + 1 выданный - 1 расхождение с панелью
+    assert (await async_db_processor.get_server_by_id(1)).cnt_users == 5
+    assert (await async_db_processor.get_server_by_id(2)).cnt_users == 3
+    assert (await async_db_processor.get_server_by_id(3)).cnt_users == 1
+    assert async_db_processor.server_index.get_load(1) == 5
+
+
+@pytest.mark.asyncio
+async def test_reconcile_ignores_panel_clients_unknown_to_bot(
+    async_db_processor, monkeypatch
+):
+    """Служебный клиент test1 и чужие клиенты панели не входят в счетчик"""
+    async with async_db_processor.async_session_scope() as session:
+        session.add(Server(id=1, protocol_type="vless", cnt_users=2))
+        session.add_all(
+            [
+                VpnKey(key_id="key-1", server_id=1),
+                VpnKey(key_id="key-2", server_id=1),
+            ]
+        )
+
+    class FakeProcessor:
+        async def get_keys_usage(self, server_id):
+            return {"test1": None, "key-1": None, "key-2": None, "manual": None}
+
+    async def fake_get_processor(protocol_type):
+        return FakeProcessor()
+
+    monkeypatch.setattr("utils.get_processor.get_processor", fake_get_processor)
+
+    await async_db_processor.reconcile_server_user_counts()
+
+    assert (await async_db_processor.get_server_by_id(1)).cnt_users == 2
+    assert async_db_processor.server_index.get_load(1) == 2
+
+
+@pytest.mark.asyncio
+async def test_traffic_sync_stores_counters_above_int32(
+    async_db_processor, monkeypatch
+):
+    """Счетчик трафика больше 2 ГиБ сохраняется (BigInteger и в PostgreSQL)"""
+    used_bytes = 5 * 2**31
+    async with async_db_processor.async_session_scope() as session:
+        session.add(Server(id=1, protocol_type="outline", cnt_users=1))
+        session.add(
+            VpnKey(
+                key_id="key-1",
+                protocol_type="outline",
+                server_id=1,
+                expiration_date=datetime.now() + timedelta(days=30),
+                used_bytes_last_month=2**31,
+            )
+        )
+
+    limits = {}
+
+    class FakeProcessor:
+        async def get_keys_usage(self, server_id):
+            return {"key-1": KeyUsage("key-1", used_bytes, 10 * 2**31)}
+
+        async def update_data_limit(self, key_id, new_limit, server_id, key_name):
+            limits[key_id] = new_limit
+            return True
+
+    async def fake_get_processor(protocol_type):
+        return FakeProcessor()
+
+    monkeypatch.setattr("utils.get_processor.get_processor", fake_get_processor)
+
+    await async_db_processor.check_and_update_key_data_limit()
+
+    assert limits == {"key-1": 14 * 2**31}
+    key = await async_db_processor.get_key_by_id("key-1")
+    assert key.used_bytes_last_month == used_bytes
@@ -0,0 +1,55 @@
+import sqlite3
+
+from sqlalchemy import BigInteger, create_engine, inspect
+
+from database.migrate import upgrade_schema
+
+LEGACY_SCHEMA = """
+CREATE TABLE users (user_telegram_id VARCHAR NOT NULL PRIMARY KEY,
+    subscription_status VARCHAR, use_trial_period BOOLEAN);
+CREATE TABLE servers (id INTEGER NOT NULL PRIMARY KEY, ip VARCHAR, password VARCHAR,
+    api_url VARCHAR, cert_sha256 VARCHAR, cnt_users INTEGER, protocol_type VARCHAR);
+CREATE TABLE keys (key_id VARCHAR NOT NULL PRIMARY KEY, user_telegram_id VARCHAR,
+    start_date DATETIME, expiration_date DATETIME, name VARCHAR,
+    used_bytes_last_month INTEGER, protocol_type VARCHAR, server_id INTEGER,
+    FOREIGN KEY(user_telegram_id) REFERENCES users (user_telegram_id),
+    FOREIGN KEY(server_id) REFERENCES servers (id));
+INSERT INTO users VALUES ('987654321012', 'active', 0);
+INSERT INTO servers VALUES (1, NULL, NULL, 'url', 'sha', 1, 'outline');
+INSERT INTO keys VALUES ('key-1', '987654321012', NULL, NULL, 'key', 3000000000,
+    'outline', 1);
+"""
+
+
+def test_legacy_database_is_migrated(tmp_path):
+    """Файл БД, созданный до миграций, получает индексы и целочисленные ID без потери данных"""
+    path = tmp_path / "vpn_users.db"
+    connection = sqlite3.connect(path)
+    connection.executescript(LEGACY_SCHEMA)
+    connection.close()
+
+    engine = create_engine(f"sqlite:///{path}")
+    for _ in range(2):  # повторный запуск ничего не меняет
+        with engine.begin() as conn:
+            upgrade_schema(conn)
+
+    inspector = inspect(engine)
+    assert {index["name"] for index in inspector.get_indexes("keys")} == {
+        "ix_keys_user_telegram_id",
+        "ix_keys_server_id",
+        "ix_keys_expiration_date",
+    }
+    assert [index["column_names"] for index in inspector.get_indexes("servers")] == [
+        ["protocol_type", "cnt_users"]
+    ]
+    assert "broadcast_deliveries" in inspector.get_table_names()
+    columns = {
+        column["name"]: column["type"] for column in inspector.get_columns("keys")
+    }
+    assert isinstance(columns["used_bytes_last_month"], BigInteger)
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql(
+            "SELECT typeof(user_telegram_id), user_telegram_id, used_bytes_last_month"
+            " FROM keys"
+        ).all() == [("integer", 987654321012, 3000000000)]
+    engine.dispose()
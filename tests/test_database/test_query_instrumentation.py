@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from database.query_instrumentation import (
+    QueryStats,
+    format_query_stats,
+    instrument_engine,
+    normalize_statement,
+)
+
+
+@pytest.fixture
+def instrumented():
+    engine = create_engine("sqlite://")
+    stats = QueryStats()
+    instrument_engine(engine, mode="slow", slow_query_ms=10_000, stats=stats)
+    yield engine, stats
+    engine.dispose()
+
+
+def test_normalize_statement_collapses_in_lists():
+    assert (
+        normalize_statement("SELECT *\n  FROM keys WHERE key_id IN (?, ?,?)")
+        == "SELECT * FROM keys WHERE key_id IN (?)"
+    )
+    # Нумерованные параметры asyncpg: длина списка не меняет ключ
+    short = normalize_statement(
+        "SELECT * FROM keys WHERE key_id IN ($1, $2) AND x = $3"
+    )
+    long = normalize_statement(
+        "SELECT * FROM keys WHERE key_id IN ($1, $2, $3, $4) AND x = $5"
+    )
+    assert short == long == "SELECT * FROM keys WHERE key_id IN (?) AND x = ?"
+
+
+def test_stats_are_grouped_by_normalized_statement(instrumented):
+    engine, stats = instrumented
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER)"))
+        for ids in ([1], [1, 2], [1, 2, 3]):
+            conn.execute(
+                text("SELECT * FROM t WHERE id IN :ids").bindparams(
+                    bindparam("ids", expanding=True)
+                ),
+                {"ids": ids},
+            )
+
+    snapshot = stats.snapshot()
+    assert snapshot["SELECT * FROM t WHERE id IN (?)"]["count"] == 3
+    assert sum(snapshot["SELECT * FROM t WHERE id IN (?)"]["histogram"].values()) == 3
+
+
+def test_failed_statements_do_not_leak_start_times(instrumented):
+    engine, stats = instrumented
+    with engine.connect() as conn:
+        for _ in range(5):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+        conn.execute(text("SELECT 1"))
+        assert conn.info["query_start_time"] == []
+
+    assert list(stats.snapshot()) == ["SELECT 1"]
+
+
+def test_off_mode_does_not_instrument():
+    engine = create_engine("sqlite://")
+    stats = QueryStats()
+    instrument_engine(engine, mode="off", stats=stats)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert stats.snapshot() == {}
+
+
+def test_format_query_stats_orders_by_total_time():
+    stats = QueryStats()
+    assert format_query_stats(stats) == "Статистика запросов к БД пуста"
+
+    for _ in range(10):
+        stats.observe("SELECT fast", 1)
+    stats.observe("SELECT slow", 500)
+    stats.observe("SELECT " + "x" * 1000, 0.5)
+
+    report = format_query_stats(stats, top=2)
+    assert report.startswith("Запросов к БД: 12")
+    assert report.index("SELECT slow") < report.index("SELECT fast")
+    assert "x" * 100 not in report
@@ -0,0 +1,64 @@
+from database.server_index import ServerLoadIndex
+
+
+def make_index():
+    index = ServerLoadIndex()
+    index.load(
+        [
+            (1, "vless", 5),
+            (2, "VLESS", 2),
+            (3, "outline", 159),
+            (4, "outline", 160),
+        ]
+    )
+    return index
+
+
+def test_least_loaded_per_protocol():
+    """Наименее загруженный сервер выбирается отдельно для каждого протокола"""
+    index = make_index()
+
+    assert index.least_loaded("vless") == 2
+    assert index.least_loaded("Outline") == 3
+    assert index.least_loaded("outline", max_users=159) is None
+    assert index.least_loaded("unknown") is None
+
+
+def test_adjust_reorders_servers():
+    """После изменения загрузки выбор сервера меняется, устаревшие записи игнорируются"""
+    index = make_index()
+
+    for _ in range(4):
+        index.adjust(2, +1)
+    assert index.get_load(2) == 6
+    assert index.least_loaded("vless") == 1
+
+    index.adjust(1, -10)
+    assert index.get_load(1) == 0
+    assert index.least_loaded("vless") == 1
+
+
+def test_all_full_and_remove():
+    """all_full учитывает только существующие серверы протокола"""
+    index = make_index()
+
+    assert index.all_full("outline", threshold=159) is True
+    assert index.all_full("vless", threshold=159) is False
+
+    index.remove(1)
+    index.remove(2)
+    assert index.all_full("vless", threshold=159) is True
+    assert 1 not in index
+    assert len(index) == 2
+
+
+def test_heap_is_compacted():
+    """Куча не растет бесконечно при частых изменениях загрузки"""
+    index = make_index()
+
+    for _ in range(1000):
+        index.adjust(1, +1)
+        index.adjust(1, -1)
+
+    assert len(index._heaps["vless"]) <= 2 * len(index) + 16
+    assert index.least_loaded("vless") == 2
@@ -0,0 +1,113 @@
+import json
+import logging
+import queue
+import sys
+
+from logger.logging_config import DroppingQueueHandler, JsonLinesFormatter
+
+
+def make_record(msg, *args, exc_info=None, level=logging.INFO):
+    return logging.LogRecord(
+        name="test",
+        level=level,
+        pathname=__file__,
+        lineno=10,
+        msg=msg,
+        args=args,
+        exc_info=exc_info,
+    )
+
+
+def drain(log_queue: queue.Queue) -> list[logging.LogRecord]:
+    records = []
+    while not log_queue.empty():
+        records.append(log_queue.get_nowait())
+    return records
+
+
+def test_drops_are_counted_and_reported_once_queue_frees_up():
+    log_queue = queue.Queue(maxsize=2)
+    handler = DroppingQueueHandler(log_queue)
+
+    for i in range(5):
+        handler.handle(make_record("запись %d", i))
+
+    assert handler.enqueued == 2
+    assert handler.dropped == 3
+    assert [r.getMessage() for r in drain(log_queue)] == ["запись 0", "запись 1"]
+
+    handler.handle(make_record("после"))
+
+    report, record = drain(log_queue)
+    assert report.levelno == logging.WARNING
+    assert report.getMessage() == "Очередь логов переполнена, отброшено записей: 3"
+    assert record.getMessage() == "после"
+    assert handler.dropped == 3 and handler.enqueued == 3
+
+
+def test_report_waits_until_there_is_room_for_it():
+    log_queue = queue.Queue(maxsize=1)
+    handler = DroppingQueueHandler(log_queue)
+    handler.handle(make_record("первая"))
+    handler.handle(make_record("вторая"))
+    drain(log_queue)
+
+    # Места хватает только на отчет, сама запись отбрасывается и ждет следующего
+    handler.handle(make_record("третья"))
+
+    (report,) = drain(log_queue)
+    assert report.getMessage().endswith("отброшено записей: 1")
+    assert handler.dropped == 2
+
+
+def test_message_is_built_before_args_change():
+    log_queue = queue.Queue()
+    handler = DroppingQueueHandler(log_queue)
+    payload = {"state": "old"}
+    record = make_record("данные: %s", payload)
+
+    handler.handle(record)
+    payload["state"] = "new"
+
+    (queued,) = drain(log_queue)
+    assert queued.getMessage() == "данные: {'state': 'old'}"
+    assert queued.args is None
+    # Исходная запись не меняется для других обработчиков
+    assert record.args is payload
+
+
+def test_exception_is_rendered_to_text():
+    log_queue = queue.Queue()
+    handler = DroppingQueueHandler(log_queue)
+    try:
+        raise ValueError("сбой")
+    except ValueError:
+        handler.handle(make_record("ошибка", exc_info=sys.exc_info()))
+
+    (queued,) = drain(log_queue)
+    assert queued.exc_info is None
+    assert "ValueError: сбой" in queued.exc_text
+    assert "ValueError: сбой" in logging.Formatter().format(queued)
+
+
+def test_json_lines_formatter():
+    log_queue = queue.Queue()
+    handler = DroppingQueueHandler(log_queue)
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        handler.handle(
+            make_record("ключ %s", "abc", exc_info=sys.exc_info(), level=logging.ERROR)
+        )
+    (queued,) = drain(log_queue)
+
+    line = JsonLinesFormatter().format(queued)
+
+    assert "\n" not in line
+    data = json.loads(line)
+    assert data["level"] == "ERROR"
+    assert data["logger"] == "test"
+    assert data["location"].endswith(":10")
+    assert data["message"] == "ключ abc"
+    assert "RuntimeError: boom" in data["exc_info"]
+    assert data["ts"].endswith("+00:00")
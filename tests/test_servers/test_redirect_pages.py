@@ -0,0 +1,155 @@
+import gzip
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from servers import redirect_server as redirect_module
+from servers.redirect_server import (
+    etag_matches,
+    redirect_server,
+    render_redirect_page,
+)
+from utils.ttl_cache import TTLCache
+
+OUTLINE_URL = "ss://secret@1.2.3.4:443/?outline=1"
+XSS = "\"'><script>alert(1)</script>"
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    """
+    Ключи, которые «лежат» в БД и на панелях; кэш ссылок — отдельный на тест
+    """
+    keys = {
+        "outline-key": SimpleNamespace(
+            protocol_type="Outline", server_id=1, name="key", access_url=OUTLINE_URL
+        ),
+        "vless-key": SimpleNamespace(
+            protocol_type="VLESS",
+            server_id=2,
+            name=XSS,
+            access_url="vless://uuid@1.2.3.4:443?type=tcp#old",
+        ),
+    }
+
+    class FakeDbProcessor:
+        async def get_key_by_id(self, key_id):
+            return keys.get(key_id)
+
+    class FakeProcessor:
+        async def get_key_info(self, key_id, server_id=None):
+            return SimpleNamespace(access_url=keys[key_id].access_url)
+
+    async def fake_get_processor(protocol_type):
+        return FakeProcessor()
+
+    monkeypatch.setattr(redirect_module, "db_processor", FakeDbProcessor())
+    monkeypatch.setattr(redirect_module, "get_processor", fake_get_processor)
+    monkeypatch.setattr(redirect_module, "access_url_cache", TTLCache(ttl=60))
+    return keys
+
+
+@pytest.fixture
+def client(keys):
+    return TestClient(redirect_server)
+
+
+def test_page_has_etag_and_private_cache_control(client):
+    response = client.get("/open/outline-key")
+
+    assert response.status_code == 200
+    assert "Launch Outline" in response.text
+    assert response.headers["etag"] == render_redirect_page("outline", OUTLINE_URL).etag
+    assert response.headers["cache-control"].startswith("private, max-age=")
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_if_none_match_returns_304(client):
+    etag = client.get("/open/outline-key").headers["etag"]
+
+    for if_none_match in (etag, f'"other", W/{etag}', "*"):
+        response = client.get(
+            "/open/outline-key", headers={"If-None-Match": if_none_match}
+        )
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+    response = client.get("/open/outline-key", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+
+def test_etag_changes_with_url(client, keys):
+    etag = client.get("/open/outline-key").headers["etag"]
+    keys["outline-key"].access_url = OUTLINE_URL + "&v=2"
+    redirect_module.access_url_cache.invalidate("outline-key")
+
+    response = client.get("/open/outline-key", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_gzip_only_when_accepted(client):
+    response = client.get("/open/vless-key", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Launch Hiddify" in response.text
+
+    response = client.get("/open/vless-key", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert "Launch Hiddify" in response.text
+
+
+def test_small_pages_are_not_compressed(monkeypatch):
+    monkeypatch.setattr(redirect_module, "REDIRECT_GZIP_MIN_SIZE", 10**6)
+    render_redirect_page.cache_clear()
+    try:
+        assert render_redirect_page("outline", OUTLINE_URL).gzipped is None
+    finally:
+        render_redirect_page.cache_clear()
+
+
+def test_rendered_page_is_cached():
+    render_redirect_page.cache_clear()
+    first = render_redirect_page("outline", OUTLINE_URL)
+    second = render_redirect_page("outline", OUTLINE_URL)
+
+    assert first is second
+    assert render_redirect_page.cache_info().hits == 1
+    assert gzip.decompress(first.gzipped) == first.body
+
+
+def test_url_is_escaped_in_html_and_script():
+    body = render_redirect_page("outline", "ss://x" + XSS).body.decode()
+
+    # Внедренный тег нигде не закрывается, страница не ломается
+    assert "alert(1)</script>" not in body
+    # В атрибутах и тексте — HTML-экранирование
+    assert "&quot;&#x27;&gt;&lt;script&gt;" in body
+    # В JavaScript — строковый литерал, который не закрывает тег <script>
+    assert '"ss://x\\"\'><script>alert(1)<\\/script>"' in body
+
+
+def test_key_name_is_escaped(client):
+    response = client.get("/open/vless-key", headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert "<script>alert(1)" not in response.text
+    # Имя ключа попадает в ссылку только в URL-кодированном виде
+    assert "#%2522%2527%253E%253Cscript%253Ealert" in response.text
+
+
+def test_unknown_key_returns_404(client):
+    response = client.get("/open/missing")
+
+    assert response.status_code == 404
+    assert "Key not found" in response.text
+
+
+def test_etag_matches():
+    assert not etag_matches(None, '"a"')
+    assert not etag_matches("", '"a"')
+    assert etag_matches('"b", "a"', '"a"')
+    assert etag_matches('W/"a"', '"a"')
+    assert not etag_matches('"b"', '"a"')
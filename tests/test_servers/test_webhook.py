@@ -0,0 +1,153 @@
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Chat, Message, Update, User
+from fastapi import FastAPI
+
+from bot.fsm.isolation import UserEventIsolation
+from servers import webhook
+from servers.webhook import UpdateLimiter, webhook_router
+
+SECRET = "test-secret"
+
+
+def update_json(update_id: int, user_id: int) -> dict:
+    update = Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            from_user=User(id=user_id, is_bot=False, first_name="user"),
+            text=f"u{update_id}",
+        ),
+    )
+    return update.model_dump(mode="json", exclude_none=True)
+
+
+def make_dispatcher(release: asyncio.Event, handled: list) -> Dispatcher:
+    """Диспетчер, обработчик которого ждет `release`; ошибка — на тексте u13"""
+    dp = Dispatcher(storage=MemoryStorage(), events_isolation=UserEventIsolation())
+    router = Router()
+
+    @router.message()
+    async def handler(message: Message):
+        await release.wait()
+        if message.text == "u13":
+            raise RuntimeError("сбой обработчика")
+        handled.append(message.text)
+
+    dp.include_router(router)
+    return dp
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = UpdateLimiter(limit=2)
+    monkeypatch.setattr(webhook, "update_limiter", limiter)
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", SECRET)
+    return limiter
+
+
+def make_client() -> httpx.AsyncClient:
+    app = FastAPI()
+    app.include_router(webhook_router)
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    )
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_bad_secret_and_body(limiter):
+    bot = Bot(token="42:TEST")
+    limiter.start(make_dispatcher(asyncio.Event(), []), bot)
+    async with make_client() as client:
+        response = await client.post(webhook.WEBHOOK_PATH, json=update_json(1, 1))
+        assert response.status_code == 401
+        response = await client.post(
+            webhook.WEBHOOK_PATH,
+            json=update_json(1, 1),
+            headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+        )
+        assert response.status_code == 401
+        response = await client.post(
+            webhook.WEBHOOK_PATH,
+            json={"message": "no update_id"},
+            headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+        )
+        assert response.status_code == 400
+        response = await client.get(f"{webhook.WEBHOOK_PATH}/metrics")
+        assert response.status_code == 401
+    await limiter.stop()
+    await bot.session.close()
+    assert limiter.received == 0
+
+
+@pytest.mark.asyncio
+async def test_webhook_returns_503_when_limit_reached(limiter):
+    """
+    Обновления принимаются, пока в обработке меньше `limit`; сверх этого —
+    503, после обработки обновления снова принимаются
+    """
+    release, handled = asyncio.Event(), []
+    bot = Bot(token="42:TEST")
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    async with make_client() as client:
+        # Пока прием не запущен, обновления отклоняются
+        response = await client.post(
+            webhook.WEBHOOK_PATH, json=update_json(10, 1), headers=headers
+        )
+        assert response.status_code == 503
+
+        limiter.start(make_dispatcher(release, handled), bot)
+        statuses = []
+        for update_id, user_id in ((11, 1), (12, 2), (13, 3)):
+            response = await client.post(
+                webhook.WEBHOOK_PATH,
+                json=update_json(update_id, user_id),
+                headers=headers,
+            )
+            statuses.append(response.status_code)
+        assert statuses == [200, 200, 503]
+
+        release.set()
+        while limiter.metrics["inflight"]:
+            await asyncio.sleep(0.01)
+        response = await client.post(
+            webhook.WEBHOOK_PATH, json=update_json(13, 3), headers=headers
+        )
+        assert response.status_code == 200
+        await limiter.stop()
+
+        response = await client.get(f"{webhook.WEBHOOK_PATH}/metrics", headers=headers)
+    await bot.session.close()
+
+    assert handled == ["u11", "u12"]
+    metrics = response.json()
+    assert metrics["inflight"] == 0
+    assert metrics["inflight_limit"] == 2
+    assert metrics["max_inflight"] == 2
+    assert metrics["received"] == 3
+    assert metrics["rejected"] == 1
+    assert metrics["processed"] == 2
+    assert metrics["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_limiter_stop_cancels_updates_after_timeout(limiter):
+    release = asyncio.Event()
+    bot = Bot(token="42:TEST")
+    limiter.start(make_dispatcher(release, []), bot)
+    assert limiter.submit(Update.model_validate(update_json(1, 1)))
+    await asyncio.sleep(0)
+
+    await limiter.stop(timeout=0.05)
+    await bot.session.close()
+
+    assert not limiter.running
+    assert limiter.metrics["inflight"] == 0
+    assert not limiter.submit(Update.model_validate(update_json(2, 1)))
@@ -0,0 +1,136 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from utils.cache_backends import SQLiteCacheBackend
+from utils.ttl_cache import TTLCache
+
+
+@pytest.mark.asyncio
+async def test_invalidate_discards_inflight_result():
+    """Значение, вычислявшееся во время invalidate, не возвращается в кэш"""
+    cache = TTLCache(ttl=60)
+    release = asyncio.Event()
+    calls = []
+
+    async def factory():
+        calls.append(len(calls))
+        await release.wait()
+        return f"url-{len(calls)}"
+
+    waiter = asyncio.create_task(cache.get_or_set("key", factory))
+    await asyncio.sleep(0)
+    cache.invalidate("key")
+    release.set()
+
+    assert await waiter == "url-1"
+    assert cache.get("key") is None
+    assert await cache.get_or_set("key", factory) == "url-2"
+    assert cache.get("key") == "url-2"
+
+
+@pytest.mark.asyncio
+async def test_invalidate_discards_background_refresh():
+    """Фоновое обновление устаревшей записи не перезаписывает сброшенный ключ"""
+    cache = TTLCache(ttl=0, stale_ttl=60)
+    cache.set("key", "old")
+    release = asyncio.Event()
+
+    async def factory():
+        await release.wait()
+        return "refreshed"
+
+    assert await cache.get_or_set("key", factory) == "old"
+    cache.invalidate("key")
+    release.set()
+    await asyncio.sleep(0.01)
+
+    assert cache.get("key") is None
+    assert cache.stats["size"] == 0
+
+
+def test_sqlite_invalidation_is_visible_in_other_process(tmp_path):
+    """Сброс записи в одном процессе виден кэшу другого процесса"""
+    path = str(tmp_path / "cache.db")
+    cache = TTLCache(ttl=60, backend=SQLiteCacheBackend(path, "access_url"))
+    cache.set("key-1", ["vless", "vless://old"])
+    cache.set("key-2", ["vless", "vless://other"])
+
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; from utils.cache_backends import SQLiteCacheBackend;"
+            "from utils.ttl_cache import TTLCache;"
+            "TTLCache(ttl=60, backend=SQLiteCacheBackend(sys.argv[1], 'access_url'))"
+            ".invalidate('key-1')",
+            path,
+        ],
+        check=True,
+        env={"PYTHONPATH": ":".join(p for p in sys.path if p)},
+    )
+
+    assert cache.get("key-1") is None
+    assert cache.get("key-2") == ["vless", "vless://other"]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_opens_file_lazily_and_off_loop(tmp_path, monkeypatch):
+    """Файл создается при первом обращении, запросы идут через asyncio.to_thread"""
+    path = tmp_path / "data" / "cache.db"
+    backend = SQLiteCacheBackend(str(path), "access_url")
+    cache = TTLCache(ttl=60, backend=backend)
+    assert not path.exists()
+
+    offloaded = []
+    to_thread = asyncio.to_thread
+
+    async def spy(func, *args):
+        offloaded.append(func.__name__)
+        return await to_thread(func, *args)
+
+    monkeypatch.setattr(asyncio, "to_thread", spy)
+
+    async def factory():
+        return ["vless", "vless://url"]
+
+    assert await cache.get_or_set("key", factory) == ["vless", "vless://url"]
+    assert path.exists()
+    assert await cache.get_or_set("key", factory) == ["vless", "vless://url"]
+    await cache.invalidate_async("key")
+
+    assert offloaded == ["get", "set", "get", "_drop_entries"]
+    assert backend.get("key") is None
+    (synchronous,) = backend._fetchall("PRAGMA synchronous")[0]
+    assert synchronous == 1  # NORMAL
+    backend.close()
+
+
+@pytest.mark.parametrize(
+    "run_mode, warns", [("single", False), ("webhook", False), ("bot", True)]
+)
+def test_access_url_cache_defaults_to_memory(tmp_path, run_mode, warns):
+    """Кэш ссылок по умолчанию в памяти; в режиме bot — предупреждение"""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from initialization.access_url_cache_init import access_url_cache;"
+            "print(type(access_url_cache._entries).__name__)",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=tmp_path,
+        env={
+            "PYTHONPATH": ":".join(p for p in sys.path if p),
+            "RUN_MODE": run_mode,
+            "DATA_DIR": str(tmp_path / "data"),
+        },
+    )
+
+    assert result.stdout.strip() == "dict"
+    assert ("CACHE_BACKEND=sqlite" in result.stderr) is warns
+    assert not (tmp_path / "data").exists()